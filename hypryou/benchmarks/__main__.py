@@ -0,0 +1,118 @@
+import argparse
+import importlib
+import json
+import platform
+import sys
+import time
+import typing as t
+from benchmarks import harness
+
+# python -m benchmarks [suite ...] [-o results.json] [--compare old.json]
+# Run with -O for numbers closer to a release build, debug logging
+# is only compiled out then.
+
+SUITES = (
+    "signals", "ref", "hyprland", "apps", "cliphist", "fuzzy", "colors"
+)
+
+type Results = dict[str, dict[str, dict[str, t.Any]]]
+
+
+def run_suites(names: list[str]) -> Results:
+    results: Results = {}
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        module = importlib.import_module(f"benchmarks.{name}")
+        start = time.perf_counter()
+        results[name] = module.run()
+        print(
+            f"  done in {time.perf_counter() - start:.1f}s",
+            file=sys.stderr
+        )
+    return results
+
+
+def metadata() -> dict[str, t.Any]:
+    from config import VERSION
+    return {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "system": platform.platform(),
+        "debug": __debug__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+
+def is_lower_better(key: str) -> bool:
+    return key.endswith("_ms")
+
+
+def compare(old: Results, new: Results) -> list[str]:
+    lines: list[str] = []
+    for suite, cases in new.items():
+        for case, values in cases.items():
+            old_values = old.get(suite, {}).get(case, {})
+            for key, value in values.items():
+                previous = old_values.get(key)
+                if not isinstance(previous, (int, float)) or not previous:
+                    continue
+                if not (is_lower_better(key) or key.endswith("_per_sec")):
+                    continue
+                change = (value - previous) / previous * 100
+                better = (change < 0) == is_lower_better(key)
+                lines.append(
+                    f"{suite}: {case}: {key}: {previous:,.3f} -> " +
+                    f"{value:,.3f} ({change:+.1f}%" +
+                    f"{'' if better else ', worse'})"
+                )
+    return lines
+
+
+def print_results(results: Results) -> None:
+    for suite, cases in results.items():
+        print(f"[{suite}]")
+        for case, values in cases.items():
+            print(f"  {case}")
+            for key, value in values.items():
+                print(f"    {key}: {value:,.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "suites", nargs="*", help=f"any of {', '.join(SUITES)}"
+    )
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument(
+        "--compare", help="JSON from a previous run to compare with"
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the temporary directory"
+    )
+    args = parser.parse_args()
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    workdir = harness.setup(keep=args.keep)
+    if args.keep:
+        print(f"Working directory: {workdir}", file=sys.stderr)
+
+    results = run_suites(args.suites or list(SUITES))
+    report = {"meta": metadata(), "results": results}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print_results(results)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print("\n".join(compare(old.get("results", {}), results)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import typing as t
+from benchmarks import harness
+
+APP_COUNTS = (100, 500, 2000)
+QUERIES = ("f", "fi", "fil", "files", "terminal", "web brwser")
+
+
+def bench_apps(count: int, repeat: int) -> dict[str, dict[str, float]]:
+    from repository import gio
+    from src.services import apps
+    paths = harness.write_desktop_files(count)
+
+    def load() -> list[apps.Application]:
+        return [
+            apps.Application(gio.DesktopAppInfo.new_from_filename(path))
+            for path in paths
+        ]
+
+    applications = load()
+    results: dict[str, dict[str, float]] = {
+        "load": harness.latencies(load, 5),
+        "build_index": harness.latencies(
+            lambda: apps.search_index.build(applications), repeat
+        )
+    }
+
+    # Every keystroke of a query, like typing in the apps menu
+    for query in QUERIES:
+        def typing() -> None:
+            for end in range(1, len(query) + 1):
+                apps.search_index.search(query[:end])
+        results[f"search {query!r}"] = harness.latencies(typing, repeat)
+        results[f"search {query!r}"]["found"] = len(
+            apps.search_index.search(query)
+        )
+    return results
+
+
+def run() -> dict[str, dict[str, t.Any]]:
+    harness.setup()
+    results: dict[str, dict[str, t.Any]] = {}
+    for count in APP_COUNTS:
+        for name, result in bench_apps(count, 20).items():
+            results[f"{count} apps {name}"] = result
+    return results
+
+
+def main() -> None:
+    for name, result in run().items():
+        print(name)
+        for key, value in result.items():
+            print(f"  {key}: {value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import asyncio
+import time
+import typing as t
+from benchmarks import harness
+
+HISTORY_SIZES = (250, 1000, 5000)
+QUERIES = ("g", "gi", "git", "hello wor", "https://github", "pyhton")
+
+
+async def bench_refresh(size: int) -> dict[str, float]:
+    from src.services import cliphist
+    entries = harness.clipboard_entries(size + 10)
+    cliphist.clear()
+    harness.write_cliphist_history(entries[:size])
+
+    start = time.perf_counter()
+    await cliphist.backend.refresh()
+    harness.drain_main_context()
+    full = time.perf_counter() - start
+
+    # A few new copies since last refresh
+    harness.write_cliphist_history(entries)
+    start = time.perf_counter()
+    await cliphist.backend.refresh()
+    harness.drain_main_context()
+    incremental = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await cliphist.backend.refresh()
+    unchanged = time.perf_counter() - start
+    return {
+        "full_ms": full * 1000,
+        "incremental_ms": incremental * 1000,
+        "unchanged_ms": unchanged * 1000
+    }
+
+
+def bench_search(repeat: int) -> dict[str, dict[str, float]]:
+    from src.services import cliphist
+    results: dict[str, dict[str, float]] = {}
+    for query in QUERIES:
+        def typing() -> None:
+            for end in range(1, len(query) + 1):
+                cliphist.search_index.search(query[:end], 0.5)
+        results[f"search {query!r}"] = harness.latencies(typing, repeat)
+        results[f"search {query!r}"]["found"] = len(
+            cliphist.search_index.search(query, 0.5)
+        )
+    return results
+
+
+def run() -> dict[str, dict[str, t.Any]]:
+    harness.setup()
+    results: dict[str, dict[str, t.Any]] = {}
+    for size in HISTORY_SIZES:
+        results[f"{size} items refresh"] = asyncio.run(bench_refresh(size))
+        for name, result in bench_search(5).items():
+            results[f"{size} items {name}"] = result
+    return results
+
+
+def main() -> None:
+    for name, result in run().items():
+        print(name)
+        for key, value in result.items():
+            print(f"  {key}: {value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
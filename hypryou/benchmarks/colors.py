@@ -0,0 +1,133 @@
+import os
+import typing as t
+from benchmarks import harness
+
+IMAGE_SIZES = ((1920, 1080), (3840, 2160), (7680, 4320))
+IMAGE_FORMATS = ("jpg", "png")
+SEED_COLOR = 0xFF4285F4
+
+
+def make_wallpaper(width: int, height: int, extension: str) -> str:
+    # Smooth gradients with noise, closer to a photo than random pixels
+    import numpy as np
+    from PIL import Image
+    assert harness.workdir is not None
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    noise = rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+    pixels = np.stack((
+        np.broadcast_to(x * 200 + 30, (height, width)),
+        np.broadcast_to(y * 160 + 50, (height, width)),
+        (x + y) * 90 + 40
+    ), axis=-1) + noise
+    path = os.path.join(
+        harness.workdir, f"wallpaper-{width}x{height}.{extension}"
+    )
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(path)
+    return path
+
+
+def bench_process_image(path: str, repeat: int) -> dict[str, float]:
+    from utils import colors
+
+    def process() -> None:
+        colors.palette_cache.clear()
+        colors.process_image(path, 4, 1024)
+
+    result = harness.latencies(process, repeat)
+    result["decode_ms"] = harness.latencies(
+        lambda: colors.load_pixels(path, 4), repeat
+    )["mean_ms"]
+    result["cached_ms"] = harness.latencies(
+        lambda: colors.process_image(path, 4, 1024), repeat
+    )["mean_ms"]
+    return result
+
+
+def bench_schemes(repeat: int) -> dict[str, dict[str, float]]:
+    from utils import colors
+    from materialyoucolor.hct import Hct  # type: ignore
+    from materialyoucolor.scheme.scheme_tonal_spot import SchemeTonalSpot  # type: ignore # noqa
+
+    def schemes() -> tuple[t.Any, t.Any]:
+        return (
+            SchemeTonalSpot(Hct.from_int(SEED_COLOR), True, 0),
+            SchemeTonalSpot(Hct.from_int(SEED_COLOR), False, 0)
+        )
+
+    dark, light = schemes()
+    return {
+        "schemes": harness.latencies(schemes, repeat),
+        "color_map": harness.latencies(
+            lambda: colors.generate_color_map(dark, dark, light), repeat
+        )
+    }
+
+
+def bench_templates(repeat: int) -> dict[str, dict[str, float]]:
+    from utils import colors
+    from materialyoucolor.hct import Hct  # type: ignore
+    from materialyoucolor.scheme.scheme_tonal_spot import SchemeTonalSpot  # type: ignore # noqa
+    assert harness.workdir is not None
+    dark = SchemeTonalSpot(Hct.from_int(SEED_COLOR), True, 0)
+    light = SchemeTonalSpot(Hct.from_int(SEED_COLOR), False, 0)
+    output = os.path.join(harness.workdir, "templates")
+
+    templates: list[str] = []
+    for path in colors.get_file_list(colors.TEMPLATES_DIR):
+        with open(path) as f:
+            templates.append(f.read())
+    compiled = [colors.compile_template(template) for template in templates]
+    color_map = colors.generate_color_map(dark, dark, light)
+    template_vars = {
+        "colorScheme": "dark", "outputFolder": output, "wallpaper": ""
+    }
+
+    def compile_all() -> None:
+        for template in templates:
+            colors.compile_template(template)
+
+    def render() -> None:
+        formatter = colors.TemplateFormatter(
+            color_map, template_vars, ("compile_scss",)
+        )
+        for tokens in compiled:
+            formatter.render(tokens)
+
+    return {
+        "compile": harness.latencies(compile_all, repeat),
+        "render": harness.latencies(render, repeat),
+        "generate_templates": harness.latencies(
+            lambda: colors.generate_templates(
+                colors.TEMPLATES_DIR, output, dark, dark, light, True,
+                None, ("compile_scss",)
+            ),
+            repeat
+        )
+    }
+
+
+def run() -> dict[str, dict[str, t.Any]]:
+    harness.setup()
+    results: dict[str, dict[str, t.Any]] = {}
+    for width, height in IMAGE_SIZES:
+        for extension in IMAGE_FORMATS:
+            path = make_wallpaper(width, height, extension)
+            results[f"process_image {width}x{height} {extension}"] = (
+                bench_process_image(path, 3)
+            )
+    results.update(bench_schemes(20))
+    results.update(bench_templates(10))
+    return results
+
+
+def main() -> None:
+    for name, result in run().items():
+        print(name)
+        for key, value in result.items():
+            print(f"  {key}: {value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import random
+import string
+import time
+import typing as t
+from utils_cy.levenshtein import compute_text_match_score
+from utils_cy.levenshtein import levenshtein_distance
+from utils_cy.fuzzy import EncodedStrings, edit_distance, score_many
+
+CANDIDATE_COUNTS = (100, 1000, 5000)
+QUERIES = ("git", "hello wor", "https://github.com/")
+ALPHABET = string.ascii_lowercase + string.digits + " ./-_:"
+
+
+def measure(func: t.Callable[[], t.Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return time.perf_counter() - start
+
+
+def make_candidates(count: int, seed: int = 0) -> list[str]:
+    # Lengths roughly match `cliphist list` previews
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choices(ALPHABET, k=rng.randint(5, 100)))
+        for _ in range(count)
+    ]
+
+
+def bench_distance(length: int, repeat: int) -> dict[str, float]:
+    rng = random.Random(length)
+    s1 = "".join(rng.choices(ALPHABET, k=length))
+    s2 = "".join(rng.choices(ALPHABET, k=length))
+    old = measure(lambda: levenshtein_distance(s1, s2), repeat)
+    new = measure(lambda: edit_distance(s1, s2), repeat)
+    return {
+        "levenshtein_per_sec": repeat / old,
+        "bit_parallel_per_sec": repeat / new,
+        "speedup": old / new
+    }
+
+
+def bench_scoring(count: int, query: str) -> dict[str, float]:
+    candidates = make_candidates(count)
+    encoded = EncodedStrings(candidates)
+    repeat = max(1, 5000 // count)
+
+    def old_scores() -> list[float]:
+        return [
+            compute_text_match_score(candidate, query)
+            for candidate in candidates
+        ]
+
+    old = measure(old_scores, repeat)
+    new = measure(lambda: score_many(query, encoded), repeat)
+    return {
+        "per_item_ms": old / repeat * 1000,
+        "score_many_ms": new / repeat * 1000,
+        "speedup": old / new
+    }
+
+
+def run() -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+    for length in (8, 32, 64, 200):
+        results[f"distance {length}"] = bench_distance(
+            length, max(100, 200_000 // (length * length))
+        )
+    for count in CANDIDATE_COUNTS:
+        for query in QUERIES:
+            results[f"score {count} {query!r}"] = bench_scoring(count, query)
+    return results
+
+
+def main() -> None:
+    for name, result in run().items():
+        print(name)
+        for key, value in result.items():
+            print(f"  {key}: {value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
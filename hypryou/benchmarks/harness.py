@@ -0,0 +1,371 @@
+import asyncio
+import atexit
+import json
+import os
+import random
+import shutil
+import stat
+import statistics
+import sys
+import tempfile
+import time
+import typing as t
+
+# Stand-ins so benchmarks run without Hyprland, cliphist or installed
+# apps. setup() has to be called before config (or anything importing
+# it) is imported, paths there are computed on import.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSTANCE = "hypryou-benchmark"
+BATCH_PREFIX = "[[BATCH]]"
+BATCH_DELIMITER = "\n\n\n"
+
+WORDS = (
+    "files", "terminal", "browser", "music", "video", "editor", "office",
+    "mail", "calendar", "settings", "monitor", "network", "camera",
+    "notes", "photos", "maps", "weather", "clock", "chat", "code",
+    "disk", "archive", "viewer", "player", "manager", "studio", "git",
+    "python", "docker", "https://github.com", "hello", "world", "error"
+)
+CLASSES = (
+    "kitty", "firefox", "org.gnome.Nautilus", "code", "discord",
+    "spotify", "obsidian", "thunderbird", "org.telegram.desktop"
+)
+
+workdir: str | None = None
+
+
+def setup(path: str | None = None, keep: bool = False) -> str:
+    global workdir
+    if workdir is not None:
+        return workdir
+    if "config" in sys.modules:
+        raise RuntimeError("harness.setup() has to run before config import")
+
+    workdir = path or tempfile.mkdtemp(prefix="hypryou-bench-")
+    if not keep:
+        atexit.register(shutil.rmtree, workdir, True)
+    for directory in (
+        "runtime", "cache", "config", "data/applications", "bin"
+    ):
+        os.makedirs(os.path.join(workdir, directory), exist_ok=True)
+    os.makedirs(instance_path(), exist_ok=True)
+
+    os.environ.update({
+        "HYPRLAND_INSTANCE_SIGNATURE": INSTANCE,
+        "XDG_RUNTIME_DIR": os.path.join(workdir, "runtime"),
+        "XDG_CACHE_HOME": os.path.join(workdir, "cache"),
+        "XDG_CONFIG_HOME": os.path.join(workdir, "config"),
+        "XDG_DATA_HOME": os.path.join(workdir, "data"),
+        "XDG_DATA_DIRS": os.path.join(workdir, "data"),
+        "PATH": os.path.join(workdir, "bin") + os.pathsep +
+        os.environ.get("PATH", "")
+    })
+    # CONFIG_DIR is taken from argv[0]
+    sys.argv[0] = os.path.join(ROOT, "hypryou_ui.py")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    write_fake_cliphist()
+    return workdir
+
+
+def instance_path() -> str:
+    assert workdir is not None, "harness.setup() wasn't called"
+    return os.path.join(workdir, "runtime", "hypr", INSTANCE)
+
+
+def measure(func: t.Callable[[], t.Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return time.perf_counter() - start
+
+
+def latencies(
+    func: t.Callable[[], t.Any],
+    repeat: int
+) -> dict[str, float]:
+    samples: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": p95 * 1000,
+        "max_ms": ordered[-1] * 1000
+    }
+
+
+def drain_main_context() -> int:
+    # Ref/Signals notifications are delivered from GLib idle callbacks
+    from repository import glib
+    context = glib.MainContext.default()
+    iterations = 0
+    while context.iteration(False):
+        iterations += 1
+    return iterations
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def write_desktop_files(count: int, seed: int = 0) -> list[str]:
+    assert workdir is not None, "harness.setup() wasn't called"
+    rng = random.Random(seed)
+    folder = os.path.join(workdir, "data", "applications")
+    for file in os.listdir(folder):
+        os.unlink(os.path.join(folder, file))
+    paths: list[str] = []
+    for i in range(count):
+        name = words(rng, rng.randint(1, 3)).title()
+        path = os.path.join(folder, f"bench-app-{i}.desktop")
+        with open(path, "w") as f:
+            f.write(
+                "[Desktop Entry]\n" +
+                "Type=Application\n" +
+                f"Name={name}\n" +
+                f"Comment={words(rng, rng.randint(3, 8))}\n" +
+                f"Exec=bench-app-{i} %U\n" +
+                f"Icon={rng.choice(CLASSES)}\n" +
+                f"Keywords={';'.join(words(rng, 3).split())};\n"
+            )
+        paths.append(path)
+    return paths
+
+
+def cliphist_list_path() -> str:
+    assert workdir is not None, "harness.setup() wasn't called"
+    return os.path.join(workdir, "cliphist-list")
+
+
+def write_fake_cliphist() -> None:
+    assert workdir is not None
+    path = os.path.join(workdir, "bin", "cliphist")
+    with open(path, "w") as f:
+        f.write(
+            "#!/bin/sh\n" +
+            "case \"$1\" in\n" +
+            f"    list) cat '{cliphist_list_path()}' ;;\n" +
+            "    decode) printf 'decoded %s' \"$2\" ;;\n" +
+            "esac\n"
+        )
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    write_cliphist_history([])
+
+
+def write_cliphist_history(entries: list[str], first_id: int = 1) -> None:
+    # Newest first, like `cliphist list`
+    lines = [
+        f"{first_id + i}\t{entry}\n" for i, entry in enumerate(entries)
+    ]
+    with open(cliphist_list_path(), "w") as f:
+        f.writelines(reversed(lines))
+
+
+def clipboard_entries(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    entries: list[str] = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            width, height = rng.randint(50, 3000), rng.randint(50, 2000)
+            entries.append(
+                f"[[ binary data {rng.randint(1, 900)} KiB png " +
+                f"{width}x{height} ]]"
+            )
+        else:
+            entries.append(words(rng, rng.randint(1, 15)))
+    return entries
+
+
+def make_client(index: int, rng: random.Random) -> dict[str, t.Any]:
+    workspace = rng.randint(1, 10)
+    window_class = rng.choice(CLASSES)
+    title = words(rng, rng.randint(1, 6))
+    return {
+        "address": f"0x{0x55550000 + index:x}",
+        "mapped": True,
+        "hidden": False,
+        "at": [rng.randint(0, 1920), rng.randint(0, 1080)],
+        "size": [rng.randint(200, 1920), rng.randint(200, 1080)],
+        "workspace": {"id": workspace, "name": str(workspace)},
+        "floating": rng.random() < 0.2,
+        "pseudo": False,
+        "monitor": 0,
+        "class": window_class,
+        "title": title,
+        "initialClass": window_class,
+        "initialTitle": title,
+        "pid": 1000 + index,
+        "xwayland": False,
+        "pinned": False,
+        "fullscreen": 0,
+        "fullscreenClient": 0,
+        "grouped": [],
+        "tags": [],
+        "swallowing": "0x0",
+        "focusHistoryId": index,
+        "inhibitingIdle": False,
+        "xdgTag": "",
+        "xdgDescription": ""
+    }
+
+
+def scripted_events(
+    count: int,
+    clients: list[dict[str, t.Any]],
+    seed: int = 0
+) -> list[str]:
+    # Mix of socket2 events roughly like switching workspaces, focusing
+    # and retitling windows
+    rng = random.Random(seed)
+    addresses = [
+        client["address"].removeprefix("0x") for client in clients
+    ] or ["1"]
+    events: list[str] = []
+    for i in range(count):
+        address = rng.choice(addresses)
+        kind = rng.random()
+        if kind < 0.35:
+            events.append(f"windowtitlev2>>{address},{words(rng, 3)}")
+        elif kind < 0.6:
+            events.append(f"activewindowv2>>{address}")
+        elif kind < 0.75:
+            workspace = rng.randint(1, 10)
+            events.append(f"workspacev2>>{workspace},{workspace}")
+        elif kind < 0.85:
+            events.append(
+                f"movewindowv2>>{address},{rng.randint(1, 10)}," +
+                f"{rng.randint(1, 10)}"
+            )
+        elif kind < 0.95:
+            events.append(f"activelayout>>keyboard,{rng.choice(WORDS)}")
+        else:
+            new_address = f"{0x66660000 + i:x}"
+            events.append(
+                f"openwindow>>{new_address},1,{rng.choice(CLASSES)}," +
+                words(rng, 2)
+            )
+            events.append(f"closewindow>>{new_address}")
+    return events
+
+
+class FakeHyprland:
+    # Request socket answers the queries HyprYou makes, event socket
+    # sends scripted socket2 lines to every connected reader
+    def __init__(self, client_count: int = 50, seed: int = 0) -> None:
+        self.rng = random.Random(seed)
+        self.clients = [
+            make_client(i, self.rng) for i in range(client_count)
+        ]
+        self.requests = 0
+        self._servers: list[asyncio.Server] = []
+        self._event_writers: list[asyncio.StreamWriter] = []
+        self._readers_connected = asyncio.Event()
+
+    async def start(self) -> None:
+        path = instance_path()
+        for name, callback in (
+            (".socket.sock", self._on_request),
+            (".socket2.sock", self._on_events),
+            (".hyprsunset.sock", self._on_hyprsunset)
+        ):
+            socket_path = os.path.join(path, name)
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._servers.append(
+                await asyncio.start_unix_server(callback, socket_path)
+            )
+
+    async def close(self) -> None:
+        for writer in self._event_writers:
+            writer.close()
+        self._event_writers.clear()
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+
+    def reply(self, command: str) -> str:
+        if command.startswith(BATCH_PREFIX):
+            return BATCH_DELIMITER.join(
+                self.reply(part)
+                for part in command.removeprefix(BATCH_PREFIX).split(";")
+            )
+        self.requests += 1
+        query = command.removeprefix("j/")
+        if query == "clients":
+            return json.dumps(self.clients)
+        if query == "activeworkspace":
+            return json.dumps({"id": 1, "name": "1"})
+        if query == "workspaces":
+            return json.dumps([
+                {"id": i, "name": str(i)} for i in range(1, 11)
+            ])
+        if query == "devices":
+            return json.dumps({"keyboards": [{
+                "name": "keyboard",
+                "layout": "us,ru",
+                "active_keymap": "English (US)",
+                "main": True
+            }]})
+        if query.startswith("getoption"):
+            return json.dumps({"int": 10})
+        return "ok"
+
+    async def _on_request(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        command = (await reader.read()).decode()
+        writer.write(self.reply(command).encode())
+        await writer.drain()
+        writer.close()
+
+    async def _on_hyprsunset(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        await reader.read()
+        writer.write(b"6500")
+        await writer.drain()
+        writer.close()
+
+    async def _on_events(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        self._event_writers.append(writer)
+        self._readers_connected.set()
+
+    async def wait_for_reader(self) -> None:
+        await self._readers_connected.wait()
+
+    async def emit(self, events: list[str], close: bool = True) -> None:
+        data = "".join(f"{event}\n" for event in events).encode()
+        for writer in self._event_writers:
+            writer.write(data)
+            await writer.drain()
+            if close:
+                writer.close()
+        if close:
+            self._event_writers.clear()
+            self._readers_connected.clear()
+
+    def mutate(self, fraction: float = 0.1) -> None:
+        # Changes titles of some clients, like between two full syncs
+        for client in self.rng.sample(
+            self.clients, max(1, int(len(self.clients) * fraction))
+        ):
+            client["title"] = words(self.rng, 3)
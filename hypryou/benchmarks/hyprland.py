@@ -0,0 +1,92 @@
+import asyncio
+import time
+import typing as t
+from benchmarks import harness
+
+CLIENT_COUNTS = (10, 50, 200)
+EVENT_COUNT = 5000
+
+
+async def bench_full_sync(count: int, repeat: int) -> dict[str, float]:
+    from src.services import hyprland
+    server = harness.FakeHyprland(count)
+    await server.start()
+    try:
+        hyprland.client = hyprland.HyprlandClient()
+        hyprland.clients.value.clear()
+        await hyprland.clients_full_sync()
+        harness.drain_main_context()
+
+        samples: list[float] = []
+        for _ in range(repeat):
+            server.mutate()
+            start = time.perf_counter()
+            await hyprland.clients_full_sync()
+            harness.drain_main_context()
+            samples.append(time.perf_counter() - start)
+    finally:
+        await server.close()
+    result = harness.summarize(samples)
+    result["requests"] = server.requests
+    return result
+
+
+async def bench_events(count: int) -> dict[str, float]:
+    # Time from the first socket2 line until every event is dispatched
+    from src.services import hyprland
+    server = harness.FakeHyprland(count)
+    await server.start()
+    try:
+        hyprland.client = hyprland.HyprlandClient()
+        await hyprland.init()
+        hyprland.clients_use_counter = 1
+        await hyprland.clients_full_sync()
+        harness.drain_main_context()
+
+        events = harness.scripted_events(EVENT_COUNT, server.clients)
+        task = asyncio.create_task(hyprland.client.connect())
+        await server.wait_for_reader()
+        start = time.perf_counter()
+        await server.emit(events)
+        await task
+        hyprland.client.events.flush()
+        harness.drain_main_context()
+        elapsed = time.perf_counter() - start
+        stats = hyprland.client.events.stats
+    finally:
+        hyprland.clients_use_counter = 0
+        await server.close()
+    return {
+        "events_per_sec": len(events) / elapsed,
+        "total_ms": elapsed * 1000,
+        "received": stats.received,
+        "dispatched": stats.dispatched,
+        "merged": stats.merged
+    }
+
+
+async def run_async() -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+    for count in CLIENT_COUNTS:
+        results[f"clients_full_sync {count}"] = await bench_full_sync(
+            count, 50
+        )
+    for count in CLIENT_COUNTS:
+        results[f"events {count} clients"] = await bench_events(count)
+    return results
+
+
+def run() -> dict[str, dict[str, t.Any]]:
+    harness.setup()
+    return asyncio.run(run_async())
+
+
+def main() -> None:
+    for name, result in run().items():
+        print(name)
+        for key, value in result.items():
+            print(f"  {key}: {value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
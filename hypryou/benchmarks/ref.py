@@ -0,0 +1,82 @@
+import typing as t
+from benchmarks import harness
+
+WATCHER_COUNTS = (1, 10, 100)
+DICT_SIZES = (100, 1000)
+
+
+def noop(*args: t.Any) -> None:
+    ...
+
+
+def bench_set(watchers: int, repeat: int) -> dict[str, float]:
+    from utils.ref import Ref
+    ref = Ref(0, name="benchmark")
+    for _ in range(watchers):
+        ref.watch(noop)
+
+    def step() -> None:
+        ref.value += 1
+        harness.drain_main_context()
+
+    elapsed = harness.measure(step, repeat)
+    return {
+        "sets_per_sec": repeat / elapsed,
+        "callbacks_per_sec": repeat * watchers / elapsed
+    }
+
+
+def bench_dict_batch(size: int, repeat: int) -> dict[str, float]:
+    # Like clients/cliphist: a few keys change in one batch and
+    # watchers only get patches
+    from utils.ref import Ref
+    ref = Ref[dict[str, int]](
+        {str(i): i for i in range(size)}, name="benchmark_dict"
+    )
+    patches = 0
+
+    def on_patches(value: t.Any) -> None:
+        nonlocal patches
+        patches += len(value)
+
+    ref.watch_patches(on_patches)
+    counter = size
+
+    def step() -> None:
+        nonlocal counter
+        with ref.batch():
+            for i in range(10):
+                ref.value[str(counter + i)] = i
+            for i in range(10):
+                del ref.value[str(counter - size + i)]
+        counter += 10
+        harness.drain_main_context()
+
+    elapsed = harness.measure(step, repeat)
+    return {
+        "batches_per_sec": repeat / elapsed,
+        "patches_per_batch": patches / repeat
+    }
+
+
+def run() -> dict[str, dict[str, float]]:
+    harness.setup()
+    results: dict[str, dict[str, float]] = {}
+    for watchers in WATCHER_COUNTS:
+        results[f"set {watchers} watchers"] = bench_set(
+            watchers, max(100, 20_000 // watchers)
+        )
+    for size in DICT_SIZES:
+        results[f"dict batch {size}"] = bench_dict_batch(size, 200)
+    return results
+
+
+def main() -> None:
+    for name, result in run().items():
+        print(name)
+        for key, value in result.items():
+            print(f"  {key}: {value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
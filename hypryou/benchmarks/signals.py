@@ -0,0 +1,72 @@
+import time
+import typing as t
+from utils.service import Signals
+
+HANDLER_COUNTS = (10, 100, 1000)
+
+
+def noop(*args: t.Any) -> None:
+    ...
+
+
+def measure(func: t.Callable[[], t.Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return time.perf_counter() - start
+
+
+def bench_watch(count: int) -> float:
+    signals = Signals()
+    start = time.perf_counter()
+    for i in range(count):
+        signals.watch("changed", noop, priority=i % 3)
+    return time.perf_counter() - start
+
+
+def bench_notify(count: int, repeat: int) -> float:
+    signals = Signals()
+    for i in range(count):
+        signals.watch("changed", noop, priority=i % 3)
+    return measure(lambda: signals.notify_sync("changed", 1), repeat)
+
+
+def bench_churn(count: int, repeat: int) -> float:
+    # Subscribe + emit + unsubscribe, e.g. widgets created in popups
+    signals = Signals()
+    for i in range(count):
+        signals.watch("changed", noop, priority=i % 3)
+
+    def step() -> None:
+        handler_id = signals.watch("changed", noop)
+        signals.notify_sync("changed", 1)
+        signals.unwatch(handler_id)
+
+    return measure(step, repeat)
+
+
+def run() -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+    for count in HANDLER_COUNTS:
+        repeat = max(10, 100_000 // count)
+        watch_time = bench_watch(count)
+        notify_time = bench_notify(count, repeat)
+        churn_time = bench_churn(count, max(10, repeat // 10))
+        results[str(count)] = {
+            "watch_per_sec": count / watch_time,
+            "notify_per_sec": repeat / notify_time,
+            "callbacks_per_sec": repeat * count / notify_time,
+            "churn_per_sec": max(10, repeat // 10) / churn_time
+        }
+    return results
+
+
+def main() -> None:
+    for count, result in run().items():
+        print(f"{count} handlers")
+        for key, value in result.items():
+            print(f"  {key}: {value:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -49,12 +49,19 @@ default_settings: dict[str, t.Any] = {
     "light_icons": "Tela-nord-light",
     "opacity": 1.0,
     "wallpaper": f"{CONFIG_DIR}/assets/default_wallpaper.jpg",
+    # Empty means the folder of the current wallpaper
+    "wallpaper_folder": "",
+    "prewarm_palettes": True,
     "separated_workspaces": False,
     "one_popup_at_time": True,
     "power_menu_cancel_button": True,
     "gtk4_theme": True,
     "gtk3_theme": True,
     "secure_cliphist": False,
+    "notification_history": True,
+    "notification_history_days": 30,
+    "notification_rate_limit": 5,
+    "notification_burst": 10,
     "floating_sidebar": False,
 
     "blur": True,
@@ -35,6 +35,7 @@ from src.services.audio import AudioService
 from src.services.clock import ClockService
 from src.services.network import NetworkService
 from src.services.bluetooth_agent import BluetoothAgentService
+from src.services.palettes import PalettesService
 
 import src.services.cliphist as cliphist
 
@@ -79,7 +80,8 @@ services: tuple[AsyncService | Service, ...] = (
     BacklightService(),
     AudioService(),
     ClockService(),
-    BluetoothAgentService()
+    BluetoothAgentService(),
+    PalettesService()
 )
 
 popups_types = (
@@ -312,3 +314,4 @@ if __name__ == "__main__":
             cliphist.secure_clear()
         for service in services:
             service.on_close()
+        utils.colors.worker.shutdown()
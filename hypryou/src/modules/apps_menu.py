@@ -1,6 +1,7 @@
 from functools import lru_cache
 from repository import gtk, gdk, layer_shell, glib, pango
 from src.services.apps import Application, apps, reload as apps_reload
+from src.services.apps import search as apps_search
 from utils import sync_debounce, toggle_css_class
 from utils.logger import logger
 from config import HyprlandVars
@@ -33,7 +34,7 @@ def cache_icon(icon: str | None) -> gtk.IconPaintable | None:
 class AppItem(gtk.Revealer):
     __gtype_name__ = "AppItem"
 
-    def __init__(self, item: Application, search: str) -> None:
+    def __init__(self, item: Application) -> None:
         self.on_click = sync_debounce(750, 1, True)(self._on_click)
         self.box = gtk.Box(
             css_classes=("app-item-box",)
@@ -47,7 +48,8 @@ class AppItem(gtk.Revealer):
             css_classes=("app-item-revealer",),
             child=self.button,
             transition_duration=250,
-            transition_type=gtk.RevealerTransitionType.SLIDE_DOWN
+            transition_type=gtk.RevealerTransitionType.SLIDE_DOWN,
+            reveal_child=True
         )
         self.item = item
 
@@ -67,8 +69,6 @@ class AppItem(gtk.Revealer):
         self.box.append(self.icon)
         self.box.append(self.label)
 
-        self.update_search(search)
-
         self.on_click_handler = self.button.connect("clicked", self.on_click)
 
     def _on_click(self, *args: t.Any) -> None:
@@ -78,12 +78,6 @@ class AppItem(gtk.Revealer):
         close_window("apps_menu")
         self.item.launch()
 
-    def update_search(self, search: str) -> None:
-        if not search or not search.strip():
-            self.set_reveal_child(True)
-        else:
-            self.set_reveal_child(self.item.match(search))
-
     def destroy(self) -> None:
         self.button.disconnect(self.on_click_handler)
         del self.on_click
@@ -134,11 +128,11 @@ class AppsBox(gtk.Box):
         self.append(self.search_box)
         self.append(self.scrollable)
 
+        self.last_highest: tuple[Application, AppItem] | None = None
+
         self.update_apps(apps.value)
         self.handler_id = apps.watch(self.update_apps)
 
-        self.last_highest: tuple[Application, AppItem] | None = None
-
         if __debug__:
             weakref.finalize(self, lambda: logger.debug("AppsBox finalized"))
 
@@ -148,14 +142,24 @@ class AppsBox(gtk.Box):
 
     @sync_debounce(150)
     def on_search(self, *args: t.Any) -> None:
-        text = self.entry.get_text()
-        for item in self._apps.values():
-            item.update_search(text)
-        if len(text.strip()) > 0:
-            self.hint_highest()
-        elif self.last_highest:
-            toggle_css_class(self.last_highest[1], "highest", False)
-            self.last_highest = None
+        self.search = self.entry.get_text()
+        self.apply_search()
+
+    def apply_search(self) -> None:
+        if not self.search.strip():
+            for item in self._apps.values():
+                item.set_reveal_child(True)
+            self.hint_highest(None)
+            return
+
+        # Ranked by score and frequency
+        found = apps_search(self.search)
+        matched = set(found)
+        for app, item in self._apps.items():
+            item.set_reveal_child(app in matched)
+        self.hint_highest(
+            next((app for app in found if app in self._apps), None)
+        )
 
     def destroy(self) -> None:
         for key, item in self._apps.items():
@@ -166,17 +170,8 @@ class AppsBox(gtk.Box):
         apps.unwatch(self.handler_id)
         cache_icon.cache_clear()
 
-    def hint_highest(self) -> None:
-        items = list(self._apps.items())
-        highest: tuple[Application, AppItem] | None = None
-        for item in items:
-            if item[1].get_reveal_child() and (
-                not highest
-                or item[0].score + item[0].frequency / 50 >
-                highest[0].score + highest[0].frequency / 50
-            ):
-                highest = item
-
+    def hint_highest(self, app: Application | None) -> None:
+        highest = (app, self._apps[app]) if app else None
         if not highest and self.last_highest:
             toggle_css_class(self.last_highest[1], "highest", False)
             self.last_highest = None
@@ -211,7 +206,7 @@ class AppsBox(gtk.Box):
         to_remove = existing - desired
 
         for app in to_add:
-            widget = AppItem(app, self.search)
+            widget = AppItem(app)
             self._apps[app] = widget
 
         for app in to_remove:
@@ -220,6 +215,8 @@ class AppsBox(gtk.Box):
             self.list.remove(widget)
 
         self.sort_by_frequent()
+        if self.search.strip():
+            self.apply_search()
 
 
 class AppsWindow(widget.LayerWindow):
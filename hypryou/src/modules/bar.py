@@ -700,10 +700,10 @@ class AudioApplet(Applet):
         )
         self.add_controller(self.scroll)
 
-        self.volume_handler = audio.volume.watch(
+        self.volume_handler = audio.volume_tooltip.watch(
             self.update_tooltip
         )
-        self.update_tooltip()
+        self.update_tooltip(audio.volume_tooltip.value)
         self._last_scroll = 0.0
 
     def on_click_released(
@@ -721,13 +721,13 @@ class AudioApplet(Applet):
         elif button_number == gdk.BUTTON_SECONDARY:
             audio.volume_muted.value = not audio.volume_muted.value
 
-    def update_tooltip(self, *args: t.Any) -> None:
-        self.set_tooltip_text(f"Volume: {int(audio.volume.value)}%")
+    def update_tooltip(self, tooltip: str) -> None:
+        self.set_tooltip_text(tooltip)
 
     def destroy(self) -> None:
         self.remove_controller(self.scroll)
         self.scroll.disconnect(self.scroll_handler)
-        audio.volume.unwatch(self.volume_handler)
+        audio.volume_tooltip.unwatch(self.volume_handler)
         super().destroy()
 
     def open_pavucontrol(self) -> None:
@@ -755,36 +755,17 @@ class MicApplet(Applet):
     def __init__(self) -> None:
         super().__init__(
             "microphone",
-            "mic_off",
+            audio.mic_icon,
             self.open_mics_menu
         )
 
-        self.ref_handlers: dict[Ref[t.Any], int] = {
-            audio.microphones: audio.microphones.watch(
-                self.on_mics_changed
-            ),
-            audio.mic_muted: audio.mic_muted.watch(
-                self.update_icon
-            ),
-            audio.recorders: audio.recorders.watch(
-                self.update_icon
-            )
-        }
-        self.on_mics_changed(audio.microphones.value)
-        self.update_icon()
-
-    def update_icon(self, *args: t.Any) -> None:
-        muted = audio.mic_muted.value
-        is_recording = len(audio.recorders.value) > 0
-        if muted:
-            self.set_label("mic_off")
-        elif is_recording:
-            self.set_label("mic_double")
-        else:
-            self.set_label("mic")
+        self.visible_handler = audio.has_microphones.watch(
+            self.on_mics_changed
+        )
+        self.on_mics_changed(audio.has_microphones.value)
 
-    def on_mics_changed(self, new_list: set[t.Any]) -> None:
-        self.set_visible(len(new_list) > 0)
+    def on_mics_changed(self, has_microphones: bool) -> None:
+        self.set_visible(has_microphones)
 
     def on_click_released(
         self,
@@ -802,8 +783,7 @@ class MicApplet(Applet):
             audio.mic_muted.value = not audio.mic_muted.value
 
     def destroy(self) -> None:
-        for ref, handler in self.ref_handlers.items():
-            ref.unwatch(handler)
+        audio.has_microphones.unwatch(self.visible_handler)
         super().destroy()
 
     def open_mics_menu(self) -> None:
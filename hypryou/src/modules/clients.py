@@ -6,10 +6,15 @@ from utils.logger import logger
 from src.services.hyprland import clients, Client
 from src.services.hyprland import acquire_clients, release_clients
 import src.services.hyprland as hyprland
+from utils.ref import Patch, PatchOp
 import typing as t
 import asyncio
 
 
+def sort_key(item: Client) -> tuple[int, ...]:
+    return (0 - item.workspace_id, item.pid, *item.at)
+
+
 class ClientItem(gtk.Box):
     __gtype_name__ = "ClientItem"
 
@@ -121,27 +126,62 @@ class ClientsBox(gtk.ScrolledWindow):
             vscrollbar_policy=gtk.PolicyType.AUTOMATIC,
             hscrollbar_policy=gtk.PolicyType.NEVER
         )
-        self.handler_id = clients.watch(self.update_items)
+        self.handler_id = clients.watch_patches(self.on_patches)
         self.update_items(clients.value)
         if __debug__:
             weakref.finalize(
                 self, lambda: logger.debug("ClientsBox finalized")
             )
 
+    def on_patches(self, patches: list[Patch]) -> None:
+        for patch in patches:
+            if patch.op == PatchOp.RESET:
+                self.update_items(clients.value)
+                return
+            if patch.op != PatchOp.INSERT:
+                self.remove_item(patch.key)
+            if patch.op != PatchOp.REMOVE:
+                self.add_item(patch.key, patch.value, sort=True)
+
+        self.no_items_label.set_reveal_child(len(self.items) == 0)
+
+    def add_item(self, key: str, item: Client, sort: bool = False) -> None:
+        if key in self.items:
+            return
+        client_widget = ClientItem(item)
+        self.items[key] = client_widget
+        if not sort:
+            self.list.append(client_widget)
+            return
+
+        # Same order as sort_items() without re-adding all children
+        item_key = sort_key(item)
+        previous: ClientItem | None = None
+        child = self.list.get_first_child()
+        while isinstance(child, ClientItem):
+            if sort_key(child._item) <= item_key:
+                break
+            previous = child
+            child = child.get_next_sibling()
+        self.list.insert_child_after(client_widget, previous)
+
+    def remove_item(self, key: str) -> None:
+        if key not in self.items:
+            return
+        item = self.items.pop(key)
+        item.destroy()
+        self.list.remove(item)
+
     def update_items(self, new_items: dict[str, Client]) -> None:
         existing_items = set(self.items.keys())
         clients_items = set(new_items.keys())
         for item in clients_items:
             if item not in existing_items:
-                client_widget = ClientItem(clients.value[item])
-                self.items[item] = client_widget
-                self.list.append(client_widget)
+                self.add_item(item, new_items[item])
 
         for item in existing_items:
             if item not in clients_items:
-                self.items[item].destroy()
-                self.list.remove(self.items[item])
-                del self.items[item]
+                self.remove_item(item)
 
         self.no_items_label.set_reveal_child(len(self.items) == 0)
         self.sort_items()
@@ -150,11 +190,7 @@ class ClientsBox(gtk.ScrolledWindow):
         new_dict = dict(
             sorted(
                 self.items.items(),
-                key=lambda item: (
-                    0 - item[1]._item.workspace_id,
-                    item[1]._item.pid,
-                    *item[1]._item.at
-                )
+                key=lambda item: sort_key(item[1]._item)
             )
         )
         self.items = new_dict
@@ -173,7 +209,7 @@ class ClientsBox(gtk.ScrolledWindow):
         self.box.remove(self.no_items_label)
         self.items.clear()
         self.set_child(None)
-        clients.unwatch(self.handler_id)
+        clients.unwatch_patches(self.handler_id)
 
 
 class ClientsWindow(widget.LayerWindow):
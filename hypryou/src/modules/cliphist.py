@@ -1,182 +1,160 @@
-from repository import gtk, layer_shell, glib, pango
-from src.services.cliphist import items, repopulate, save_cache_file
-from src.services.cliphist import clear_tmp
-from src.services.cliphist import copy_by_id
+from repository import gtk, gdk, gio, gobject, layer_shell, pango
+from src.services.cliphist import items, repopulate, thumbnail_size
+from src.services.cliphist import copy_by_id, backend, thumbnailer
+from src.services.cliphist import search_index
 from utils import sync_debounce, toggle_css_class
+from utils.ref import Patch, PatchOp
 from utils.logger import logger
 from config import HyprlandVars
 import weakref
 import typing as t
 import re
-from utils_cy.levenshtein import compute_text_match_score
-from utils_cy.levenshtein import token_set_ratio
 from src.services.state import close_window
 from src import widget
 
 FOUND_THRESHOLD = 0.5
+PAGE_SIZE = 50
 data_regex = re.compile(
     r"\[\[ binary data (\d+) (KiB|MiB) (\w+) (\d+)x(\d+) \]\]"
 )
 
 
-def normalize_string(s: str) -> str:
-    s = re.sub(r"[-_]", " ", s)
-    s = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", s)
-    return s.lower()
+class ClipEntry(gobject.Object):
+    __gtype_name__ = "ClipHistoryEntry"
+
+    def __init__(self, item_id: str, content: str) -> None:
+        super().__init__()
+        self.item_id = item_id
+        self.content = content
+        self.show_image = False
+        self.highest = False
+        self.check_is_image()
+
+    def check_is_image(self) -> None:
+        match = data_regex.match(self.content)
+        if match:
+            format = match[3]
+            if format == "png":
+                self.width = int(match[4])
+                self.height = int(match[5])
+                self.is_image = True
+                self.format: str | None = format
+                return
+
+        self.width = 0
+        self.height = 0
+        self.is_image = False
+        self.format = None
 
 
-class ClipItem(gtk.Revealer):
-    __gtype_name__ = "ClipHistoryItem"
+class ClipRow(gtk.Box):
+    __gtype_name__ = "ClipHistoryRow"
 
-    def __init__(self, item: tuple[str, str], search: str) -> None:
+    def __init__(self) -> None:
         self.on_activate = sync_debounce(750, 1, True)(self._on_activate)
         self.button = gtk.Button(
             css_classes=("cliphist-item",),
-            tooltip_text=item[1]
+            hexpand=True
         )
         super().__init__(
             css_classes=("cliphist-item-revealer",),
-            child=self.button,
-            transition_duration=250,
-            transition_type=gtk.RevealerTransitionType.SLIDE_DOWN
         )
-        self.score = -1.0
-        self.item = item
-        self.show_image = False
+        self.append(self.button)
+        self.entry: ClipEntry | None = None
         self._child: gtk.Box | gtk.Label | None = None
 
-        self.search_strings = (
-            self.item[1],
-            normalize_string(self.item[1])
-        )
+        self.on_click_handler = self.button.connect("clicked", self.on_click)
 
-        self.check_is_image()
+    def bind(self, entry: ClipEntry) -> None:
+        self.entry = entry
+        self.button.set_tooltip_text(entry.content)
+        toggle_css_class(self, "is-image", entry.is_image)
+        toggle_css_class(self, "highest", entry.highest)
         self.update_widget()
 
-        self.update_search(search)
-
-        self.on_click_handler = self.button.connect("clicked", self.on_click)
-
-    def idle_widget(self) -> None:
+    def unbind(self) -> None:
+        self.entry = None
         self.button.set_child(None)
         self._child = None
-        self.show_image = False
-        clear_tmp()
 
     def update_widget(self) -> None:
-        if self.show_image and not isinstance(self._child, gtk.Box):
-            file = save_cache_file(self.item[0])
-
-            image_widget = gtk.Box(
+        entry = self.entry
+        if entry is None:
+            return
+        if entry.show_image:
+            width, height = thumbnail_size(entry.width, entry.height)
+            picture = gtk.Picture(
                 css_classes=("preview",),
                 halign=gtk.Align.START,
-                valign=gtk.Align.START
+                valign=gtk.Align.START,
+                content_fit=gtk.ContentFit.COVER,
+                overflow=gtk.Overflow.HIDDEN
             )
-            self.button.set_child(image_widget)
-            self._child = image_widget
-
-            max_width_rem = 27
-            width_px = (self.width / self.height) * 200
-            width_rem = width_px / 16
-
-            css = f"background-image: url('file://{file}');"
-
-            if width_rem > max_width_rem:
-                new_height_rem = (200 / width_px) * max_width_rem
-                css += (
-                    f"min-height: {new_height_rem:.2f}rem; " +
-                    f"min-width: {max_width_rem:.2f}rem;"
-                )
-            else:
-                css += (
-                    f"min-height: {200/16:.2f}rem; " +
-                    f"min-width: {width_rem:.2f}rem;"
-                )
-
-            css_provider = gtk.CssProvider()
-            image_widget.get_style_context().add_provider(
-                css_provider,
-                gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+            picture.set_size_request(width, height)
+            self.button.set_child(picture)
+            self._child = picture
+
+            # Never upscale, gtk.Picture does that on its own
+            scale = self.get_scale_factor()
+            thumbnailer.load(
+                entry.item_id,
+                min(width * scale, entry.width),
+                min(height * scale, entry.height),
+                lambda texture: self.on_thumbnail(entry, picture, texture)
             )
-            css_provider.load_from_data(f"box {{ {css} }}")
-        elif not isinstance(self._child, gtk.Label):
-            if self.is_image:
-                format = self.format.capitalize()
-                label_widget = gtk.Label(
-                    label=(
-                        f"{format} image ({self.width}x{self.height}), " +
-                        "click to reveal."
-                    ),
-                    css_classes=("label",)
-                )
-                self.button.set_child(label_widget)
-                self._child = label_widget
-            else:
-                label_widget = gtk.Label(
-                    label=self.item[1],
-                    ellipsize=pango.EllipsizeMode.END,
-                    css_classes=("label",),
-                    halign=gtk.Align.START
-                )
-                self.button.set_child(label_widget)
-                self._child = label_widget
-
-    def check_is_image(self) -> None:
-        match = data_regex.match(self.item[1])
-        if match:
-            format = match[3]
-            if format == "png":
-                self.add_css_class("is-image")
-                self.width = int(match[4])
-                self.height = int(match[5])
-                self.is_image = True
-                self.format = format
-                return
-
-        self.width = 0
-        self.height = 0
-        self.is_image = False
-        self.format = None
+        elif entry.is_image:
+            format = (entry.format or "").capitalize()
+            label_widget = gtk.Label(
+                label=(
+                    f"{format} image ({entry.width}x{entry.height}), " +
+                    "click to reveal."
+                ),
+                css_classes=("label",)
+            )
+            self.button.set_child(label_widget)
+            self._child = label_widget
+        else:
+            label_widget = gtk.Label(
+                label=entry.content,
+                ellipsize=pango.EllipsizeMode.END,
+                css_classes=("label",),
+                halign=gtk.Align.START
+            )
+            self.button.set_child(label_widget)
+            self._child = label_widget
+
+    def on_thumbnail(
+        self,
+        entry: ClipEntry,
+        picture: gtk.Picture,
+        texture: gdk.Texture | None
+    ) -> None:
+        # Row could be rebound while the thumbnail was loading
+        if self.entry is not entry or self._child is not picture:
+            return
+        picture.set_paintable(texture)
 
     def on_click(self, *args: t.Any) -> None:
-        if self.is_image:
-            self.show_image = True
+        if self.entry is None:
+            return
+        if self.entry.is_image and not self.entry.show_image:
+            self.entry.show_image = True
             self.update_widget()
         self.on_activate()
 
     def _on_activate(self, *args: t.Any) -> None:
-        self._activate()
-
-    def _activate(self, *args: t.Any) -> None:
-        close_window("cliphist")
-        copy_by_id(self.item[0])
-
-    def update_search(self, search: str, search_normalized: str = "") -> None:
-        if not search or not search.strip():
-            self.set_reveal_child(True)
-            self.score = -1
-        else:
-            scores = []
-            for string in self.search_strings:
-                raw_score = compute_text_match_score(string, search)
-                normalized_score = (
-                    compute_text_match_score(string, search_normalized)
-                    if search_normalized else -1
-                )
-                token_score = (
-                    token_set_ratio(string, search)
-                )
-                score = max(raw_score, normalized_score, token_score)
-                scores.append(score)
-
-            max_score = max(*scores)
-            self.set_reveal_child(max_score >= FOUND_THRESHOLD)
-            self.score = max_score
+        if self.entry is not None:
+            activate(self.entry)
 
     def destroy(self) -> None:
         self.button.disconnect(self.on_click_handler)
 
 
+def activate(entry: ClipEntry) -> None:
+    close_window("cliphist")
+    copy_by_id(entry.item_id)
+
+
 class ClipHistoryBox(gtk.Box):
     __gtype_name__ = "ClipHistoryBox"
 
@@ -188,9 +166,20 @@ class ClipHistoryBox(gtk.Box):
             vexpand=True,
             halign=gtk.Align.FILL
         )
-        self.list = gtk.Box(
+        # Only rows in view are realized, entries are added to the model
+        # page by page while scrolling
+        self.store = gio.ListStore(item_type=ClipEntry)
+        self.factory = gtk.SignalListItemFactory()
+        self.factory_handlers = (
+            self.factory.connect("setup", self.on_setup),
+            self.factory.connect("bind", self.on_bind),
+            self.factory.connect("unbind", self.on_unbind),
+            self.factory.connect("teardown", self.on_teardown)
+        )
+        self.list = gtk.ListView(
             css_classes=("cliphist-list",),
-            orientation=gtk.Orientation.VERTICAL,
+            model=gtk.NoSelection(model=self.store),
+            factory=self.factory,
             vexpand=True
         )
         self.scrollable = gtk.ScrolledWindow(
@@ -200,6 +189,11 @@ class ClipHistoryBox(gtk.Box):
             child=self.list,
             vexpand=True
         )
+        self.adjustment = self.scrollable.get_vadjustment()
+        self.adjustment_handlers = (
+            self.adjustment.connect("value-changed", self.on_scroll),
+            self.adjustment.connect("changed", self.on_adjustment_changed)
+        )
 
         self.search_box = gtk.Box(
             css_classes=("misc--search", "search")
@@ -217,86 +211,200 @@ class ClipHistoryBox(gtk.Box):
             self.entry.connect("activate", self.on_entry_enter)
         )
 
-        self._items: dict[str, ClipItem] = {}
+        # Search results in rank order, first `loaded` of them were
+        # paged into the store. None while browsing, then pages are
+        # taken from the backend below `cursor`, the oldest shown id.
+        self.keys: list[str] | None = None
+        self.loaded = 0
+        self.cursor: int | None = None
+        self._entries: dict[str, ClipEntry] = {}
+        self.last_highest: ClipEntry | None = None
 
         self.append(self.search_box)
         self.append(self.scrollable)
 
-        self.update_items(items.value)
-        self.handler_id = items.watch(self.update_items)
-
-        self.last_highest: tuple[str, ClipItem] | None = None
+        self.update_items()
+        self.handler_id = items.watch_patches(self.on_patches)
 
         if __debug__:
-            weakref.finalize(self, lambda: logger.debug("AppsBox finalized"))
+            weakref.finalize(
+                self, lambda: logger.debug("ClipHistoryBox finalized")
+            )
+
+    def on_setup(
+        self,
+        factory: gtk.SignalListItemFactory,
+        list_item: gtk.ListItem
+    ) -> None:
+        list_item.set_child(ClipRow())
+
+    def on_bind(
+        self,
+        factory: gtk.SignalListItemFactory,
+        list_item: gtk.ListItem
+    ) -> None:
+        row = t.cast(ClipRow, list_item.get_child())
+        row.bind(t.cast(ClipEntry, list_item.get_item()))
+
+    def on_unbind(
+        self,
+        factory: gtk.SignalListItemFactory,
+        list_item: gtk.ListItem
+    ) -> None:
+        row = t.cast(ClipRow, list_item.get_child())
+        row.unbind()
+
+    def on_teardown(
+        self,
+        factory: gtk.SignalListItemFactory,
+        list_item: gtk.ListItem
+    ) -> None:
+        row = list_item.get_child()
+        if isinstance(row, ClipRow):
+            row.destroy()
+
+    def on_scroll(self, adjustment: gtk.Adjustment) -> None:
+        remaining = (
+            adjustment.get_upper()
+            - adjustment.get_value()
+            - adjustment.get_page_size()
+        )
+        if remaining < adjustment.get_page_size():
+            self.load_more()
+
+    def on_adjustment_changed(self, adjustment: gtk.Adjustment) -> None:
+        # Nothing to scroll yet, so on_scroll would never load more
+        page_size = adjustment.get_page_size()
+        if page_size > 0 and adjustment.get_upper() <= page_size:
+            self.load_more()
+
+    def get_entry(self, item_id: str) -> ClipEntry | None:
+        entry = self._entries.get(item_id)
+        if entry is None:
+            content = items.value.get(item_id)
+            if content is None:
+                return None
+            entry = ClipEntry(item_id, content)
+            self._entries[item_id] = entry
+        return entry
+
+    def next_page(self) -> list[str]:
+        if self.keys is None:
+            page = backend.page(self.cursor, PAGE_SIZE)
+            if page:
+                self.cursor = int(page[-1])
+            return page
+        page = self.keys[self.loaded:self.loaded + PAGE_SIZE]
+        self.loaded += len(page)
+        return page
+
+    def load_more(self) -> None:
+        while page := self.next_page():
+            # Items could be deleted after search keys were taken
+            entries = [
+                entry for item_id in page
+                if (entry := self.get_entry(item_id)) is not None
+            ]
+            if entries:
+                self.store.splice(self.store.get_n_items(), 0, entries)
+                return
+
+    def show_keys(self, keys: list[str] | None) -> None:
+        self.keys = keys
+        self.loaded = 0
+        self.cursor = None
+        self._entries.clear()
+        self.store.remove_all()
+        self.load_more()
+        self.adjustment.set_value(0)
+        self.on_adjustment_changed(self.adjustment)
 
     def on_entry_enter(self, *args: t.Any) -> None:
         if self.last_highest:
-            self.last_highest[1]._activate()
+            activate(self.last_highest)
 
     @sync_debounce(150)
     def on_search(self, *args: t.Any) -> None:
-        text = self.entry.get_text()
-        normalized = normalize_string(text)
-        for item in self._items.values():
-            item.update_search(text, normalized)
-        if len(text.strip()) > 0:
-            self.hint_highest()
-        elif self.last_highest:
-            toggle_css_class(self.last_highest[1], "highest", False)
-            self.last_highest = None
+        self.search = self.entry.get_text()
+        self.apply_search()
+
+    def apply_search(self) -> None:
+        if not self.search.strip():
+            self.update_items()
+            return
+
+        self.show_keys(search_index.search(self.search, FOUND_THRESHOLD))
+        self.hint_highest()
 
     def destroy(self) -> None:
-        items.unwatch(self.handler_id)
+        items.unwatch_patches(self.handler_id)
         for handler in self.entry_handlers:
             self.entry.disconnect(handler)
+        for handler in self.factory_handlers:
+            self.factory.disconnect(handler)
+        for handler in self.adjustment_handlers:
+            self.adjustment.disconnect(handler)
 
-    def idle_items(self) -> None:
-        for key, item in self._items.items():
-            item.idle_widget()
-
-    def update_items_widgets(self) -> None:
-        for key, item in self._items.items():
-            item.update_widget()
+    def reset(self) -> None:
+        # Drop everything except the first page
+        self.search = ""
+        self.update_items()
 
     def hint_highest(self) -> None:
-        items = list(self._items.items())
-        highest: tuple[str, ClipItem] | None = None
-        for item in items:
-            if item[1].get_reveal_child() and (
-                not highest
-                or item[1].score > highest[1].score
-            ):
-                highest = item
-
-        if not highest and self.last_highest:
-            toggle_css_class(self.last_highest[1], "highest", False)
-            self.last_highest = None
-        elif not highest:
+        highest = (
+            self._entries.get(self.keys[0])
+            if self.search.strip() and self.keys
+            else None
+        )
+        if highest is self.last_highest:
             return
-        elif not self.last_highest or self.last_highest[1] is not highest[1]:
-            toggle_css_class(highest[1], "highest", True)
-            if self.last_highest:
-                toggle_css_class(self.last_highest[1], "highest", False)
-            self.last_highest = highest
-
-    def update_items(self, new_items: dict[str, str]) -> None:
-        existing = set(self._items.keys())
-        desired = set(new_items)
+        for entry in (self.last_highest, highest):
+            if entry is None:
+                continue
+            entry.highest = entry is highest
+            found, position = self.store.find(entry)
+            if found:
+                # Rebinds the row
+                self.store.items_changed(position, 1, 1)
+        self.last_highest = highest
+
+    def add_item(self, item_id: str) -> None:
+        if item_id in self._entries:
+            return
+        # New items are the newest ones
+        entry = self.get_entry(item_id)
+        if entry is None:
+            return
+        if self.cursor is None:
+            self.cursor = int(item_id)
+        self.store.insert(0, entry)
 
-        to_add = [item_id for item_id in new_items if item_id not in existing]
-        to_add.sort(key=int, reverse=False)
-        to_remove = existing - desired
+    def remove_item(self, item_id: str) -> None:
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return
+        found, position = self.store.find(entry)
+        if found:
+            self.store.remove(position)
+        if entry is self.last_highest:
+            self.last_highest = None
 
-        for item_id in to_add:
-            widget = ClipItem((item_id, new_items[item_id]), self.search)
-            self._items[item_id] = widget
-            self.list.insert_child_after(widget, None)
+    def on_patches(self, patches: list[Patch]) -> None:
+        if self.search.strip():
+            self.apply_search()
+            return
+        for patch in patches:
+            if patch.op == PatchOp.RESET:
+                self.update_items()
+                return
+            if patch.op != PatchOp.INSERT:
+                self.remove_item(patch.key)
+            if patch.op != PatchOp.REMOVE:
+                self.add_item(patch.key)
 
-        for item_id in to_remove:
-            widget = self._items.pop(item_id)
-            widget.destroy()
-            self.list.remove(widget)
+    def update_items(self) -> None:
+        self.show_keys(None)
+        self.hint_highest()
 
 
 class ClipHistoryWindow(widget.LayerWindow):
@@ -331,19 +439,18 @@ class ClipHistoryWindow(widget.LayerWindow):
             )
 
     def on_show(self) -> None:
-        glib.idle_add(repopulate)
+        repopulate()
+        backend.watch()
         if not self._child:
             self._child = ClipHistoryBox()
             self.set_child(self._child)
-            self._child.entry.grab_focus()
-        else:
-            self._child.entry.grab_focus()
-            self._child.update_items_widgets()
+        self._child.entry.grab_focus()
 
     def on_hide(self) -> None:
+        backend.unwatch()
         if self._child:
             self._child.entry.set_text("")
-            self._child.idle_items()
+            self._child.reset()
 
     def destroy(self) -> None:
         super().destroy()
@@ -1,9 +1,10 @@
 from repository import gtk, glib, pango, gdk, gio
 from src.services.notifications import Notification, NotificationClosedReason
 from src.services.notifications import Category, NotificationUrgency
+from src.services.notification_history import HistoryEntry
 from src import widget
 import typing as t
-from utils import get_formatted_time, toggle_css_class
+from utils import get_formatted_time, get_formatted_date, toggle_css_class
 from config import Settings
 import datetime
 import json
@@ -44,30 +45,18 @@ def get_is_sensitive(item: "NotificationItem") -> bool:
     return False
 
 
-class NotificationItem(gtk.Box):
-    __gtype_name__ = "NotificationItem"
+class NotificationLayout(gtk.Box):
+    # Header and text shared by live notifications and history entries
+    __gtype_name__ = "NotificationLayout"
 
-    def __init__(
-        self,
-        item: Notification,
-        show_dismiss: bool = False,
-        hide_sensitive_content: bool = False
-    ) -> None:
-        self.is_destroyed = False
-        self.hide_content = hide_sensitive_content
-        if item.hints.get("transient") and show_dismiss:
-            show_dismiss = False
-        self.item = item
+    def __init__(self, css_classes: tuple[str, ...]) -> None:
         super().__init__(
-            css_classes=("notification",),
+            css_classes=css_classes,
             orientation=gtk.Orientation.VERTICAL,
             halign=gtk.Align.END,
             valign=gtk.Align.START
         )
 
-        self._cached_detected: t.Literal["critical", "messages"] | None = None
-        self.conns: dict[gtk.Widget, int] = {}
-
         # Notification header
         self.header_box = gtk.Box(
             css_classes=("header",)
@@ -99,36 +88,11 @@ class NotificationItem(gtk.Box):
             css_classes=("time",),
             halign=gtk.Align.START
         )
-        self.close = gtk.Button(
-            child=widget.Icon("close"),
-            halign=gtk.Align.END,
-            css_classes=("close", "icon-default"),
-            tooltip_text="Close"
-        )
-        self.dismiss = gtk.Button(
-            child=widget.Icon("chevron_right"),
-            halign=gtk.Align.END,
-            css_classes=("dismiss", "icon-default"),
-            tooltip_text="Hide"
-        ) if show_dismiss else None
-
-        self.conns[self.close] = self.close.connect(
-            "clicked", self.on_close
-        )
-
-        if self.dismiss:
-            self.conns[self.dismiss] = self.dismiss.connect(
-                "clicked", self.on_dismiss
-            )
-
         self.info_box.append(self.app_icon)
         self.info_box.append(self.app_title)
         self.info_box.append(self.separator)
         self.info_box.append(self.time)
         self.header_box.append(self.info_box)
-        if self.dismiss:
-            self.header_box.append(self.dismiss)
-        self.header_box.append(self.close)
 
         # Notification body
         self.body_box = gtk.Box(
@@ -158,6 +122,90 @@ class NotificationItem(gtk.Box):
         self.body_box.append(self.image)
         self.body_box.append(self.text_box)
 
+    def set_app_icon(self, app_icon: str | gio.Icon | None) -> None:
+        if not app_icon:
+            return
+        display = gdk.Display.get_default()
+        icon_theme = gtk.IconTheme.get_for_display(display)
+        if isinstance(app_icon, str) and icon_theme.has_icon(app_icon):
+            texture = icon_theme.lookup_icon(
+                app_icon, None, 24, 1,
+                gtk.TextDirection.LTR,
+                gtk.IconLookupFlags.FORCE_SYMBOLIC
+            )
+            if texture:
+                self.app_icon.set_from_paintable(texture)
+        elif isinstance(app_icon, gio.Icon):
+            texture = icon_theme.lookup_by_gicon(
+                app_icon, 24, 1,
+                gtk.TextDirection.LTR,
+                gtk.IconLookupFlags.FORCE_SYMBOLIC
+            )
+            if texture:
+                self.app_icon.set_from_paintable(texture)
+
+    def set_text(self, summary: str, body: str) -> None:
+        self.title.set_label(summary)
+        try:
+            pango.parse_markup(body, -1, "\x00")
+            self.body_text.set_markup(body)
+        except Exception:
+            self.body_text.set_label(body)
+        self.body_text.set_visible(body != "")
+        self.title.set_visible(summary != "")
+
+
+class NotificationItem(NotificationLayout):
+    __gtype_name__ = "NotificationItem"
+
+    def __init__(
+        self,
+        item: Notification,
+        show_dismiss: bool = False,
+        hide_sensitive_content: bool = False
+    ) -> None:
+        self.is_destroyed = False
+        self.hide_content = hide_sensitive_content
+        if item.hints.get("transient") and show_dismiss:
+            show_dismiss = False
+        self.item = item
+        super().__init__(("notification",))
+
+        self._cached_detected: t.Literal["critical", "messages"] | None = None
+        self.conns: dict[gtk.Widget, int] = {}
+
+        self.counter = gtk.Label(
+            css_classes=("counter",),
+            halign=gtk.Align.START,
+            visible=False
+        )
+        self.close = gtk.Button(
+            child=widget.Icon("close"),
+            halign=gtk.Align.END,
+            css_classes=("close", "icon-default"),
+            tooltip_text="Close"
+        )
+        self.dismiss = gtk.Button(
+            child=widget.Icon("chevron_right"),
+            halign=gtk.Align.END,
+            css_classes=("dismiss", "icon-default"),
+            tooltip_text="Hide"
+        ) if show_dismiss else None
+
+        self.conns[self.close] = self.close.connect(
+            "clicked", self.on_close
+        )
+
+        if self.dismiss:
+            self.conns[self.dismiss] = self.dismiss.connect(
+                "clicked", self.on_dismiss
+            )
+
+        self.info_box.append(self.counter)
+        if self.dismiss:
+            self.header_box.append(self.dismiss)
+        self.header_box.append(self.close)
+
         # Notification actions
         self.actions_box = gtk.Box(
             css_classes=("actions",),
@@ -228,27 +276,10 @@ class NotificationItem(gtk.Box):
             )
         )
         toggle_css_class(self, "critical", self.item.urgency == 2)
+        self.counter.set_label(f"×{self.item.count}")
+        self.counter.set_visible(self.item.count > 1)
 
-        app_icon = self.item.get_app_icon()
-        display = gdk.Display.get_default()
-        icon_theme = gtk.IconTheme.get_for_display(display)
-        if app_icon:
-            if isinstance(app_icon, str) and icon_theme.has_icon(app_icon):
-                texture = icon_theme.lookup_icon(
-                    app_icon, None, 24, 1,
-                    gtk.TextDirection.LTR,
-                    gtk.IconLookupFlags.FORCE_SYMBOLIC
-                )
-                if texture:
-                    self.app_icon.set_from_paintable(texture)
-            elif isinstance(app_icon, gio.Icon):
-                texture = icon_theme.lookup_by_gicon(
-                    app_icon, 24, 1,
-                    gtk.TextDirection.LTR,
-                    gtk.IconLookupFlags.FORCE_SYMBOLIC
-                )
-                if texture:
-                    self.app_icon.set_from_paintable(texture)
+        self.set_app_icon(self.item.get_app_icon())
 
         self.body_box.set_visible(not hide_content)
         self.actions_box.set_visible(not hide_content)
@@ -276,6 +307,8 @@ class NotificationItem(gtk.Box):
 
         icon = self.item.get_icon()
         if isinstance(icon, str):
+            display = gdk.Display.get_default()
+            icon_theme = gtk.IconTheme.get_for_display(display)
             texture = icon_theme.lookup_icon(
                 icon, None, 64, 1,
                 gtk.TextDirection.LTR,
@@ -283,20 +316,13 @@ class NotificationItem(gtk.Box):
             )
             self.image.set_from_paintable(texture)
         elif icon:
-            self.image.set_from_pixbuf(icon)
+            self.image.set_from_paintable(icon)
             self.image.set_visible(True)
         else:
             self.image.set_visible(False)
             self.image.set_size_request(0, 0)
 
-        self.title.set_label(self.item.summary)
-        try:
-            pango.parse_markup(self.item.body, -1, "\x00")
-            self.body_text.set_markup(self.item.body)
-        except Exception:
-            self.body_text.set_label(self.item.body)
-        self.body_text.set_visible(self.item.body != "")
-        self.title.set_visible(self.item.summary != "")
+        self.set_text(self.item.summary, self.item.body)
 
     def destroy(self) -> None:
         if self.is_destroyed:
@@ -384,3 +410,28 @@ class NotificationRevealer(gtk.Box):
         self.first_revealer.set_child(None)
         self.second_revealer.set_child(None)
         self.remove(self.first_revealer)
+
+
+class NotificationHistoryItem(NotificationLayout):
+    __gtype_name__ = "NotificationHistoryItem"
+
+    def __init__(self, entry: HistoryEntry) -> None:
+        super().__init__(("notification", "history"))
+        self.entry = entry
+        settings = Settings()
+        _datetime = datetime.datetime.fromtimestamp(entry.time)
+        self.time.set_label(
+            get_formatted_time(
+                _datetime,
+                settings.get("time_format") == "12"
+            )
+            if _datetime.date() == datetime.date.today()
+            else get_formatted_date(_datetime)
+        )
+        self.app_title.set_label(entry.app_name)
+        self.set_app_icon(entry.app_icon)
+        self.image.set_visible(False)
+        self.set_text(entry.summary, entry.body)
+
+        self.append(self.header_box)
+        self.append(self.body_box)
@@ -2,8 +2,11 @@ from repository import gtk, glib
 from src.services.notifications import notifications, NotificationClosedReason
 from src.modules.notifications.item import NotificationItem
 from src.modules.notifications.item import NotificationRevealer
+from src.modules.notifications.item import NotificationHistoryItem
+from src.services.notification_history import history, PAGE_SIZE
 import typing as t
 from utils import Ref
+from utils.ref import Patch, PatchOp
 from src import widget
 
 T = t.TypeVar("T")
@@ -30,9 +33,11 @@ class Notifications(gtk.ScrolledWindow):
         hide_sensitive_content: bool = False,
         no_notifications_label: bool = True,
         item: type[NotificationItem] = NotificationItem,
-        revealer: type[NotificationRevealer] = NotificationRevealer
+        revealer: type[NotificationRevealer] = NotificationRevealer,
+        show_history: bool = False
     ) -> None:
         self.hide_content = hide_sensitive_content
+        self.show_history = show_history
         self.show_no_notifications_label = no_notifications_label
         self._item = item
         self._revealer = revealer
@@ -92,12 +97,33 @@ class Notifications(gtk.ScrolledWindow):
             "clicked", self.close_all
         )
 
+        # Older notifications are loaded from disk page by page
+        # and dropped again when list is hidden
+        self.history_items: list[NotificationHistoryItem] = []
+        self.history_before: int | None = None
+        self.history_list = gtk.Box(
+            css_classes=("notifications", "history"),
+            orientation=gtk.Orientation.VERTICAL,
+            valign=gtk.Align.START
+        )
+        self.history_button = gtk.Button(
+            label="Show older",
+            halign=gtk.Align.CENTER,
+            css_classes=("show-history", "text"),
+            visible=show_history
+        )
+        self.history_button_handler = self.history_button.connect(
+            "clicked", self.load_history_page
+        )
+
         self.children = (
             getattr(self, "no_notifications_label", None),
             self.critical,
             self.messages,
             self.other,
-            self.clear_button
+            self.clear_button,
+            self.history_list,
+            self.history_button
         )
         for child in self.children:
             if not isinstance(child, gtk.Widget):
@@ -148,7 +174,7 @@ class Notifications(gtk.ScrolledWindow):
             self.items.clear()
             return
         if self.handler_id != -1:
-            notifications.unwatch(self.handler_id)
+            notifications.unwatch_patches(self.handler_id)
             self.handler_id = -1
         if self.is_closing_handler != -1:
             is_closing.unwatch(self.is_closing_handler)
@@ -179,8 +205,9 @@ class Notifications(gtk.ScrolledWindow):
                 if item[1] in item[0]:  # type: ignore [operator]
                     item[0].remove(item[1])
             self.items.clear()
+            self.clear_history()
             if self.handler_id != -1:
-                notifications.unwatch(self.handler_id)
+                notifications.unwatch_patches(self.handler_id)
                 self.handler_id = -1
             if self.is_closing_handler != -1:
                 is_closing.unwatch(self.is_closing_handler)
@@ -190,7 +217,9 @@ class Notifications(gtk.ScrolledWindow):
     def unfreeze(self) -> None:
         if self.freezed:
             if self.handler_id == -1:
-                self.handler_id = notifications.watch(self.on_change)
+                self.handler_id = notifications.watch_patches(
+                    self.on_patches
+                )
             if self.is_closing_handler == -1:
                 self.is_closing_handler = is_closing.watch(
                     self.update_clear_button
@@ -221,15 +250,38 @@ class Notifications(gtk.ScrolledWindow):
         if category == "critical":
             return self.critical
 
+    def load_history_page(self, *args: t.Any) -> None:
+        entries = history.page(before=self.history_before, limit=PAGE_SIZE)
+        # Live notifications are already shown above
+        live_rows = history.live_rows()
+        for entry in entries:
+            if entry.id in live_rows:
+                continue
+            item = NotificationHistoryItem(entry)
+            self.history_list.append(item)
+            self.history_items.append(item)
+        if entries:
+            self.history_before = entries[-1].id
+        self.history_button.set_visible(len(entries) == PAGE_SIZE)
+
+    def clear_history(self) -> None:
+        for item in self.history_items:
+            self.history_list.remove(item)
+        self.history_items.clear()
+        self.history_before = None
+        self.history_button.set_visible(self.show_history)
+
     def destroy(self) -> None:
         self.clear_button.disconnect(self.clear_button_handler)
+        self.history_button.disconnect(self.history_button_handler)
+        self.clear_history()
         if self.closing_source != -1:
             try:
                 glib.source_remove(self.closing_source)
             except glib.Error:
                 pass
         if self.handler_id != -1:
-            notifications.unwatch(self.handler_id)
+            notifications.unwatch_patches(self.handler_id)
         for item in self.items.values():
             item[1].self_destroy()
             item[0].remove(item[1])
@@ -251,6 +303,42 @@ class Notifications(gtk.ScrolledWindow):
         self.update_no_notifications()
         self.update_clear_button()
 
+    def add_item(self, key: int) -> None:
+        if key in self.items or key not in notifications.value:
+            return
+        item = self._item(
+            item=notifications.value[key],
+            hide_sensitive_content=self.hide_content
+        )
+        box = self.get_box_for(item)
+        self.items[key] = (
+            box,
+            self._revealer(
+                item=item
+            )
+        )
+        box.insert_child_after(self.items[key][1], None)
+        self.items[key][1].show()
+
+    def remove_item(self, key: int) -> None:
+        if key in self.items:
+            self.items[key][1].destroy_with_anim(
+                self.on_item_destroy
+            )
+
+    def on_patches(self, patches: list[Patch]) -> None:
+        for patch in patches:
+            if patch.op == PatchOp.RESET:
+                self.on_change()
+                return
+            if patch.op == PatchOp.INSERT:
+                self.add_item(patch.key)
+            elif patch.op == PatchOp.REMOVE:
+                self.remove_item(patch.key)
+
+        self.update_no_notifications()
+        self.update_clear_button()
+
     def on_change(self, *args: t.Any) -> None:
         added_keys, removed_keys = diff_keys(
             old=self.items,
@@ -258,26 +346,10 @@ class Notifications(gtk.ScrolledWindow):
         )
 
         for key in removed_keys:
-            if key in self.items:
-                self.items[key][1].destroy_with_anim(
-                    self.on_item_destroy
-                )
+            self.remove_item(key)
 
         for key in added_keys:
-            if key not in self.items and key in notifications.value:
-                item = self._item(
-                    item=notifications.value[key],
-                    hide_sensitive_content=self.hide_content
-                )
-                box = self.get_box_for(item)
-                self.items[key] = (
-                    box,
-                    self._revealer(
-                        item=item
-                    )
-                )
-                box.insert_child_after(self.items[key][1], None)
-                self.items[key][1].show()
+            self.add_item(key)
 
         self.update_no_notifications()
         self.update_clear_button()
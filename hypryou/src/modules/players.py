@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from utils import downloader, toggle_css_class, Ref, sync_debounce
 from utils import format_seconds
 from utils.service import Signals
+from utils.ref import Patch, PatchOp
 from utils.logger import logger
 from repository import gtk, layer_shell, pango, glib, gobject
 from src.services.mpris import players, MprisPlayer, current_player
@@ -341,7 +342,7 @@ class PlayersBox(gtk.ScrolledWindow):
             vscrollbar_policy=gtk.PolicyType.AUTOMATIC,
             hscrollbar_policy=gtk.PolicyType.NEVER
         )
-        self.handler_id = players.watch(self.update_items)
+        self.handler_id = players.watch_patches(self.on_patches)
         self.update_items(players.value)
 
         self.timer_id = glib.timeout_add(500, self.timer)
@@ -351,20 +352,42 @@ class PlayersBox(gtk.ScrolledWindow):
                 self, lambda: logger.debug("PlayersBox finalized")
             )
 
+    def add_item(self, key: str, item: MprisPlayer) -> None:
+        if key in self.items:
+            return
+        tray_widget = Player(item)
+        self.items[key] = tray_widget
+        self.list.append(tray_widget)
+
+    def remove_item(self, key: str) -> None:
+        if key not in self.items:
+            return
+        item = self.items.pop(key)
+        item.destroy()
+        self.list.remove(item)
+
+    def on_patches(self, patches: list[Patch]) -> None:
+        for patch in patches:
+            if patch.op == PatchOp.RESET:
+                self.update_items(players.value)
+                return
+            if patch.op != PatchOp.INSERT:
+                self.remove_item(patch.key)
+            if patch.op != PatchOp.REMOVE:
+                self.add_item(patch.key, patch.value)
+
+        self.no_items_label.set_reveal_child(len(self.items) == 0)
+
     def update_items(self, new_items: dict[str, MprisPlayer]) -> None:
         existing_items = set(self.items.keys())
         tray_items = set(new_items.keys())
         for item in tray_items:
             if item not in existing_items:
-                tray_widget = Player(players.value[item])
-                self.items[item] = tray_widget
-                self.list.append(tray_widget)
+                self.add_item(item, new_items[item])
 
         for item in existing_items:
             if item not in tray_items:
-                self.items[item].destroy()
-                self.list.remove(self.items[item])
-                del self.items[item]
+                self.remove_item(item)
 
         self.no_items_label.set_reveal_child(len(self.items) == 0)
 
@@ -383,7 +406,7 @@ class PlayersBox(gtk.ScrolledWindow):
         self.box.remove(self.no_items_label)
         self.items.clear()
         self.set_child(None)
-        players.unwatch(self.handler_id)
+        players.unwatch_patches(self.handler_id)
         glib.source_remove(self.timer_id)
 
 
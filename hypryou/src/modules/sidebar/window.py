@@ -18,7 +18,7 @@ class SidebarBox(gtk.Box):
         )
         self.management = ManagementBox()
         self.actions = Actions()
-        self.notifications = Notifications()
+        self.notifications = Notifications(show_history=True)
         self.children = (
             self.management,
             self.actions,
@@ -109,8 +109,8 @@ class TrayItem(gtk.Box):
                 gtk.IconLookupFlags.FORCE_SYMBOLIC
             )
             image.set_from_paintable(texture)
-        elif (pixbuf := item.get_pixbuf(32, 32)) is not None:
-            image.set_from_pixbuf(pixbuf)
+        elif (texture := item.get_texture(32, 32)) is not None:
+            image.set_from_paintable(texture)
         else:
             image.set_from_icon_name(item.icon_name)
         image.set_size_request(32, 32)
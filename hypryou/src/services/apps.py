@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from repository import gio
-from utils_cy.levenshtein import compute_score
+from utils_cy.fuzzy import compute_score
 from utils.service import Service
 from utils.logger import logger
 from utils import Ref
@@ -9,6 +9,7 @@ from config import APP_CACHE_PATH, CACHE_PATH
 from os.path import join as pjoin
 import os.path as path
 import json
+import math
 import shlex
 import subprocess
 import os
@@ -65,12 +66,21 @@ class Application:
         self.frequency = 0
         self.score = 1.0
 
-        self._match: dict[str | None, float] = {
-            self.exec: -0.1,
-            self.entry: -0.1,
-            self.description: -0.2,
-            self.name: 0.1
-        }
+        # Normalized once, searched on every keystroke
+        self.fields: tuple[tuple[str, float], ...] = tuple(
+            (property.lower(), bonus)
+            for property, bonus in (
+                (self.exec, -0.1),
+                (self.entry, -0.1),
+                (self.description, -0.2),
+                (self.name, 0.1)
+            )
+            if property is not None
+        )
+        self.normalized_keywords = tuple(
+            keyword.lower() for keyword in self.keywords or ()
+            if keyword is not None
+        )
 
     def launch(self) -> None:
         if self.entry is not None:
@@ -79,38 +89,129 @@ class Application:
             launch_detached(self.exec)
 
     def match(self, pattern: str) -> bool:
+        self.score = self.get_score(pattern.strip().lower())
+        return self.score > FOUND_THRESHOLD
+
+    def get_score(self, normalized_pattern: str) -> float:
         scores: list[float] = []
 
-        normalized_pattern = pattern.strip().lower()
+        for property, bonus in self.fields:
+            score = compute_score(property, normalized_pattern) + bonus
+            if score >= FOUND_THRESHOLD:
+                return score
+            scores.append(score)
 
-        for property, bonus in self._match.items():
-            if property is None:
-                continue
+        for keyword in self.normalized_keywords:
+            scores.append(compute_score(keyword, normalized_pattern) - 1.5)
 
-            normalized_property = property.lower()
+        return max(scores) if scores else 0.0
 
-            score = compute_score(normalized_property, normalized_pattern)
-            score += bonus
-            if score >= FOUND_THRESHOLD:
-                self.score = score
-                return True
 
-            scores.append(score)
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
 
-        if self.keywords:
-            for keyword in self.keywords:
-                if keyword is None:
-                    continue
 
-                normalized_keyword = keyword.lower()
-                scores.append(
-                    compute_score(
-                        normalized_keyword, normalized_pattern
-                    ) - 1.5
-                )
+# Queries of 3+ chars only score apps sharing their 2-char prefix or at
+# least this share of their trigrams
+MIN_TRIGRAM_SHARE = 1 / 3
 
-        self.score = max(scores) if scores else 0.0
-        return self.score > FOUND_THRESHOLD
+
+# Prunes apps before fuzzy scoring: queries of 3+ chars only score apps
+# sharing enough trigrams or a 2-char prefix with them, shorter ones only
+# apps having all their chars
+class SearchIndex:
+    __slots__ = (
+        "apps", "_trigrams", "_prefixes", "_chars",
+        "_last_query", "_last_trigrams", "_last_counts"
+    )
+
+    def __init__(self) -> None:
+        self.apps: list[Application] = []
+        self._trigrams: dict[str, set[int]] = {}
+        self._prefixes: dict[str, set[int]] = {}
+        self._chars: dict[str, set[int]] = {}
+        self._last_query = ""
+        self._last_trigrams: set[str] = set()
+        self._last_counts: dict[int, int] = {}
+
+    def build(self, apps: list[Application]) -> None:
+        self.apps = apps
+        self._trigrams = {}
+        self._prefixes = {}
+        self._chars = {}
+        self._last_query = ""
+        self._last_trigrams = set()
+        self._last_counts = {}
+
+        for index, app in enumerate(apps):
+            texts = [field for field, _ in app.fields]
+            texts.extend(app.normalized_keywords)
+            for text in texts:
+                for trigram in trigrams(text):
+                    self._trigrams.setdefault(trigram, set()).add(index)
+                self._prefixes.setdefault(text[:2], set()).add(index)
+                for char in text:
+                    self._chars.setdefault(char, set()).add(index)
+
+    def candidates(self, query: str) -> set[int]:
+        if len(query) < 3:
+            postings = [self._chars.get(char, set()) for char in set(query)]
+            self._last_query = query
+            self._last_trigrams = set()
+            self._last_counts = {}
+            return set.intersection(*postings) if postings else set()
+
+        query_trigrams = trigrams(query)
+        if self._last_trigrams and query.startswith(self._last_query):
+            # Extended query keeps all previous trigrams, so previous
+            # counts are reused and only new trigrams are looked up
+            counts = self._last_counts
+            new_trigrams = query_trigrams - self._last_trigrams
+        else:
+            counts = {}
+            new_trigrams = query_trigrams
+        for trigram in new_trigrams:
+            for index in self._trigrams.get(trigram, ()):
+                counts[index] = counts.get(index, 0) + 1
+
+        # Required share grows with the query, so candidates narrow
+        required = max(1, math.ceil(len(query_trigrams) * MIN_TRIGRAM_SHARE))
+        result = set(self._prefixes.get(query[:2], ()))
+        result.update(
+            index for index, count in counts.items() if count >= required
+        )
+
+        self._last_query = query
+        self._last_trigrams = query_trigrams
+        self._last_counts = counts
+        return result
+
+    def search(self, pattern: str) -> list[Application]:
+        query = pattern.strip().lower()
+        if not query:
+            return []
+
+        found: list[Application] = []
+        for index in self.candidates(query):
+            app = self.apps[index]
+            app.score = app.get_score(query)
+            if app.score > FOUND_THRESHOLD:
+                found.append(app)
+
+        found.sort(
+            key=lambda app: (
+                -(app.score + app.frequency / 50),
+                app.name or ""
+            )
+        )
+        return found
+
+
+search_index = SearchIndex()
+
+
+def search(pattern: str) -> list[Application]:
+    return search_index.search(pattern)
 
 
 def increase_frequency(entry: str) -> None:
@@ -164,7 +265,9 @@ def get_apps_list() -> list[Application]:
 
 
 def reload() -> None:
-    apps.value = get_apps_list()
+    new_apps = get_apps_list()
+    search_index.build(new_apps)
+    apps.value = new_apps
 
 
 class AppsService(Service):
@@ -1,5 +1,5 @@
 from repository import wp
-from utils.ref import Ref
+from utils.ref import Ref, computed
 from utils.logger import logger
 from utils.service import Service
 import typing as t
@@ -27,9 +27,11 @@ def get_volume_icon(*args: t.Any) -> str:
 
 volume = Ref(0.0, name="audio_volume")
 volume_muted = Ref(False, name="audio_volume_muted")
-volume_icon = Ref("volume_off", name="audio_volume_icon")
-volume_icon.bind(volume, get_volume_icon)
-volume_icon.bind(volume_muted, get_volume_icon)
+volume_icon = computed(get_volume_icon, name="audio_volume_icon")
+volume_tooltip = computed(
+    lambda: f"Volume: {int(volume.value)}%",
+    name="audio_volume_tooltip"
+)
 
 mic_muted = Ref(False, name="mic_muted")
 
@@ -52,6 +54,22 @@ microphones = Ref[set[wp.Endpoint]](
 )
 
 
+def get_mic_icon() -> str:
+    if mic_muted.value:
+        return "mic_off"
+    elif len(recorders.value) > 0:
+        return "mic_double"
+    else:
+        return "mic"
+
+
+mic_icon = computed(get_mic_icon, name="mic_icon")
+has_microphones = computed(
+    lambda: len(microphones.value) > 0,
+    name="has_microphones"
+)
+
+
 class AudioService(Service):
     def __init__(self) -> None:
         self.wp = wp.get_default()
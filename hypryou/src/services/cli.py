@@ -1,6 +1,6 @@
 import os
 import asyncio
-from config import socket_path
+from config import socket_path, TEMP_PATH
 from utils.logger import logger
 import socket
 from config import Settings
@@ -10,6 +10,12 @@ from src.services.mpris import current_player
 import subprocess
 import shlex
 from src.services import state
+import src.services.hyprland as hyprland
+from utils.profiler import profiler
+from src.services.notification_history import history as notification_history
+from src.services.notifications import ingest_limiter
+from src.services.palettes import warmer as palette_warmer
+import datetime
 import shutil
 import traceback
 import typing as t
@@ -35,6 +41,14 @@ HELP = {
     "lock": "Lock session",
     "screenshot": ("Take screenshot: region, active, " +
                    "window; add freeze to pause screen"),
+    "hyprland_stats": "Show Hyprland IPC, events and clients statistics",
+    "profile": ("Profile signals and refs: start, stop, reset, " +
+                "report [limit], trace [path]"),
+    "notification_history": ("Search notification history: [text]; " +
+                             "clear to delete it"),
+    "notification_stats": "Show accepted, merged and dropped notifications",
+    "palettes": ("Pre-compute wallpaper colors: warm [folder], stop; " +
+                 "shows progress without arguments"),
     "help": "Show this help"
 }
 
@@ -149,6 +163,63 @@ class CliRequest:
             launch_detached(command)
         return "ok"
 
+    def do_hyprland_stats(self, args: str) -> str:
+        return (
+            hyprland.client.stats() + "\n\n" +
+            hyprland.clients_sync.format()
+        )
+
+    def do_profile(self, args: str) -> str:
+        action, *rest = args.split() or ["report"]
+        if action == "start":
+            profiler.start()
+        elif action == "stop":
+            profiler.stop()
+        elif action == "reset":
+            profiler.reset()
+        elif action == "report":
+            limit = int(rest[0]) if rest else 25
+            return profiler.report(limit)
+        elif action == "trace":
+            path = rest[0] if rest else os.path.join(
+                TEMP_PATH, "profile_trace.json"
+            )
+            return f"Trace saved to {profiler.dump_trace(path)}"
+        else:
+            return f"Unknown action {action!r}. " + HELP["profile"]
+        return "ok"
+
+    def do_notification_history(self, args: str) -> str:
+        if args.strip() == "clear":
+            notification_history.clear()
+            return "ok"
+        entries = notification_history.page(args or None, limit=50)
+        if not entries:
+            return "No notifications found"
+        lines: list[str] = []
+        for entry in entries:
+            date = datetime.datetime.fromtimestamp(entry.time)
+            line = f"{date:%Y-%m-%d %H:%M} {entry.app_name}: {entry.summary}"
+            if entry.body:
+                line += " - " + entry.body.replace("\n", " ")
+            lines.append(line)
+        return "\n".join(reversed(lines))
+
+    def do_notification_stats(self, args: str) -> str:
+        return ingest_limiter.format()
+
+    def do_palettes(self, args: str) -> str:
+        action, *rest = args.split(None, 1) or ["status"]
+        if action == "warm":
+            palette_warmer.start(rest[0] if rest else None)
+            return "Scanning wallpaper folder, see `palettes` for progress"
+        elif action == "stop":
+            palette_warmer.stop()
+            return "ok"
+        elif action == "status":
+            return palette_warmer.format()
+        return f"Unknown action {action!r}. " + HELP["palettes"]
+
     def do_help(self, args: str) -> None:
 
         max_cmd_len = max((len(cmd) for cmd in HELP), default=0)
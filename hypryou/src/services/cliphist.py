@@ -1,75 +1,361 @@
 from __future__ import annotations
 
+import asyncio
+import bisect
+import re
 import subprocess
+import typing as t
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from repository import gio, glib, gdk, gdk_pixbuf
 from utils import Ref
+from utils.textures import TextureCache
 import os
 from config import APP_CACHE_PATH, CACHE_PATH
 from utils.logger import logger
+from utils_cy.fuzzy import rank_records, tokenize
 
 TEMP_PATH = os.path.join(APP_CACHE_PATH, "cliphist")
+DB_PATH = os.path.join(CACHE_PATH, "cliphist/db")
+MONITOR_DELAY_MS = 100
+PAYLOAD_CACHE_BYTES = 32 * 1024 * 1024
+THUMBNAIL_HEIGHT = 200
+THUMBNAIL_MAX_WIDTH = 432
+THUMBNAIL_CACHE_SIZE = 64
+THUMBNAIL_CACHE_BYTES = 24 * 1024 * 1024
+MAX_DISK_THUMBNAILS = 256
 items = Ref[dict[str, str]]({}, name="cliphist_items")
 
 
-def get() -> dict[str, str]:
-    try:
-        result = subprocess.run(
-            ["cliphist", "list"],
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding="utf-8",
+def parse_line(line: str) -> tuple[str, str] | None:
+    parts = line.split(maxsplit=1)
+    if len(parts) != 2:
+        return None
+    return parts[0].strip(), parts[1].strip()
+
+
+def normalize_string(s: str) -> str:
+    s = re.sub(r"[-_]", " ", s)
+    s = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", s)
+    return s.lower()
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+type SearchRecord = tuple[int, str, str, frozenset[str], frozenset[str]]
+
+
+# Search records are built once per entry. Queries of 3+ chars only
+# score entries sharing a trigram with them, shorter ones only entries
+# having all their chars
+class SearchIndex:
+    __slots__ = (
+        "records", "_trigrams", "_chars",
+        "_last_query", "_last_candidates"
+    )
+
+    def __init__(self) -> None:
+        self.records: dict[str, SearchRecord] = {}
+        self._trigrams: dict[str, set[str]] = {}
+        self._chars: dict[str, set[str]] = {}
+        self._last_query = ""
+        self._last_candidates: set[str] = set()
+
+    def _grams(self, record: SearchRecord) -> tuple[set[str], set[str]]:
+        lowered = record[1].lower()
+        return (
+            trigrams(lowered) | trigrams(record[2]),
+            set(lowered) | set(record[2])
         )
-    except subprocess.CalledProcessError:
-        return {}
 
-    lines = result.stdout.strip().splitlines()[:250]
+    def add(self, item_id: str, content: str) -> None:
+        if item_id in self.records:
+            self.remove(item_id)
+        normalized = normalize_string(content)
+        record = (
+            int(item_id), content, normalized,
+            tokenize(content), tokenize(normalized)
+        )
+        self.records[item_id] = record
+        grams, chars = self._grams(record)
+        for trigram in grams:
+            self._trigrams.setdefault(trigram, set()).add(item_id)
+        for char in chars:
+            self._chars.setdefault(char, set()).add(item_id)
+        self._last_query = ""
 
-    return {
-        id_.strip(): content.strip()
-        for line in lines
-        if (parts := line.split(maxsplit=1)) and len(parts) == 2
-        for id_, content in [parts]
-    }
+    def remove(self, item_id: str) -> None:
+        record = self.records.pop(item_id, None)
+        if record is None:
+            return
+        grams, chars = self._grams(record)
+        for postings, keys in ((self._trigrams, grams), (self._chars, chars)):
+            for key in keys:
+                ids = postings.get(key)
+                if ids is not None:
+                    ids.discard(item_id)
+                    if not ids:
+                        del postings[key]
+        self._last_query = ""
 
+    def clear(self) -> None:
+        self.records.clear()
+        self._trigrams.clear()
+        self._chars.clear()
+        self._last_query = ""
+        self._last_candidates = set()
 
-def repopulate() -> None:
-    history = get()
-    history_keys = set(history.keys())
-    existing_keys = set(items.value.keys())
+    def candidates(self, query: str) -> set[str]:
+        if len(query) < 3:
+            postings = [self._chars.get(char, set()) for char in set(query)]
+            result = set.intersection(*postings) if postings else set()
+        elif (
+            len(self._last_query) >= 3
+            and query.startswith(self._last_query)
+        ):
+            # Extended query keeps all previous trigrams
+            result = set(self._last_candidates)
+            for trigram in trigrams(query[len(self._last_query) - 2:]):
+                result.update(self._trigrams.get(trigram, ()))
+        else:
+            result = set()
+            for trigram in trigrams(query):
+                result.update(self._trigrams.get(trigram, ()))
 
-    new_keys = history_keys - existing_keys
-    removed_keys = existing_keys - history_keys
+        self._last_query = query
+        self._last_candidates = result
+        return result
 
-    if not new_keys and not removed_keys:
-        return
+    def search(self, pattern: str, threshold: float) -> list[str]:
+        query = pattern.strip().lower()
+        if not query:
+            return []
+        records = [
+            self.records[item_id] for item_id in self.candidates(query)
+        ]
+        found = rank_records(
+            pattern, normalize_string(pattern), records, threshold
+        )
+        return [str(key) for _, key in found]
+
+
+search_index = SearchIndex()
+
+
+class PayloadCache:
+    __slots__ = ("max_bytes", "total_bytes", "_payloads")
+
+    def __init__(self, max_bytes: int = PAYLOAD_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._payloads: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, item_id: str) -> bytes | None:
+        payload = self._payloads.get(item_id)
+        if payload is not None:
+            self._payloads.move_to_end(item_id)
+        return payload
+
+    def put(self, item_id: str, payload: bytes) -> None:
+        self.discard(item_id)
+        if len(payload) > self.max_bytes:
+            return
+        self._payloads[item_id] = payload
+        self.total_bytes += len(payload)
+        while self.total_bytes > self.max_bytes:
+            _, old = self._payloads.popitem(last=False)
+            self.total_bytes -= len(old)
+
+    def discard(self, item_id: str) -> None:
+        payload = self._payloads.pop(item_id, None)
+        if payload is not None:
+            self.total_bytes -= len(payload)
+
+    def clear(self) -> None:
+        self._payloads.clear()
+        self.total_bytes = 0
+
+
+class CliphistBackend:
+    # `cliphist list` is streamed without blocking the main loop and
+    # only lines with unknown ids are decoded and parsed
+    def __init__(self) -> None:
+        self.payloads = PayloadCache()
+        # Known ids in ascending order, so pages are found by bisecting
+        self._ids: list[int] = []
+        self.refreshes = 0
+        self.parsed = 0
+        self._task: asyncio.Task[None] | None = None
+        self._dirty = False
+        self._monitor: gio.FileMonitor | None = None
+        self._monitor_handler = -1
+        self._monitor_source: int | None = None
+
+    def request_refresh(self) -> None:
+        if self._task is not None and not self._task.done():
+            # Picked up when current refresh finishes
+            self._dirty = True
+            return
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            self._dirty = False
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Couldn't refresh cliphist", exc_info=e)
+            if not self._dirty:
+                break
+
+    async def refresh(self) -> None:
+        proc = await asyncio.create_subprocess_exec(
+            "cliphist", "list",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        assert proc.stdout is not None
+        known = items.value
+        seen: set[str] = set()
+        new_items: dict[str, str] = {}
+
+        async for raw_line in proc.stdout:
+            # Only the id is needed to skip already known lines
+            head = raw_line.split(None, 1)
+            if not head:
+                continue
+            item_id = head[0].decode()
+            seen.add(item_id)
+            if item_id in known:
+                continue
+            parsed = parse_line(raw_line.decode("utf-8", "replace"))
+            if parsed is not None:
+                new_items[parsed[0]] = parsed[1]
+
+        if await proc.wait() != 0:
+            return
+        self.refreshes += 1
+        self.parsed += len(new_items)
+        self.apply(new_items, set(known) - seen)
+
+    def apply(self, new_items: dict[str, str], removed: set[str]) -> None:
+        if not new_items and not removed:
+            return
+
+        with items.batch():
+            # Oldest first, so the newest ones end up on top
+            for key in sorted(new_items, key=int):
+                bisect.insort(self._ids, int(key))
+                items.value[key] = new_items[key]
+                search_index.add(key, new_items[key])
+
+            for key in removed:
+                index = bisect.bisect_left(self._ids, int(key))
+                if index < len(self._ids) and self._ids[index] == int(key):
+                    del self._ids[index]
+                del items.value[key]
+                search_index.remove(key)
+                self.payloads.discard(key)
+                thumbnailer.discard(key)
 
-    items.block_changed()
+    def page(self, before: int | None, count: int) -> list[str]:
+        # Up to `count` ids older than `before`, newest first
+        end = (
+            len(self._ids) if before is None
+            else bisect.bisect_left(self._ids, before)
+        )
+        return [
+            str(item_id)
+            for item_id in reversed(self._ids[max(0, end - count):end])
+        ]
+
+    def clear(self) -> None:
+        self.payloads.clear()
+        self._ids.clear()
+
+    async def decode(self, item_id: str) -> bytes | None:
+        payload = self.payloads.get(item_id)
+        if payload is not None:
+            return payload
+
+        proc = await asyncio.create_subprocess_exec(
+            "cliphist", "decode", item_id,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        payload, _ = await proc.communicate()
+        if proc.returncode != 0:
+            return None
+        self.payloads.put(item_id, payload)
+        return payload
+
+    async def copy(self, item_id: str) -> None:
+        payload = await self.decode(item_id)
+        if payload is None:
+            logger.warning("Couldn't decode cliphist item %s", item_id)
+            return
+        proc = await asyncio.create_subprocess_exec(
+            "wl-copy",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL
+        )
+        await proc.communicate(payload)
+
+    def watch(self) -> None:
+        if self._monitor is not None:
+            return
+        file = gio.File.new_for_path(DB_PATH)
+        try:
+            self._monitor = file.monitor_file(gio.FileMonitorFlags.NONE, None)
+        except glib.Error as e:
+            logger.warning("Couldn't watch cliphist db: %s", e)
+            return
+        self._monitor_handler = self._monitor.connect(
+            "changed", self._on_db_changed
+        )
 
-    for key in new_keys:
-        items.value[key] = history[key]
+    def unwatch(self) -> None:
+        if self._monitor is None:
+            return
+        self._monitor.disconnect(self._monitor_handler)
+        self._monitor.cancel()
+        self._monitor = None
+        if self._monitor_source is not None:
+            glib.source_remove(self._monitor_source)
+            self._monitor_source = None
 
-    for key in removed_keys:
-        del items.value[key]
+    def _on_db_changed(self, *args: t.Any) -> None:
+        # One write produces several events
+        if self._monitor_source is None:
+            self._monitor_source = glib.timeout_add(
+                MONITOR_DELAY_MS, self._on_monitor_timeout
+            )
 
-    items.unblock_changed()
-    items.notify_signal("changed", items.value)
+    def _on_monitor_timeout(self) -> bool:
+        self._monitor_source = None
+        self.request_refresh()
+        return False
+
+
+backend = CliphistBackend()
+
+
+def repopulate() -> None:
+    backend.request_refresh()
 
 
 def copy_by_id(item_id: str) -> None:
-    with subprocess.Popen(
-        ["cliphist", "decode", item_id], stdout=subprocess.PIPE
-    ) as decode_proc, subprocess.Popen(
-        ["wl-copy"], stdin=decode_proc.stdout
-    ):
-        if decode_proc.stdout:
-            decode_proc.stdout.close()
+    asyncio.create_task(backend.copy(item_id))
 
 
 def secure_clear() -> None:
-    db_path = os.path.join(CACHE_PATH, "cliphist/db")
-    if os.path.exists(db_path):
-        subprocess.run(["shred", "-u", db_path], check=True)
+    backend.payloads.clear()
+    thumbnailer.clear()
+    if os.path.exists(DB_PATH):
+        subprocess.run(["shred", "-u", DB_PATH], check=True)
     else:
         if __debug__:
             logger.debug("Cliphist db file not found, skipping shred.")
@@ -77,23 +363,155 @@ def secure_clear() -> None:
 
 def clear() -> None:
     subprocess.run(["cliphist", "wipe"], check=True)
+    backend.clear()
+    thumbnailer.clear()
+    search_index.clear()
+    items.value.clear()
+
+
+def thumbnail_size(width: int, height: int) -> tuple[int, int]:
+    # Preview is THUMBNAIL_HEIGHT tall unless it gets too wide
+    if width <= 0 or height <= 0:
+        return THUMBNAIL_HEIGHT, THUMBNAIL_HEIGHT
+    scaled_width = width / height * THUMBNAIL_HEIGHT
+    if scaled_width > THUMBNAIL_MAX_WIDTH:
+        return (
+            THUMBNAIL_MAX_WIDTH,
+            max(1, round(THUMBNAIL_MAX_WIDTH / width * height))
+        )
+    return max(1, round(scaled_width)), THUMBNAIL_HEIGHT
+
+
+def prune_thumbnails() -> None:
+    files = list(Path(TEMP_PATH).glob("*.png"))
+    if len(files) <= MAX_DISK_THUMBNAILS:
+        return
+    files.sort(key=lambda file: file.stat().st_mtime)
+    for file in files[:len(files) - MAX_DISK_THUMBNAILS]:
+        file.unlink(missing_ok=True)
+
+
+def render_thumbnail(
+    item_id: str,
+    payload: bytes | None,
+    width: int,
+    height: int,
+    path: str
+) -> gdk.Texture:
+    if os.path.exists(path):
+        # Keeps recently used thumbnails when pruning
+        os.utime(path)
+        return gdk.Texture.new_from_filename(path)
+
+    if payload is None:
+        payload = subprocess.run(
+            ["cliphist", "decode", item_id],
+            capture_output=True,
+            check=True
+        ).stdout
+    # Decoder scales while reading, full image is never allocated
+    loader = gdk_pixbuf.PixbufLoader()
+    loader.set_size(width, height)
+    loader.write(payload)
+    loader.close()
+    pixbuf = loader.get_pixbuf()
+    if pixbuf is None:
+        raise ValueError(f"Couldn't decode cliphist item {item_id}")
+
+    os.makedirs(TEMP_PATH, exist_ok=True)
+    pixbuf.savev(path, "png", [], [])
+    prune_thumbnails()
+    return gdk.Texture.new_for_pixbuf(pixbuf)
+
+
+type ThumbnailCallback = t.Callable[[gdk.Texture | None], None]
+
+
+class Thumbnailer:
+    # Image previews are decoded and downscaled off the main thread,
+    # thumbnails are kept in memory and in TEMP_PATH
+    def __init__(self) -> None:
+        self.cache = TextureCache(THUMBNAIL_CACHE_SIZE, THUMBNAIL_CACHE_BYTES)
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: dict[str, list[ThumbnailCallback]] = {}
+        self._keys: dict[str, set[str]] = {}
+        self._generation = 0
+
+    def load(
+        self,
+        item_id: str,
+        width: int,
+        height: int,
+        callback: ThumbnailCallback
+    ) -> None:
+        key = f"{item_id}-{width}x{height}"
+        if (texture := self.cache.get(key)) is not None:
+            callback(texture)
+            return
+
+        if key in self._pending:
+            self._pending[key].append(callback)
+            return
+        self._pending[key] = [callback]
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="cliphist-thumbnails"
+            )
+        future = self._executor.submit(
+            render_thumbnail,
+            item_id,
+            backend.payloads.get(item_id),
+            width,
+            height,
+            os.path.join(TEMP_PATH, f"{key}.png")
+        )
+        generation = self._generation
+        future.add_done_callback(
+            lambda future: glib.idle_add(
+                self._finish, item_id, key, generation, future
+            )
+        )
+
+    def _finish(
+        self,
+        item_id: str,
+        key: str,
+        generation: int,
+        future: Future[gdk.Texture]
+    ) -> bool:
+        callbacks = self._pending.pop(key, [])
+        try:
+            texture: gdk.Texture | None = future.result()
+        except Exception as e:
+            logger.warning("Couldn't create thumbnail for %s: %s", item_id, e)
+            texture = None
+        if texture is not None and generation == self._generation:
+            self.cache.put(key, texture)
+            self._keys.setdefault(item_id, set()).add(key)
+        for callback in callbacks:
+            callback(texture)
+        return False
 
+    def discard(self, item_id: str) -> None:
+        # Ids are reused after the history is wiped
+        for key in self._keys.pop(item_id, ()):
+            self.cache.discard(key)
+        for file in Path(TEMP_PATH).glob(f"{item_id}-*.png"):
+            file.unlink(missing_ok=True)
 
-def save_cache_file(item_id: str) -> str:
-    output_file = Path(f"{TEMP_PATH}/{item_id}.png")
-    output_file.parent.mkdir(parents=True, exist_ok=True)
+    def clear(self) -> None:
+        self._generation += 1
+        self._keys.clear()
+        self.cache.clear()
+        clear_tmp()
 
-    if not output_file.exists():
-        with subprocess.Popen(
-            ["cliphist", "decode", item_id], stdout=subprocess.PIPE
-        ) as decode_proc, open(output_file, "wb") as file:
-            if decode_proc.stdout:
-                file.write(decode_proc.stdout.read())
 
-    return str(output_file)
+thumbnailer = Thumbnailer()
 
 
 def clear_tmp() -> None:
     tmp_dir = Path(TEMP_PATH)
     for file in tmp_dir.glob("*"):
-        file.unlink()
+        file.unlink(missing_ok=True)
@@ -1,6 +1,7 @@
 import asyncio
 from enum import Enum
 import os
+import time
 from asyncio import StreamReader, StreamWriter
 from utils.ref import Ref
 from utils.logger import logger
@@ -8,6 +9,9 @@ import typing as t
 import json
 from config import HyprlandVars
 from utils.service import Signals, AsyncService
+from src.services.hyprland_ipc import (
+    IpcConnection, EventCoalescer, summarize
+)
 from repository import gio, gtk, gdk
 
 active_workspace = Ref(0, name="workspace", delayed_init=True)
@@ -27,6 +31,8 @@ clients = Ref[dict[str, "Client"]](
 clients_use_counter = 0
 initialized = Ref(False)
 
+FULL_SYNC_INTERVAL = 1.0
+
 
 type HyprlandQueryType = t.Literal[
     "activewindow",
@@ -90,15 +96,16 @@ class Client(Signals):
         self._data = client
 
     def sync(self) -> None:
-        async def async_task() -> None:
-            data = await get_client_dict_by_address(self.address)
-            if data is None:
-                await clients_full_sync()
-            else:
-                self._data = data
-                self.notify("changed")
+        clients_sync.request_full_sync()
 
-        asyncio.create_task(async_task)
+    def update(self, **fields: t.Any) -> None:
+        changed = False
+        for key, value in fields.items():
+            if self._data.get(key) != value:
+                self._data[key] = value  # type: ignore[literal-required]
+                changed = True
+        if changed:
+            self.notify("changed")
 
     def get_icon(self) -> gtk.IconPaintable | None:
         original_app_id = self.initial_class
@@ -220,7 +227,7 @@ class Client(Signals):
 
     @property
     def fullscreen(self) -> int:
-        raise NotImplementedError("Not synced")
+        return self._data["fullscreen"]
 
     @property
     def fullscreen_client(self) -> int:
@@ -272,6 +279,17 @@ class HyprlandClient(Signals):
             SocketType.HYPRLAND: f"{instance_path}/.socket.sock",
             SocketType.HYPRSUNSET: f"{instance_path}/.hyprsunset.sock"
         }
+        self.connections = {
+            SocketType.HYPRLAND: IpcConnection(
+                self.sockets[SocketType.HYPRLAND]
+            ),
+            SocketType.HYPRSUNSET: IpcConnection(
+                self.sockets[SocketType.HYPRSUNSET],
+                batching=False
+            )
+        }
+
+        self.events = EventCoalescer(self.notify_sync)
 
         self.reader: StreamReader | None = None
         self.writer: StreamWriter | None = None
@@ -289,7 +307,7 @@ class HyprlandClient(Signals):
                 continue
             event, data = decoded.split(">>", 1)
             args: list[str] = data.split(",") if data else []
-            self.notify(event, *args)
+            self.events.push(event, args)
 
     async def raw(
         self,
@@ -297,34 +315,13 @@ class HyprlandClient(Signals):
         socket_type: SocketType = SocketType.HYPRLAND,
         timeout: float = 2.0,
     ) -> str:
-        reader, writer = await asyncio.open_unix_connection(
-            self.sockets[socket_type]
-        )
-        writer.write(command.encode("utf-8"))
-        writer.write_eof()
-        await writer.drain()
-        data = b""
-        try:
-            data = await asyncio.wait_for(
-                reader.read(),
-                timeout=timeout
-            )
-        except asyncio.TimeoutError as e:
-            writer.close()
-            await writer.wait_closed()
-            logger.error(
-                f"Timeout waiting for response to command: {command!r}",
-                exc_info=e
-            )
-            return ""
-        finally:
-            if not writer.is_closing():
-                writer.close()
-                await writer.wait_closed()
+        return await self.connections[socket_type].request(command, timeout)
 
-        writer.close()
-        await writer.wait_closed()
-        return data.decode().strip()
+    def stats(self) -> str:
+        return (
+            summarize(self.connections.values()) + "\n\n" +
+            self.events.stats.format()
+        )
 
     async def query(self, command: HyprlandQueryType | str) -> t.Any:
         raw_result = await self.raw(f"j/{command}")
@@ -369,6 +366,7 @@ class EventCallbacks:
         workspace_id: str,
         workspace_name: str
     ) -> None:
+        clients_sync.workspace_names[workspace_name] = int(workspace_id)
         if int(workspace_id) not in workspace_ids.value:
             workspace_ids.value.add(int(workspace_id))
 
@@ -377,9 +375,16 @@ class EventCallbacks:
         workspace_id: str,
         workspace_name: str
     ) -> None:
+        clients_sync.workspace_names.pop(workspace_name, None)
         if int(workspace_id) in workspace_ids.value:
             workspace_ids.value.remove(int(workspace_id))
 
+    @staticmethod
+    def on_activewindowv2(
+        window_address: str
+    ) -> None:
+        clients_sync.active_address = window_address
+
     @staticmethod
     def on_openwindow(
         window_address: str,
@@ -390,14 +395,32 @@ class EventCallbacks:
         if clients_use_counter == 0:
             return
 
-        async def async_task() -> None:
-            client = await get_client_by_address(window_address)
-            if client is None:
-                await clients_full_sync()
-            else:
-                clients.value[window_address] = client
+        workspace_id = clients_sync.workspace_id(workspace_name)
+        if workspace_id is None:
+            clients_sync.request_full_sync()
+            return
 
-        asyncio.create_task(async_task())
+        window_title = ",".join(_window_title)
+        workspace: ClientWorkspace = {
+            "id": workspace_id,
+            "name": workspace_name
+        }
+        if window_address in clients.value.keys():
+            clients.value[window_address].update(
+                workspace=workspace,
+                title=window_title
+            )
+            clients_sync.avoided_syncs += 1
+        else:
+            # Shown right away, real pid, monitor and position come
+            # with the next sync
+            clients.value[window_address] = Client(
+                new_client_dict(
+                    window_address, workspace,
+                    window_class, window_title
+                )
+            )
+            clients_sync.request_sync()
 
     @staticmethod
     def on_movewindowv2(
@@ -409,12 +432,15 @@ class EventCallbacks:
             return
 
         if window_address in clients.value.keys():
-            _client = clients.value[window_address]
-            _client._data["workspace"]["id"] = int(workspace_id)
-            _client._data["workspace"]["name"] = int(workspace_name)
-            _client.notify("changed")
+            clients.value[window_address].update(
+                workspace={
+                    "id": int(workspace_id),
+                    "name": workspace_name
+                }
+            )
+            clients_sync.avoided_syncs += 1
         else:
-            asyncio.create_task(clients_full_sync())
+            clients_sync.request_full_sync()
 
     @staticmethod
     def on_windowtitlev2(
@@ -426,29 +452,55 @@ class EventCallbacks:
 
         window_title = ",".join(_window_title)
         if window_address in clients.value.keys():
-            _client = clients.value[window_address]
-            _client._data["title"] = window_title
-            _client.notify("changed")
+            clients.value[window_address].update(title=window_title)
         else:
             # NOTE: I would use clients_full_sync() here
             # but Hyprland can sometimes send this event
             # before openwindow event
             pass
 
+    @staticmethod
+    def on_changefloatingmode(
+        window_address: str,
+        floating: str
+    ) -> None:
+        if clients_use_counter == 0:
+            return
+
+        if window_address in clients.value.keys():
+            clients.value[window_address].update(floating=floating == "1")
+            clients_sync.avoided_syncs += 1
+        else:
+            clients_sync.request_full_sync()
+
+    @staticmethod
+    def on_fullscreen(
+        state: str
+    ) -> None:
+        if clients_use_counter == 0:
+            return
+
+        # Event doesn't have address, it's always about active window
+        address = clients_sync.active_address
+        if address in clients.value.keys():
+            clients.value[address].update(fullscreen=int(state))
+            clients_sync.avoided_syncs += 1
+        else:
+            clients_sync.request_full_sync()
+
     @staticmethod
     def on_pin(
         window_address: str,
-        pin_state: bool
+        pin_state: str
     ) -> None:
         if clients_use_counter == 0:
             return
 
         if window_address in clients.value.keys():
-            _client = clients.value[window_address]
-            _client._data["pinned"] = pin_state
-            _client.notify("changed")
+            clients.value[window_address].update(pinned=pin_state == "1")
+            clients_sync.avoided_syncs += 1
         else:
-            asyncio.create_task(clients_full_sync())
+            clients_sync.request_full_sync()
 
     @staticmethod
     def on_closewindow(
@@ -459,8 +511,103 @@ class EventCallbacks:
 
         if window_address in clients.value.keys():
             clients.value.pop(window_address)
+            clients_sync.avoided_syncs += 1
         else:
-            asyncio.create_task(clients_full_sync())
+            clients_sync.request_full_sync()
+
+
+def new_client_dict(
+    address: str,
+    workspace: ClientWorkspace,
+    class_: str,
+    title: str
+) -> ClientDict:
+    # Fields that openwindow doesn't carry stay at defaults
+    # until the sync requested by on_openwindow
+    return {
+        "address": f"0x{address}",
+        "mapped": True,
+        "hidden": False,
+        "at": [0, 0],
+        "size": [0, 0],
+        "workspace": workspace,
+        "floating": False,
+        "pseudo": False,
+        "monitor": -1,
+        "class": class_,
+        "title": title,
+        "initialClass": class_,
+        "initialTitle": title,
+        "pid": 0,
+        "xwayland": False,
+        "pinned": False,
+        "fullscreen": 0,
+        "fullscreenClient": 0,
+        "grouped": [],
+        "tags": [],
+        "swallowing": "0x0",
+        "focusHistoryId": 0,
+        "inhibitingIdle": False,
+        "xdgTag": "",
+        "xdgDescription": ""
+    }
+
+
+class ClientsSync:
+    __slots__ = (
+        "full_syncs", "avoided_syncs", "gaps",
+        "active_address", "workspace_names",
+        "_last_sync", "_scheduled"
+    )
+
+    def __init__(self) -> None:
+        self.full_syncs = 0
+        self.avoided_syncs = 0
+        self.gaps = 0
+        self.active_address = ""
+        self.workspace_names: dict[str, int] = {}
+        self._last_sync = 0.0
+        self._scheduled = False
+
+    def workspace_id(self, name: str) -> int | None:
+        if name in self.workspace_names:
+            return self.workspace_names[name]
+        if name.isdigit():
+            return int(name)
+        return None
+
+    def request_full_sync(self) -> None:
+        self.gaps += 1
+        self.request_sync()
+
+    def request_sync(self) -> None:
+        # Rate limited, events close together share one j/clients
+        if self._scheduled:
+            return
+        self._scheduled = True
+        delay = self._last_sync + FULL_SYNC_INTERVAL - time.monotonic()
+        asyncio.create_task(self._delayed_sync(max(delay, 0)))
+
+    async def _delayed_sync(self, delay: float) -> None:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._scheduled = False
+        await clients_full_sync()
+
+    def synced(self) -> None:
+        self.full_syncs += 1
+        self._last_sync = time.monotonic()
+
+    def format(self) -> str:
+        return (
+            f"clients: {len(clients.value)}\n" +
+            f"full_syncs: {self.full_syncs}\n" +
+            f"avoided_syncs: {self.avoided_syncs}\n" +
+            f"gaps: {self.gaps}"
+        )
+
+
+clients_sync = ClientsSync()
 
 
 class Keyboard(t.TypedDict):
@@ -511,6 +658,9 @@ async def get_active_workspaces(client: HyprlandClient) -> list[int]:
     )
 
     workspace_ids = [int(object["id"]) for object in workspaces]
+    clients_sync.workspace_names = {
+        str(object["name"]): int(object["id"]) for object in workspaces
+    }
     return workspace_ids
 
 
@@ -526,41 +676,40 @@ def change_night_light(value: bool) -> None:
 
 
 async def get_client_by_address(addr: str) -> Client | None:
-    output: list[ClientDict] = await client.query("clients")
-    if not addr.startswith("0x"):
-        addr = "0x" + addr
+    addr = addr.removeprefix("0x")
+    if addr in clients.value:
+        return clients.value[addr]
 
+    output: list[ClientDict] = await client.query("clients")
     for _client in output:
-        if _client["address"] == addr:
+        if _client["address"].removeprefix("0x") == addr:
             return Client(_client)
     return None
 
 
 async def get_client_dict_by_address(addr: str) -> ClientDict | None:
-    output: list[ClientDict] = await client.query("clients")
-
-    for _client in output:
-        if _client["address"] == addr:
-            return _client
-    return None
+    _client = await get_client_by_address(addr)
+    return _client._data if _client is not None else None
 
 
 async def clients_full_sync() -> None:
     output: list[ClientDict] = await client.query("clients")
-    addresses: list[str] = []
-
-    for _client in output:
-        address = _client["address"].lstrip("0x")
-        if address in clients.value:
-            clients.value[address]._data = _client
-            clients.value[address].notify("changed")
-        else:
-            clients.value[address] = Client(_client)
-        addresses.append(address)
+    clients_sync.synced()
+    addresses: set[str] = set()
+
+    with clients.batch():
+        for _client in output:
+            address = _client["address"].removeprefix("0x")
+            if address in clients.value:
+                clients.value[address]._data = _client
+                clients.value[address].notify("changed")
+            else:
+                clients.value[address] = Client(_client)
+            addresses.add(address)
 
-    for client_address in set(clients.value.keys()):
-        if client_address not in addresses:
-            clients.value.pop(client_address)
+        for client_address in set(clients.value.keys()):
+            if client_address not in addresses:
+                clients.value.pop(client_address)
 
     clients.notify_signal("synced", clients.value)
 
@@ -0,0 +1,373 @@
+import asyncio
+import time
+import typing as t
+from collections import deque
+from enum import Enum
+from utils.logger import logger
+
+# Hyprland closes request socket after every reply, so connection
+# can't be kept alive. Instead, concurrent requests are sent through
+# one connection using [[BATCH]] and identical queries are shared.
+
+BATCH_PREFIX = "[[BATCH]]"
+BATCH_DELIMITER = "\n\n\n"
+MAX_BATCH_SIZE = 32
+READ_TIMEOUT = 10.0
+LATENCY_SAMPLES = 256
+
+
+class IpcStats:
+    __slots__ = (
+        "requests", "connections", "batches",
+        "coalesced", "timeouts", "errors",
+        "total_time", "max_time", "_latencies"
+    )
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self._latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, elapsed: float) -> None:
+        self.requests += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self._latencies.append(elapsed)
+
+    def percentile(self, percent: float) -> float:
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def as_dict(self) -> dict[str, float | int]:
+        average = self.total_time / self.requests if self.requests else 0.0
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_ms": round(average * 1000, 3),
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p95_ms": round(self.percentile(95) * 1000, 3),
+            "max_ms": round(self.max_time * 1000, 3)
+        }
+
+    def format(self) -> str:
+        return "\n".join(
+            f"{key}: {value}" for key, value in self.as_dict().items()
+        )
+
+
+def is_batchable(command: str) -> bool:
+    return (
+        ";" not in command
+        and not command.startswith(BATCH_PREFIX)
+    )
+
+
+def is_coalescable(command: str) -> bool:
+    # Only read-only queries can be shared, dispatches have to run each time
+    return command.startswith("j/")
+
+
+class IpcConnection:
+    __slots__ = (
+        "socket_path", "batching", "stats",
+        "_pending", "_in_flight", "_flush_scheduled"
+    )
+
+    def __init__(self, socket_path: str, batching: bool = True) -> None:
+        self.socket_path = socket_path
+        self.batching = batching
+        self.stats = IpcStats()
+        self._pending: list[tuple[str, asyncio.Future[str]]] = []
+        self._in_flight: dict[str, asyncio.Future[str]] = {}
+        self._flush_scheduled = False
+
+    async def send_raw(self, command: str) -> str:
+        reader, writer = await asyncio.open_unix_connection(
+            self.socket_path
+        )
+        self.stats.connections += 1
+        try:
+            writer.write(command.encode("utf-8"))
+            writer.write_eof()
+            await writer.drain()
+            data = await asyncio.wait_for(reader.read(), READ_TIMEOUT)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        return data.decode()
+
+    async def request(self, command: str, timeout: float = 2.0) -> str:
+        start = time.perf_counter()
+        future = self._in_flight.get(command)
+        if future is None:
+            future = self._enqueue(command)
+        else:
+            self.stats.coalesced += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError as e:
+            self.stats.timeouts += 1
+            # Reply may never come, next identical query sends again
+            if self._in_flight.get(command) is future:
+                del self._in_flight[command]
+            logger.error(
+                f"Timeout waiting for response to command: {command!r}",
+                exc_info=e
+            )
+            return ""
+        finally:
+            self.stats.record(time.perf_counter() - start)
+
+    def _enqueue(self, command: str) -> asyncio.Future[str]:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[str] = loop.create_future()
+        # Waiters may time out before the reply, don't leave errors unread
+        future.add_done_callback(
+            lambda f: f.cancelled() or f.exception()
+        )
+        if is_coalescable(command):
+            self._in_flight[command] = future
+        self._pending.append((command, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            # Requests created in the same loop iteration go together
+            loop.call_soon(self._flush)
+        return future
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        pending = self._pending
+        self._pending = []
+
+        batch: list[tuple[str, asyncio.Future[str]]] = []
+        for item in pending:
+            if self.batching and is_batchable(item[0]):
+                batch.append(item)
+                if len(batch) >= MAX_BATCH_SIZE:
+                    asyncio.create_task(self._send(batch))
+                    batch = []
+            else:
+                asyncio.create_task(self._send([item]))
+        if batch:
+            asyncio.create_task(self._send(batch))
+
+    async def _send(
+        self, items: list[tuple[str, asyncio.Future[str]]]
+    ) -> None:
+        try:
+            if len(items) == 1:
+                command, future = items[0]
+                self._resolve(command, future, await self.send_raw(command))
+                return
+
+            self.stats.batches += 1
+            commands = [command for command, _ in items]
+            response = await self.send_raw(
+                BATCH_PREFIX + ";".join(commands)
+            )
+            parts = response.split(BATCH_DELIMITER)
+            if len(parts) == len(items) + 1 and not parts[-1].strip():
+                parts.pop()
+            if len(parts) != len(items):
+                if __debug__:
+                    logger.debug(
+                        "Unexpected batch reply (%d parts for %d commands)",
+                        len(parts), len(items)
+                    )
+                # Dispatches were already run by Hyprland, only
+                # read-only queries are safe to send again
+                for command, future in items:
+                    self._resolve(
+                        command, future,
+                        await self.send_raw(command)
+                        if is_coalescable(command) else ""
+                    )
+                return
+
+            for (command, future), part in zip(items, parts):
+                self._resolve(command, future, part)
+        except Exception as e:
+            self.stats.errors += 1
+            for command, future in items:
+                if self._in_flight.get(command) is future:
+                    del self._in_flight[command]
+                if not future.done():
+                    future.set_exception(e)
+
+    def _resolve(
+        self,
+        command: str,
+        future: asyncio.Future[str],
+        result: str
+    ) -> None:
+        if self._in_flight.get(command) is future:
+            del self._in_flight[command]
+        if not future.done():
+            future.set_result(result.strip())
+
+
+def summarize(connections: t.Iterable[IpcConnection]) -> str:
+    return "\n\n".join(
+        f"{connection.socket_path}\n{connection.stats.format()}"
+        for connection in connections
+    )
+
+
+class EventPriority(int, Enum):
+    URGENT = 0
+    NORMAL = 1
+    COSMETIC = 2
+
+
+FRAME_BUDGET = 0.016
+
+# Events that change what user sees right now (bar workspaces, layout)
+URGENT_EVENTS = {
+    "workspace", "workspacev2",
+    "focusedmon", "focusedmonv2",
+    "createworkspace", "createworkspacev2",
+    "destroyworkspace", "destroyworkspacev2",
+    "activelayout", "submap"
+}
+COSMETIC_EVENTS = {
+    "windowtitle", "windowtitlev2"
+}
+# Only the latest event of the same kind matters
+LATEST_EVENTS = {
+    "workspace", "workspacev2",
+    "focusedmon", "focusedmonv2",
+    "activewindow", "activewindowv2",
+    "submap"
+}
+# Only the latest event for the same first argument (address) matters
+LATEST_BY_ARG_EVENTS = {
+    "activelayout",
+    "windowtitle", "windowtitlev2",
+    "movewindow", "movewindowv2",
+    "changefloatingmode", "pin"
+}
+# These depend on state set by previous events, so queue is flushed first
+BARRIER_EVENTS = {
+    "fullscreen"
+}
+
+EventKey = tuple[str, ...] | int
+
+
+def event_priority(event: str) -> EventPriority:
+    if event in URGENT_EVENTS:
+        return EventPriority.URGENT
+    if event in COSMETIC_EVENTS:
+        return EventPriority.COSMETIC
+    return EventPriority.NORMAL
+
+
+def coalesce_key(event: str, args: list[str]) -> tuple[str, ...] | None:
+    if event in LATEST_EVENTS:
+        return (event,)
+    if event in LATEST_BY_ARG_EVENTS and args:
+        return (event, args[0])
+    return None
+
+
+class EventStats:
+    __slots__ = ("received", "dispatched", "merged", "flushes")
+
+    def __init__(self) -> None:
+        self.received = 0
+        self.dispatched = 0
+        self.merged = 0
+        self.flushes = 0
+
+    def format(self) -> str:
+        return (
+            f"events_received: {self.received}\n" +
+            f"events_dispatched: {self.dispatched}\n" +
+            f"events_merged: {self.merged}\n" +
+            f"event_flushes: {self.flushes}"
+        )
+
+
+# Events are delivered in arrival order, a superseded event is dropped
+# and only priority decides how soon the queue is flushed
+class EventCoalescer:
+    __slots__ = (
+        "callback", "frame_budget", "stats",
+        "_queue", "_counter", "_handle", "_urgent_scheduled"
+    )
+
+    def __init__(
+        self,
+        callback: t.Callable[..., None],
+        frame_budget: float = FRAME_BUDGET
+    ) -> None:
+        self.callback = callback
+        self.frame_budget = frame_budget
+        self.stats = EventStats()
+        self._queue: dict[EventKey, tuple[str, list[str]]] = {}
+        self._counter = 0
+        self._handle: asyncio.Handle | None = None
+        self._urgent_scheduled = False
+
+    def push(self, event: str, args: list[str]) -> None:
+        self.stats.received += 1
+        if event in BARRIER_EVENTS:
+            self.flush()
+            self._dispatch(event, args)
+            return
+
+        key: EventKey | None = coalesce_key(event, args)
+        if key is None:
+            self._counter += 1
+            key = self._counter
+        elif key in self._queue:
+            # Latest event goes where it arrived, not where the dropped
+            # one was, so it never runs before events it came after
+            del self._queue[key]
+            self.stats.merged += 1
+        self._queue[key] = (event, args)
+        self._schedule(event_priority(event) == EventPriority.URGENT)
+
+    def _schedule(self, urgent: bool) -> None:
+        if self._handle is not None:
+            if not urgent or self._urgent_scheduled:
+                return
+            self._handle.cancel()
+
+        loop = asyncio.get_running_loop()
+        self._urgent_scheduled = urgent
+        if urgent:
+            self._handle = loop.call_soon(self.flush)
+        else:
+            self._handle = loop.call_later(self.frame_budget, self.flush)
+
+    def flush(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._urgent_scheduled = False
+
+        self.stats.flushes += 1
+        events = list(self._queue.values())
+        self._queue.clear()
+        for event, args in events:
+            self._dispatch(event, args)
+
+    def _dispatch(self, event: str, args: list[str]) -> None:
+        self.stats.dispatched += 1
+        self.callback(event, *args)
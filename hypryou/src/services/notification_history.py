@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+import typing as t
+from os.path import join as pjoin
+from config import APP_CACHE_PATH, Settings
+from repository import glib
+from utils.logger import logger
+
+if t.TYPE_CHECKING:
+    from src.services.notifications import Notification
+
+HISTORY_PATH = pjoin(APP_CACHE_PATH, "notifications.db")
+MAX_ENTRIES = 5000
+FLUSH_INTERVAL_MS = 1000
+PAGE_SIZE = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY,
+    notification_id INTEGER NOT NULL,
+    app_name TEXT NOT NULL,
+    app_icon TEXT NOT NULL,
+    desktop_entry TEXT,
+    summary TEXT NOT NULL,
+    body TEXT NOT NULL,
+    urgency INTEGER NOT NULL,
+    category TEXT,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notifications_time ON notifications(time);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notifications_fts USING fts5(
+    app_name, summary, body,
+    content='notifications', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS notifications_insert
+AFTER INSERT ON notifications BEGIN
+    INSERT INTO notifications_fts(rowid, app_name, summary, body)
+    VALUES (new.id, new.app_name, new.summary, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS notifications_delete
+AFTER DELETE ON notifications BEGIN
+    INSERT INTO notifications_fts(
+        notifications_fts, rowid, app_name, summary, body
+    )
+    VALUES ('delete', old.id, old.app_name, old.summary, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS notifications_update
+AFTER UPDATE ON notifications BEGIN
+    INSERT INTO notifications_fts(
+        notifications_fts, rowid, app_name, summary, body
+    )
+    VALUES ('delete', old.id, old.app_name, old.summary, old.body);
+    INSERT INTO notifications_fts(rowid, app_name, summary, body)
+    VALUES (new.id, new.app_name, new.summary, new.body);
+END;
+"""
+
+COLUMNS = (
+    "id", "notification_id", "app_name", "app_icon", "desktop_entry",
+    "summary", "body", "urgency", "category", "time"
+)
+INSERT_SQL = (
+    "INSERT INTO notifications (" + ", ".join(COLUMNS[1:]) + ") " +
+    "VALUES (" + ", ".join("?" * len(COLUMNS[1:])) + ")"
+)
+UPDATE_SQL = (
+    "UPDATE notifications SET " +
+    ", ".join(f"{column} = ?" for column in COLUMNS[1:]) +
+    " WHERE id = ?"
+)
+
+
+class HistoryEntry(t.NamedTuple):
+    id: int
+    notification_id: int
+    app_name: str
+    app_icon: str
+    desktop_entry: str | None
+    summary: str
+    body: str
+    urgency: int
+    category: str | None
+    time: float
+
+
+type Row = tuple[
+    int, str, str, str | None, str, str, int, str | None, float
+]
+
+
+def fts_query(text: str) -> str:
+    # Every word is matched as a quoted prefix so user input
+    # can't be parsed as FTS syntax
+    terms = []
+    for word in text.split():
+        escaped = word.replace('"', '""')
+        terms.append(f'"{escaped}"*')
+    return " ".join(terms)
+
+
+class NotificationHistory:
+    def __init__(self, path: str = HISTORY_PATH) -> None:
+        self.path = path
+        self.has_fts = False
+        self._db: sqlite3.Connection | None = None
+        # By notification id, replacing one before flush writes it once
+        self._queue: dict[int, Row] = {}
+        # Rows of live notifications, replacing one updates its row.
+        # Ids restart every session, so they can't be unique in the table
+        self._rows: dict[int, int] = {}
+        self._closed: set[int] = set()
+        self._flush_source: int | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = self._open()
+        return self._db
+
+    def _open(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        try:
+            db.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(
+                "SQLite has no FTS5, history search will be slower: %s", e
+            )
+        db.commit()
+        return db
+
+    def enabled(self) -> bool:
+        return bool(Settings().get("notification_history"))
+
+    def add(self, notification: Notification) -> None:
+        if not self.enabled():
+            return
+        hints = notification.hints
+        desktop_entry = hints.get("desktop-entry")
+        category = hints.get("category")
+        self._queue[notification.id] = (
+            notification.id,
+            notification.app_name,
+            notification.app_icon,
+            desktop_entry if isinstance(desktop_entry, str) else None,
+            notification.summary,
+            notification.body,
+            int(notification.urgency),
+            category if isinstance(category, str) else None,
+            notification.time
+        )
+        if self._flush_source is None:
+            # Notifications come in bursts, write them in one transaction
+            self._flush_source = glib.timeout_add(
+                FLUSH_INTERVAL_MS, self._on_flush
+            )
+
+    def _on_flush(self) -> bool:
+        self._flush_source = None
+        self.flush()
+        return False
+
+    def forget(self, notification_id: int) -> None:
+        # Notification was closed, its row is final
+        self._rows.pop(notification_id, None)
+        if notification_id in self._queue:
+            self._closed.add(notification_id)
+
+    def live_rows(self) -> set[int]:
+        self.flush()
+        return set(self._rows.values())
+
+    def flush(self) -> None:
+        if not self._queue:
+            return
+        rows = self._queue
+        closed = self._closed
+        self._queue = {}
+        self._closed = set()
+        try:
+            with self.db:
+                for notification_id, row in rows.items():
+                    row_id = self._rows.get(notification_id)
+                    # Row may be pruned already
+                    if row_id is None or not self.db.execute(
+                        UPDATE_SQL, (*row, row_id)
+                    ).rowcount:
+                        row_id = self.db.execute(INSERT_SQL, row).lastrowid
+                    if notification_id not in closed and row_id is not None:
+                        self._rows[notification_id] = row_id
+                self._prune()
+        except sqlite3.Error as e:
+            logger.error("Couldn't save notification history", exc_info=e)
+
+    def _prune(self) -> None:
+        days = Settings().get("notification_history_days") or 0
+        if days > 0:
+            self.db.execute(
+                "DELETE FROM notifications WHERE time < ?",
+                (time.time() - days * 86400,)
+            )
+        self.db.execute(
+            "DELETE FROM notifications WHERE id <= (" +
+            "SELECT id FROM notifications ORDER BY id DESC " +
+            "LIMIT 1 OFFSET ?)",
+            (MAX_ENTRIES,)
+        )
+
+    def page(
+        self,
+        query: str | None = None,
+        before: int | None = None,
+        limit: int = PAGE_SIZE
+    ) -> list[HistoryEntry]:
+        # Keyset pagination, pass id of the last entry to get the next page
+        self.flush()
+        columns = ", ".join(f"n.{column}" for column in COLUMNS)
+        conditions: list[str] = []
+        params: list[t.Any] = []
+        if before is not None:
+            conditions.append("n.id < ?")
+            params.append(before)
+
+        if query and query.strip() and self.has_fts:
+            sql = (
+                f"SELECT {columns} FROM notifications_fts f " +
+                "JOIN notifications n ON n.id = f.rowid"
+            )
+            conditions.append("notifications_fts MATCH ?")
+            params.append(fts_query(query))
+        else:
+            sql = f"SELECT {columns} FROM notifications n"
+            if query and query.strip():
+                conditions.append(
+                    "(n.app_name LIKE ? OR n.summary LIKE ? OR n.body LIKE ?)"
+                )
+                params.extend([f"%{query.strip()}%"] * 3)
+
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY n.id DESC LIMIT ?"
+        params.append(limit)
+
+        try:
+            return [
+                HistoryEntry(*row)
+                for row in self.db.execute(sql, params)
+            ]
+        except sqlite3.Error as e:
+            logger.error("Couldn't read notification history", exc_info=e)
+            return []
+
+    def count(self) -> int:
+        self.flush()
+        row = self.db.execute("SELECT COUNT(*) FROM notifications").fetchone()
+        return int(row[0])
+
+    def clear(self) -> None:
+        self._queue.clear()
+        self._rows.clear()
+        self._closed.clear()
+        with self.db:
+            self.db.execute("DELETE FROM notifications")
+
+    def close(self) -> None:
+        if self._flush_source is not None:
+            glib.source_remove(self._flush_source)
+            self._flush_source = None
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+history = NotificationHistory()
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from enum import Enum
+from concurrent.futures import Future, ThreadPoolExecutor
 import heapq
 import time
-from config import CONFIG_DIR
+from config import CONFIG_DIR, Settings
 import os
 from repository import glib, gio, gdk_pixbuf, gtk, gdk
 from utils import Ref
@@ -11,6 +12,8 @@ from utils.logger import logger
 import typing as t
 from pathlib import Path
 from utils.service import Signals, Service
+from utils.textures import TextureCache
+from src.services.notification_history import history
 
 
 WATCHER_XML_PATH = os.path.join(
@@ -41,6 +44,16 @@ urgency_timeouts = {
     2: 0
 }
 _next_id = 300
+# Older ones are closed, they're still available in history
+MAX_NOTIFICATIONS = 100
+
+# Images are shown at 64px, keep enough for 2x scaling
+MAX_IMAGE_SIZE = 128
+IMAGE_CACHE_SIZE = 256
+IMAGE_CACHE_BYTES = 16 * 1024 * 1024
+# Kept as glib.Variant so pixel data isn't copied into Python
+IMAGE_DATA_HINTS = ("image-data", "image_data", "icon_data")
+IMAGE_PATH_HINTS = ("image-path", "image_path")
 
 notifications = Ref[dict[int, "Notification"]]({}, name="notifications")
 popups = Ref[dict[int, "Notification"]]({}, name="notif_popups")
@@ -58,9 +71,47 @@ def generate_new_id() -> int:
     return result
 
 
-def get_pixbuf_from_data(tuple: ImageData) -> gdk_pixbuf.Pixbuf:
-    width, height, rowstride, alpha, bits_per_sample, channels, data = tuple
-    return gdk_pixbuf.Pixbuf.new_from_data(
+def downscale(pixbuf: gdk_pixbuf.Pixbuf) -> gdk_pixbuf.Pixbuf:
+    width, height = pixbuf.get_width(), pixbuf.get_height()
+    if max(width, height) <= MAX_IMAGE_SIZE:
+        return pixbuf
+    scale = MAX_IMAGE_SIZE / max(width, height)
+    scaled = pixbuf.scale_simple(
+        max(1, round(width * scale)),
+        max(1, round(height * scale)),
+        gdk_pixbuf.InterpType.BILINEAR
+    )
+    return scaled or pixbuf
+
+
+def texture_from_image_data(variant: glib.Variant) -> gdk.Texture | None:
+    # (iiibiiay): width, height, rowstride, alpha, bits, channels, data
+    width, height, rowstride, alpha, bits_per_sample, channels = (
+        variant.get_child_value(i).unpack() for i in range(6)
+    )
+    data = variant.get_child_value(6).get_data_as_bytes()
+    key = (
+        glib.compute_checksum_for_bytes(glib.ChecksumType.SHA1, data) +
+        f":{width}x{height}:{rowstride}:{channels}"
+    )
+    if (texture := image_cache.get(key)) is not None:
+        return texture
+
+    expected_size = rowstride * (height - 1) + width * channels
+    if (
+        bits_per_sample != 8
+        or channels not in (3, 4)
+        or width <= 0 or height <= 0
+        or data.get_size() < expected_size
+    ):
+        if __debug__:
+            logger.debug(
+                "Skipping malformed image data (%sx%s, %s channels)",
+                width, height, channels
+            )
+        return None
+
+    pixbuf = gdk_pixbuf.Pixbuf.new_from_bytes(
         data,
         gdk_pixbuf.Colorspace.RGB,
         alpha,
@@ -69,6 +120,99 @@ def get_pixbuf_from_data(tuple: ImageData) -> gdk_pixbuf.Pixbuf:
         height,
         rowstride
     )
+    return image_cache.put(key, gdk.Texture.new_for_pixbuf(downscale(pixbuf)))
+
+
+def decode_image_file(path: str) -> gdk.Texture:
+    info = gdk_pixbuf.Pixbuf.get_file_info(path)
+    if info[0] is not None and max(info[1], info[2]) > MAX_IMAGE_SIZE:
+        # Decoder scales while reading, full image is never allocated
+        pixbuf = gdk_pixbuf.Pixbuf.new_from_file_at_scale(
+            path, MAX_IMAGE_SIZE, MAX_IMAGE_SIZE, True
+        )
+    else:
+        pixbuf = gdk_pixbuf.Pixbuf.new_from_file(path)
+    return gdk.Texture.new_for_pixbuf(pixbuf)
+
+
+type ImageCallback = t.Callable[[gdk.Texture | None], None]
+
+
+class ImageLoader:
+    def __init__(self) -> None:
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: dict[str, list[ImageCallback]] = {}
+
+    def load(self, path: str, callback: ImageCallback) -> None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            callback(None)
+            return
+        key = f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+        if (texture := image_cache.get(key)) is not None:
+            callback(texture)
+            return
+
+        if key in self._pending:
+            # Same avatar requested by several notifications
+            self._pending[key].append(callback)
+            return
+        self._pending[key] = [callback]
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="notification-images"
+            )
+        future = self._executor.submit(decode_image_file, path)
+        future.add_done_callback(
+            lambda future: glib.idle_add(self._finish, key, path, future)
+        )
+
+    def _finish(
+        self,
+        key: str,
+        path: str,
+        future: Future[gdk.Texture]
+    ) -> bool:
+        callbacks = self._pending.pop(key, [])
+        try:
+            texture: gdk.Texture | None = image_cache.put(
+                key, future.result()
+            )
+        except Exception as e:
+            logger.warning("Couldn't load notification image %s: %s", path, e)
+            texture = None
+        for callback in callbacks:
+            callback(texture)
+        return False
+
+
+image_cache = TextureCache(IMAGE_CACHE_SIZE, IMAGE_CACHE_BYTES)
+image_loader = ImageLoader()
+
+
+def unpack_hints(variant: glib.Variant) -> Hints:
+    hints: dict[str, t.Any] = {}
+    for i in range(variant.n_children()):
+        entry = variant.get_child_value(i)
+        key = entry.get_child_value(0).get_string()
+        value = entry.get_child_value(1).get_variant()
+        if key in IMAGE_DATA_HINTS:
+            hints[key] = value
+        else:
+            hints[key] = value.unpack()
+    return t.cast(Hints, hints)
+
+
+def unpack_notify_params(params: glib.Variant) -> tuple[t.Any, ...]:
+    # (susssasa{sv}i), hints are 7th
+    return tuple(
+        unpack_hints(params.get_child_value(i)) if i == 6
+        else params.get_child_value(i).unpack()
+        for i in range(params.n_children())
+    )
 
 
 class NotificationClosedReason(int, Enum):
@@ -93,7 +237,8 @@ class NotificationUrgency(int, Enum):
     CRITICAL = 2
 
 
-type ImageData = tuple[int, int, int, bool, int, int, int]
+# Unpacked lazily, see IMAGE_DATA_HINTS
+type ImageData = glib.Variant
 type Category = t.Literal[
     "call",
     "call.ended",
@@ -171,12 +316,18 @@ class Notification(Signals):
         self.id = id
         self.watcher = watcher
         self.cached_app_icon: tuple[str, gio.Icon | str | None] | None = None
+        self.image: gdk.Texture | None = None
+        self._image_generation = 0
+        # Number of notifications merged into this one
+        self.count = 1
         self.set_values(**kwargs)
 
     def close(self, reason: NotificationClosedReason) -> None:
         if __debug__:
             logger.debug("Closing notification %s", self.id)
         self.watcher.signal_notification_closed(self.id, reason)
+        self.watcher.limiter.forget(self.app_name, self.id)
+        history.forget(self.id)
         if self.id in popups.value:
             del popups.value[self.id]
         if self.id in notifications.value:
@@ -225,20 +376,51 @@ class Notification(Signals):
 
         return self.get_icon_from_desktop_entry()
 
-    def get_icon(self) -> gdk_pixbuf.Pixbuf | str | None:
-        if "image-data" in self.hints.keys():
-            return get_pixbuf_from_data(self.hints["image-data"])
-        elif "image-path" in self.hints.keys():
-            path_or_icon = self.hints["image-path"]
-            if os.path.isfile(path_or_icon):
-                return gdk_pixbuf.Pixbuf.new_from_file(path_or_icon)
+    def load_image(self) -> None:
+        self.image = None
+        self._image_generation += 1
+        for key in IMAGE_DATA_HINTS:
+            if key in self.hints:
+                self.image = texture_from_image_data(self.hints[key])
+                return
+
+        path = self.get_image_path()
+        if path is not None and os.path.isfile(path):
+            generation = self._image_generation
+            image_loader.load(
+                path,
+                lambda texture: self._on_image_loaded(generation, texture)
+            )
+
+    def _on_image_loaded(
+        self,
+        generation: int,
+        texture: gdk.Texture | None
+    ) -> None:
+        if generation != self._image_generation or texture is None:
+            return
+        self.image = texture
+        self.notify("changed")
+
+    def get_image_path(self) -> str | None:
+        for key in IMAGE_PATH_HINTS:
+            value = self.hints.get(key)
+            if isinstance(value, str) and value:
+                if value.startswith("file://"):
+                    return t.cast(str, gio.File.new_for_uri(value).get_path())
+                return value
+        return None
+
+    def get_icon(self) -> gdk.Texture | str | None:
+        if self.image is not None:
+            return self.image
 
+        path_or_icon = self.get_image_path()
+        if path_or_icon and not os.path.isfile(path_or_icon):
             display = gdk.Display.get_default()
             icon_theme = gtk.IconTheme.get_for_display(display)
             if icon_theme.has_icon(path_or_icon):
                 return path_or_icon
-        elif "icon_data" in self.hints.keys():
-            return get_pixbuf_from_data(self.hints["icon_data"])
 
         return None
 
@@ -257,11 +439,125 @@ class Notification(Signals):
         )
         self.hints = kwargs["hints"]
         self.time = time.time()
+        self.load_image()
 
         if notify:
             self.notify("changed")
 
 
+class IngestAction(Enum):
+    ACCEPT = 0
+    MERGE = 1
+    DROP = 2
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float) -> None:
+        self.tokens = tokens
+        self.updated = time.monotonic()
+
+
+class IngestStats:
+    __slots__ = ("received", "accepted", "merged", "dropped")
+
+    def __init__(self) -> None:
+        self.received = 0
+        self.accepted = 0
+        self.merged = 0
+        self.dropped = 0
+
+    def format(self) -> str:
+        return (
+            f"received: {self.received}, accepted: {self.accepted}, " +
+            f"merged: {self.merged}, dropped: {self.dropped}"
+        )
+
+
+class IngestLimiter:
+    # Per-app token buckets. Over the limit notifications are merged into
+    # the app's latest one, floods over FLOOD_FACTOR * burst are dropped
+    FLOOD_FACTOR = 10
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self) -> None:
+        self.buckets: dict[str, TokenBucket] = {}
+        self.targets: dict[str, int] = {}
+        # Counts notifications dropped while there was no target
+        self.summaries: dict[str, int] = {}
+        self.total = IngestStats()
+        self.apps: dict[str, IngestStats] = {}
+        self._pruned = time.monotonic()
+
+    def check(self, app_name: str, critical: bool) -> IngestAction:
+        settings = Settings()
+        rate = float(settings.get("notification_rate_limit") or 0)
+        burst = max(1.0, float(settings.get("notification_burst") or 1))
+        if critical or rate <= 0:
+            return IngestAction.ACCEPT
+
+        now = time.monotonic()
+        if now - self._pruned >= self.PRUNE_INTERVAL:
+            self.prune(now, rate, burst)
+        bucket = self.buckets.get(app_name)
+        if bucket is None:
+            bucket = self.buckets[app_name] = TokenBucket(burst)
+        bucket.tokens = min(
+            burst, bucket.tokens + (now - bucket.updated) * rate
+        )
+        bucket.updated = now
+
+        bucket.tokens -= 1
+        if bucket.tokens >= 0:
+            return IngestAction.ACCEPT
+        floor = -burst * self.FLOOD_FACTOR
+        if bucket.tokens >= floor:
+            return IngestAction.MERGE
+        bucket.tokens = floor
+        return IngestAction.DROP
+
+    def prune(self, now: float, rate: float, burst: float) -> None:
+        # A refilled bucket is the same as a new one
+        self._pruned = now
+        for app_name, bucket in list(self.buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * rate >= burst:
+                del self.buckets[app_name]
+
+    def forget(self, app_name: str, notification_id: int) -> None:
+        if self.targets.get(app_name) == notification_id:
+            del self.targets[app_name]
+        if self.summaries.get(app_name) == notification_id:
+            del self.summaries[app_name]
+
+    def record(self, app_name: str, action: IngestAction) -> None:
+        stats = self.apps.get(app_name)
+        if stats is None:
+            stats = self.apps[app_name] = IngestStats()
+        for _stats in (self.total, stats):
+            _stats.received += 1
+            if action == IngestAction.ACCEPT:
+                _stats.accepted += 1
+            elif action == IngestAction.MERGE:
+                _stats.merged += 1
+            else:
+                _stats.dropped += 1
+
+    def format(self) -> str:
+        lines = [f"total: {self.total.format()}"]
+        apps = sorted(
+            self.apps.items(),
+            key=lambda item: item[1].received,
+            reverse=True
+        )
+        for app_name, stats in apps:
+            lines.append(f"{app_name or 'unknown'}: {stats.format()}")
+        return "\n".join(lines)
+
+
+ingest_limiter = IngestLimiter()
+
+
 class NotificationsWatcher:
     def __init__(self) -> None:
         self.conn: gio.DBusConnection
@@ -270,6 +566,7 @@ class NotificationsWatcher:
 
         self.expiry_manager = ExpiryManager()
         self._expiry_timer_id: int | None = None
+        self.limiter = ingest_limiter
 
     def register(self) -> int:
         return gio.bus_own_name(
@@ -327,7 +624,7 @@ class NotificationsWatcher:
                     logger.debug("Asked for notification server info")
                 invocation.return_value(server_information)
             case "Notify":
-                new_id = self.notify(*params.unpack())
+                new_id = self.notify(*unpack_notify_params(params))
                 invocation.return_value(glib.Variant("(u)", (new_id, )))
             case "CloseNotification":
                 id = t.cast(int, params.unpack()[0])
@@ -375,23 +672,38 @@ class NotificationsWatcher:
                     "Got new notification from '%s'; Replacing %s",
                     app_name, replaces_id
                 )
-            notification = notifications.value[replaces_id]
-            notification.set_values(**kwargs)
-            if (
-                not dnd.value
-                or notification.urgency == NotificationUrgency.CRITICAL
-            ):
-                popups.value[replaces_id] = notification
-
-            if expire_timeout > 0:
-                self.expiry_manager.schedule(
-                    replaces_id,
-                    expire_timeout,
-                    dismiss_on_timeout
-                )
-                self._reschedule_timer()
+            return self.update(
+                notifications.value[replaces_id], kwargs,
+                expire_timeout, dismiss_on_timeout
+            )
 
-            return replaces_id
+        action = self.limiter.check(
+            app_name,
+            hints.get("urgency") == NotificationUrgency.CRITICAL
+        )
+        target_id = self.limiter.targets.get(app_name)
+        target = notifications.value.get(target_id) if target_id else None
+        if action != IngestAction.ACCEPT:
+            if target is None:
+                # Target was closed, showing this one instead would turn
+                # limiting off, so it's only counted
+                action = IngestAction.DROP
+                self.count_suppressed(app_name, app_icon)
+            self.limiter.record(app_name, action)
+            if action == IngestAction.DROP:
+                # Id of a notification that is never shown, so closing or
+                # replacing it can't touch another one
+                return generate_new_id()
+            if __debug__:
+                logger.debug(
+                    "Too many notifications from '%s'; Merging into %s",
+                    app_name, target.id
+                )
+            target.count += 1
+            return self.update(
+                target, kwargs, expire_timeout, dismiss_on_timeout
+            )
+        self.limiter.record(app_name, IngestAction.ACCEPT)
 
         new_id = generate_new_id()
         if __debug__:
@@ -401,6 +713,9 @@ class NotificationsWatcher:
             )
         notification = Notification(new_id, self, **kwargs)
         notifications.value[new_id] = notification
+        self.limiter.targets[app_name] = new_id
+        history.add(notification)
+        self.close_overflow()
         if (
             not dnd.value
             or notification.urgency == NotificationUrgency.CRITICAL
@@ -417,6 +732,67 @@ class NotificationsWatcher:
 
         return new_id
 
+    def count_suppressed(self, app_name: str, app_icon: str) -> None:
+        summary_id = self.limiter.summaries.get(app_name)
+        summary = notifications.value.get(summary_id) if summary_id else None
+        if summary is not None:
+            summary.count += 1
+            summary.notify("changed")
+            return
+
+        new_id = generate_new_id()
+        summary = Notification(
+            new_id, self,
+            app_name=app_name,
+            app_icon=app_icon,
+            summary="Notifications hidden",
+            body=f"{app_name or 'An app'} sends too many notifications",
+            actions=[],
+            hints=t.cast(Hints, {})
+        )
+        notifications.value[new_id] = summary
+        self.limiter.summaries[app_name] = new_id
+        self.close_overflow()
+        if not dnd.value:
+            popups.value[new_id] = summary
+        self.expiry_manager.schedule(
+            new_id, urgency_timeouts[NotificationUrgency.NORMAL], True
+        )
+        self._reschedule_timer()
+
+    def update(
+        self,
+        notification: Notification,
+        kwargs: NotificationArgs,
+        expire_timeout: int,
+        dismiss_on_timeout: bool
+    ) -> int:
+        notification.set_values(**kwargs)
+        history.add(notification)
+        if (
+            not dnd.value
+            or notification.urgency == NotificationUrgency.CRITICAL
+        ):
+            popups.value[notification.id] = notification
+
+        if expire_timeout > 0:
+            self.expiry_manager.schedule(
+                notification.id,
+                expire_timeout,
+                dismiss_on_timeout
+            )
+            self._reschedule_timer()
+
+        return notification.id
+
+    def close_overflow(self) -> None:
+        overflow = len(notifications.value) - MAX_NOTIFICATIONS
+        if overflow <= 0:
+            return
+        for notification in list(notifications.value.values())[:overflow]:
+            self.expiry_manager.cancel(notification.id)
+            notification.close(NotificationClosedReason.EXPIRED)
+
     def _reschedule_timer(self) -> None:
         if self._expiry_timer_id is not None:
             glib.source_remove(self._expiry_timer_id)
@@ -511,3 +887,6 @@ class NotificationsService(Service):
     def start(self) -> None:
         watcher = NotificationsWatcher()
         watcher.register()
+
+    def on_close(self) -> None:
+        history.close()
@@ -0,0 +1,234 @@
+import concurrent.futures
+import os
+import typing as t
+from config import Settings
+from repository import glib
+from utils.logger import logger
+from utils.ref import Ref
+from utils.service import Service
+import utils.colors as colors
+
+IMAGE_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"
+)
+# Newest images are warmed first, the rest would only push
+# them out of the palette cache
+MAX_IMAGES = colors.MAX_PALETTES // 2
+MAX_WORKERS = 2
+# Don't compete with startup
+START_DELAY_MS = 10000
+NICENESS = 15
+
+# (done, total), total is 0 when nothing is running
+progress = Ref((0, 0), name="palette_warm_progress")
+
+
+def wallpaper_folder() -> str:
+    settings = Settings()
+    folder = settings.get("wallpaper_folder")
+    if folder:
+        return str(os.path.expanduser(folder))
+    return os.path.dirname(settings.get("wallpaper"))
+
+
+def find_images(folder: str, limit: int = MAX_IMAGES) -> list[str]:
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"{folder} is not a folder")
+    images: list[tuple[float, str]] = []
+    for root, _, files in os.walk(folder):
+        for file in files:
+            if not file.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, file)
+            try:
+                images.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue
+    images.sort(reverse=True)
+    return [path for _, path in images[:limit]]
+
+
+def _init_worker() -> None:
+    try:
+        os.nice(NICENESS)
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except (OSError, AttributeError):
+        pass
+
+
+def warm_palette(path: str) -> None:
+    colors.process_image(
+        path, colors.WALLPAPER_QUALITY, colors.WALLPAPER_COLORS
+    )
+
+
+class PaletteWarmer:
+    # Fills the palette cache for every wallpaper in the folder so
+    # switching wallpapers doesn't quantize anything
+    def __init__(self) -> None:
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self._queue: list[str] = []
+        self._in_flight = 0
+        self._done = 0
+        self._failed = 0
+        self._generation = 0
+        self._delay_source: int | None = None
+        self.folder: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def schedule(self, delay_ms: int = START_DELAY_MS) -> None:
+        if self._delay_source is not None:
+            glib.source_remove(self._delay_source)
+        self._delay_source = glib.timeout_add(delay_ms, self._on_delay)
+
+    def _on_delay(self) -> bool:
+        self._delay_source = None
+        if Settings().get("prewarm_palettes"):
+            self.start()
+        return False
+
+    def start(self, folder: str | None = None) -> None:
+        self.stop()
+        folder = os.path.expanduser(folder) if folder else wallpaper_folder()
+        self.folder = folder
+        self._generation += 1
+        workers = min(MAX_WORKERS, max(1, (os.cpu_count() or 2) // 2))
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker
+        )
+        # Folder may be big (like ~/Downloads), scan it in the pool too
+        generation = self._generation
+        future = self._executor.submit(find_images, folder)
+        future.add_done_callback(
+            lambda future: glib.idle_add(
+                self._on_scanned, generation, folder, workers, future
+            )
+        )
+
+    def _on_scanned(
+        self,
+        generation: int,
+        folder: str,
+        workers: int,
+        future: concurrent.futures.Future[list[str]]
+    ) -> bool:
+        if generation != self._generation:
+            return False
+        try:
+            self._queue = future.result()
+        except Exception as e:
+            logger.warning("Couldn't scan wallpaper folder %s: %s", folder, e)
+            self._queue = []
+        if not self._queue:
+            self.stop()
+            return False
+        # Popped from the end, keep the newest first
+        self._queue.reverse()
+        self._done = self._failed = 0
+        progress.value = (0, len(self._queue))
+        if __debug__:
+            logger.debug(
+                "Warming %s palettes from %s", len(self._queue), folder
+            )
+        # Only a few jobs are queued at a time so stop() is quick
+        for _ in range(workers * 2):
+            self._submit_next()
+        return False
+
+    def _submit_next(self) -> None:
+        if not self._queue or self._executor is None:
+            return
+        path = self._queue.pop()
+        generation = self._generation
+        self._in_flight += 1
+        future = self._executor.submit(warm_palette, path)
+        future.add_done_callback(
+            lambda future: glib.idle_add(
+                self._on_done, generation, path, future
+            )
+        )
+
+    def _on_done(
+        self,
+        generation: int,
+        path: str,
+        future: concurrent.futures.Future[None]
+    ) -> bool:
+        if generation != self._generation:
+            return False
+        self._in_flight -= 1
+        self._done += 1
+        if not future.cancelled() and future.exception() is not None:
+            self._failed += 1
+            if __debug__:
+                logger.debug(
+                    "Couldn't warm palette of %s: %s",
+                    path, future.exception()
+                )
+        total = self._done + self._in_flight + len(self._queue)
+        progress.value = (self._done, total)
+        self._submit_next()
+        if self._in_flight == 0:
+            logger.info(
+                "Warmed %s wallpaper palettes (%s failed)",
+                self._done - self._failed, self._failed
+            )
+            self.stop()
+        return False
+
+    def stop(self) -> None:
+        self._generation += 1
+        self._queue.clear()
+        self._in_flight = 0
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        progress.value = (0, 0)
+
+    def format(self) -> str:
+        done, total = progress.value
+        if not total:
+            return f"Scanning {self.folder}" if self.running else (
+                "Not running"
+            )
+        return f"Warming palettes: {done}/{total}"
+
+
+warmer = PaletteWarmer()
+
+
+def on_folder_changed(*args: t.Any) -> None:
+    if Settings().get("prewarm_palettes"):
+        warmer.schedule(0)
+
+
+def on_wallpaper_changed(*args: t.Any) -> None:
+    # Only matters when the folder follows the current wallpaper
+    if (
+        Settings().get("prewarm_palettes")
+        and warmer.folder != wallpaper_folder()
+    ):
+        warmer.schedule()
+
+
+def on_prewarm_changed(value: bool) -> None:
+    if value:
+        warmer.schedule(0)
+    else:
+        warmer.stop()
+
+
+class PalettesService(Service):
+    def start(self) -> None:
+        settings = Settings()
+        settings.watch("wallpaper_folder", on_folder_changed, False)
+        settings.watch("prewarm_palettes", on_prewarm_changed, False)
+        settings.watch("wallpaper", on_wallpaper_changed, False)
+        warmer.schedule()
+
+    def on_close(self) -> None:
+        warmer.stop()
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import signal
 import os
-from repository import gio, glib, gtk, gdk_pixbuf
+from repository import gio, glib, gtk, gdk, gdk_pixbuf
 from config import CONFIG_DIR
 from utils.logger import logger
 from src.services.dbus import dbus_proxy, cache_proxy_properties
@@ -10,6 +10,8 @@ from src.services.dbus import name_owner_changed
 import typing as t
 from utils import Ref
 from utils.service import Signals, Service
+from utils.textures import texture_cache, content_key
+import numpy as np
 
 # it won't reproduce the all possibilities of tray
 # I'll just use it as for running background services
@@ -66,6 +68,40 @@ def get_pid(bus_name: str) -> int:
     return pid
 
 
+def argb_to_rgba(data: bytes | bytearray) -> bytes:
+    # Pixmaps are ARGB32 in network byte order
+    pixels = np.frombuffer(data, dtype=np.uint8).reshape(-1, 4)
+    return pixels[:, (1, 2, 3, 0)].tobytes()
+
+
+def pixmap_to_texture(
+    pixmap_width: int,
+    pixmap_height: int,
+    data: bytes | bytearray,
+    width: int,
+    height: int,
+    resize_method: gdk_pixbuf.InterpType
+) -> gdk.Texture | None:
+    if len(data) != pixmap_width * pixmap_height * 4:
+        return None
+    pixbuf = gdk_pixbuf.Pixbuf.new_from_bytes(
+        glib.Bytes.new(argb_to_rgba(data)),
+        gdk_pixbuf.Colorspace.RGB,
+        True,
+        8,
+        pixmap_width,
+        pixmap_height,
+        pixmap_width * 4,
+    )
+    if not pixbuf:
+        return None
+
+    if width != pixmap_width or height != pixmap_height:
+        pixbuf = pixbuf.scale_simple(width, height, resize_method)
+
+    return gdk.Texture.new_for_pixbuf(pixbuf)
+
+
 class StatusNotifierItem(Signals):
     def __init__(
         self,
@@ -79,7 +115,7 @@ class StatusNotifierItem(Signals):
         self.identifier = self._bus_name + self._bus_path
         self._icon_theme: gtk.IconTheme | None = None
         self._cached_name: str | None = None
-        self._pixbufs: dict[tuple[int, int], gdk_pixbuf.Pixbuf] = {}
+        self._textures: dict[tuple[int, int], gdk.Texture] = {}
 
         self.conns = [
             self._proxy.connect(
@@ -125,7 +161,7 @@ class StatusNotifierItem(Signals):
         ):
             self._cached_name = None
         if "Icon" in changed_properties:
-            self._pixbufs.clear()
+            self._textures.clear()
         self._cache_proxy_properties(list(changed_properties.keys()))
 
         self.notify("changed")
@@ -142,7 +178,7 @@ class StatusNotifierItem(Signals):
         prop = signal_name.lstrip("New")
 
         if prop == "Icon":
-            self._pixbufs.clear()
+            self._textures.clear()
             self._cache_proxy_properties(
                 ["IconName", "IconPixmap"]
             )
@@ -232,14 +268,14 @@ class StatusNotifierItem(Signals):
             )
         return self._icon_theme
 
-    def get_pixbuf(
+    def get_texture(
         self,
         width: int,
         height: int,
         resize_method: gdk_pixbuf.InterpType = gdk_pixbuf.InterpType.NEAREST,
-    ) -> gdk_pixbuf.Pixbuf | None:
-        if (pixbuf := self._pixbufs.get((width, height))):
-            return pixbuf
+    ) -> gdk.Texture | None:
+        if (texture := self._textures.get((width, height))):
+            return texture
 
         pixmaps = self.prop("IconPixmap")
         if not pixmaps:
@@ -249,35 +285,21 @@ class StatusNotifierItem(Signals):
             pixmaps,
             key=lambda x: (x[0] - width) ** 2 + (x[1] - height) ** 2,
         )
-
-        data_bytearray = bytearray(nearest_pixmap[2])
-        for i in range(0, len(data_bytearray), 4):
-            data_bytearray[i:i+4] = (
-                data_bytearray[i+1:i+4] + data_bytearray[i:i+1]
-            )
-
-        pixbuf = gdk_pixbuf.Pixbuf.new_from_bytes(
-            glib.Bytes.new(data_bytearray),
-            gdk_pixbuf.Colorspace.RGB,
-            True,
-            8,
-            nearest_pixmap[0],
-            nearest_pixmap[1],
-            nearest_pixmap[0] * 4,
-        )
-
-        if not pixbuf:
-            return None
-
-        if width != nearest_pixmap[0] or height != nearest_pixmap[1]:
-            pixbuf = pixbuf.scale_simple(
-                width,
-                height,
-                resize_method
+        pixmap_width, pixmap_height, data = nearest_pixmap
+
+        # Animated icons cycle through the same frames
+        key = content_key(data, pixmap_width, width, height)
+        if (texture := texture_cache.get(key)) is None:
+            texture = pixmap_to_texture(
+                pixmap_width, pixmap_height, data,
+                width, height, resize_method
             )
+            if texture is None:
+                return None
+            texture_cache.put(key, texture)
 
-        self._pixbufs[(width, height)] = pixbuf
-        return pixbuf
+        self._textures[(width, height)] = texture
+        return texture
 
     def quit(self) -> None:
         name_owner = self._proxy.get_name_owner()
@@ -1,11 +1,12 @@
-import functools
 import os
 import json
+import multiprocessing
 import subprocess
-import threading
+import time
 from PIL import Image
 import concurrent
 import concurrent.futures
+import concurrent.futures.process
 from materialyoucolor.quantize import QuantizeCelebi  # type: ignore
 from materialyoucolor.score.score import Score  # type: ignore
 from materialyoucolor.hct import Hct  # type: ignore
@@ -14,17 +15,18 @@ from materialyoucolor.dynamiccolor.material_dynamic_colors import MaterialDynami
 from materialyoucolor.scheme.dynamic_scheme import DynamicScheme  # type: ignore # noqa
 from materialyoucolor.scheme.scheme_tonal_spot import SchemeTonalSpot  # type: ignore # noqa
 import hashlib
-import pickle
 import numpy as np
 import re
 import typing as t
 from config import color_templates, CONFIG_DIR, CONFIG_PATH
 from utils.logger import logger
-from utils.styles import reload_css
+from utils.styles import reload_css, compile_cached
+from utils.system import write_if_changed
 from utils.ref import Ref
 from repository import gio, glib
 from config import Settings
 import shutil
+import sqlite3
 from pathlib import Path
 
 
@@ -47,8 +49,31 @@ gtk4_css = join(CACHE_PATH, "compiled", "gtk-4.0.css")
 
 colors_json = join(CACHE_PATH, "colors.json")
 
+PALETTES_DB = join(CACHE_PATH, "palettes.db")
+MAX_PALETTES = 1000
+# process_image() arguments used for wallpapers
+WALLPAPER_QUALITY = 4
+WALLPAPER_COLORS = 1024
+# Longest side wallpapers are decoded at before quantizing
+PALETTE_MAX_SIDE = 512
+HASH_CHUNK_SIZE = 1024 * 1024
+
+PALETTES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS palettes (
+    path TEXT NOT NULL,
+    options TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    hash TEXT,
+    color INTEGER NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (path, options)
+);
+CREATE INDEX IF NOT EXISTS palettes_hash ON palettes(hash, options);
+CREATE INDEX IF NOT EXISTS palettes_used ON palettes(used);
+"""
+
 dark_mode = Ref(True, name="dark_mode")
-task_lock = threading.Lock()
 
 
 type IntFloat = int | float
@@ -64,6 +89,12 @@ def rgba_to_rgb(rgba: RGBA) -> str:
     return f'{rgba[0]}, {rgba[1]}, {rgba[2]}'
 
 
+def hex_to_rgba(hex_color: str) -> RGBA:
+    hex_color = hex_color.lstrip('#')
+    r, g, b = (int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    return (r, g, b, 255)
+
+
 def get_color(color_name: str) -> DynamicColor | None:
     color = getattr(MaterialDynamicColors, color_name, None)
     if isinstance(color, DynamicColor):
@@ -170,44 +201,149 @@ additional = {
 }
 
 
+def scheme_colors(scheme: DynamicScheme) -> dict[str, str]:
+    colors: dict[str, str] = {}
+    for color_name in vars(MaterialDynamicColors).keys():
+        color = get_color(color_name)
+        if color is not None:
+            colors[color_name] = rgb_to_hex(color.get_hct(scheme).to_rgba())
+    return colors
+
+
+def build_color_map(
+    colors: dict[str, str],
+    dark_colors: dict[str, str],
+    light_colors: dict[str, str]
+) -> dict[str, str]:
+    color_map: dict[str, str] = {}
+    for color_name, value in colors.items():
+        color_map[color_name] = value
+        color_map[f"{color_name}Dark"] = dark_colors[color_name]
+        color_map[f"{color_name}Light"] = light_colors[color_name]
+    return color_map
+
+
 def generate_color_map(
     scheme: DynamicScheme,
     dark_scheme: DynamicScheme,
     light_scheme: DynamicScheme
 ) -> dict[str, str]:
-    _schemes = (
-        (scheme, ""),
-        (dark_scheme, "Dark"),
-        (light_scheme, "Light")
-    )
-    color_map: dict[str, str] = {}
-    for _color_name in vars(MaterialDynamicColors).keys():
-        for _scheme, suffix in _schemes:
-            color = get_color(_color_name)
-            color_name = f"{_color_name}{suffix}"
-            if color is not None:
-                rgba = color.get_hct(_scheme).to_rgba()
-                color_map[color_name] = rgb_to_hex(rgba)
-    return color_map
+    dark_colors = scheme_colors(dark_scheme)
+    light_colors = scheme_colors(light_scheme)
+    if scheme is dark_scheme:
+        colors = dark_colors
+    elif scheme is light_scheme:
+        colors = light_colors
+    else:
+        colors = scheme_colors(scheme)
+    return build_color_map(colors, dark_colors, light_colors)
+
+
+TAG_PATTERN = re.compile(r'<(?:(\w+):)?(\w+)(?:\.(.+))?>')
+ESCAPED_TAG_PATTERN = re.compile(r'<\\\\([^>]+)>')
+TRANSFORM_PATTERN = re.compile(r'(\w+)(?:\((\d*)\))?')
+DIGITS_PATTERN = re.compile(r'\d+')
+
+
+class Tag(t.NamedTuple):
+    # type is "" for colors, "var" or "post"
+    type: str
+    key: str
+    transformations: tuple[str, ...]
+    action: str
+    source: str
+
+
+type Token = str | Tag
+
+
+def parse_transformations(transformations_str: str) -> tuple[str, ...]:
+    result = []
+    for command, arg in TRANSFORM_PATTERN.findall(transformations_str):
+        if command:
+            if arg:
+                result.append(f"{command}({arg})")
+            else:
+                result.append(command)
+    return tuple(result)
+
+
+def compile_template(text: str) -> list[Token]:
+    tokens: list[Token] = []
+    literal: list[str] = []
+    last_end = 0
+    for match in TAG_PATTERN.finditer(text):
+        tag_type, key, transformations_str = match.groups()
+        tag_type = tag_type or ""
+        literal.append(text[last_end:match.start()])
+        last_end = match.end()
+        if tag_type not in ("", "var", "post"):
+            literal.append(match.group())
+            continue
+        if literal:
+            tokens.append("".join(literal))
+            literal = []
+        tokens.append(Tag(
+            tag_type,
+            key,
+            parse_transformations(transformations_str or "")
+            if not tag_type else (),
+            f"{key}.{transformations_str or ''}",
+            match.group()
+        ))
+    literal.append(text[last_end:])
+    tokens.append("".join(literal))
+    # Escapes can't contain tags, so they never span tokens
+    return [
+        ESCAPED_TAG_PATTERN.sub(r'<\1>', token)
+        if isinstance(token, str) else token
+        for token in tokens
+    ]
+
+
+class TemplateCache:
+    # Compiled templates, kept until the file changes. Lives as long as
+    # the theming worker does.
+    __slots__ = ("_templates",)
+
+    def __init__(self) -> None:
+        self._templates: dict[str, tuple[int, int, list[Token]]] = {}
+
+    def get(self, path: str) -> list[Token]:
+        stat = os.stat(path)
+        cached = self._templates.get(path)
+        if cached is not None and cached[:2] == (
+            stat.st_mtime_ns, stat.st_size
+        ):
+            return cached[2]
+        with open(path) as f:
+            tokens = compile_template(f.read())
+        self._templates[path] = (stat.st_mtime_ns, stat.st_size, tokens)
+        return tokens
+
+    def clear(self) -> None:
+        self._templates.clear()
+
+
+template_cache = TemplateCache()
 
 
 class TemplateFormatter:
     def __init__(
         self,
-        scheme: DynamicScheme,
-        dark_scheme: DynamicScheme,
-        light_scheme: DynamicScheme,
+        color_map: dict[str, str],
         vars: dict[str, str],
         allowed_actions: tuple[str] | tuple[()] = ()
     ) -> None:
-        self.color_map = generate_color_map(scheme, dark_scheme, light_scheme)
+        self.color_map = color_map
         self.vars = vars
         self.post_actions = allowed_actions
+        self._values: dict[tuple[str, tuple[str, ...]], str] = {}
 
     def apply_transformations(
         self,
         value: str,
-        transformations: list[str]
+        transformations: tuple[str, ...]
     ) -> str:
         intermediate_transforms = [
             t for t in transformations
@@ -220,13 +356,13 @@ class TemplateFormatter:
 
         for transform in intermediate_transforms:
             if transform.startswith("lighten"):
-                matched = re.search(r'\d+', transform)
+                matched = DIGITS_PATTERN.search(transform)
                 if not matched:
                     continue
                 percent = int(matched.group())
                 value = self.adjust_brightness(value, percent)
             elif transform.startswith("darken"):
-                matched = re.search(r'\d+', transform)
+                matched = DIGITS_PATTERN.search(transform)
                 if not matched:
                     continue
                 percent = int(matched.group())
@@ -265,62 +401,36 @@ class TemplateFormatter:
         r, g, b = (int(hex_color[i:i+2], 16) for i in (0, 2, 4))
         return f'{r},{g},{b}'
 
-    def parse_transformations(
-        self,
-        transformations_str: str
-    ) -> list[str]:
-        transformations = re.findall(
-            r'(\w+)(?:\((\d*)\))?', transformations_str
-        )
-        result = []
-        for command, arg in transformations:
-            if command:
-                if arg:
-                    result.append(f"{command}({arg})")
-                else:
-                    result.append(command)
-        return result
-
-    def format(self, text: str) -> tuple[str, list[str]]:
-        pattern = r'(<(?:(\w+):)?(\w+)(?:\.(.+))?>)'
-        matches = re.findall(pattern, text)
-        result = []
-        actions = []
-        last_end = 0
-
-        for match in matches:
-            full_match, tag_type, key, transformations_str = match
-            start_index = text.find(full_match, last_end)
-            if start_index == -1:
-                continue
-
-            result.append(text[last_end:start_index])
-            value = None
-
-            if tag_type == 'var' and key in self.vars:
-                value = self.vars[key]
-            elif tag_type == 'post' and key in self.post_actions:
-                value = f"Post action: {key}"
-                actions.append(f"{key}.{transformations_str}")
-            elif not tag_type and key in self.color_map:
-                value = self.color_map[key]
-
-            if value is not None:
-                if transformations_str and not tag_type:
-                    transformations = self.parse_transformations(
-                        transformations_str
-                    )
-                    value = self.apply_transformations(value, transformations)
-                result.append(value)
-                last_end = start_index + len(full_match)
-
-        result.append(text[last_end:])
-
-        str_result = ''.join(result)
+    def color(self, key: str, transformations: tuple[str, ...]) -> str:
+        # Templates repeat the same colors a lot
+        cache_key = (key, transformations)
+        value = self._values.get(cache_key)
+        if value is None:
+            value = self.apply_transformations(
+                self.color_map[key], transformations
+            )
+            self._values[cache_key] = value
+        return value
 
-        str_result = re.sub(r'<\\\\([^>]+)>', r'<\1>', str_result)
+    def render(self, tokens: list[Token]) -> tuple[str, list[str]]:
+        result: list[str] = []
+        actions: list[str] = []
+        for token in tokens:
+            if isinstance(token, str):
+                result.append(token)
+            elif token.type == "var" and token.key in self.vars:
+                result.append(self.vars[token.key])
+            elif token.type == "post" and token.key in self.post_actions:
+                result.append(f"Post action: {token.key}")
+                actions.append(token.action)
+            elif not token.type and token.key in self.color_map:
+                result.append(self.color(token.key, token.transformations))
+            else:
+                result.append(token.source)
+        return "".join(result), actions
 
-        return str_result, actions
+    def format(self, text: str) -> tuple[str, list[str]]:
+        return self.render(compile_template(text))
 
 
 def generate_templates(
@@ -331,10 +441,13 @@ def generate_templates(
     light_scheme: DynamicScheme,
     is_dark: bool,
     wallpaper: str | None = None,
-    allowed_actions: tuple[str] | tuple[()] = ()
+    allowed_actions: tuple[str] | tuple[()] = (),
+    color_map: dict[str, str] | None = None
 ) -> dict[str, list[str]]:
     actions: dict[str, list[str]] = {}
     color_scheme = "dark" if is_dark else "light"
+    if color_map is None:
+        color_map = generate_color_map(scheme, dark_scheme, light_scheme)
 
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
@@ -343,105 +456,190 @@ def generate_templates(
         os.makedirs(folder)
 
     file_list = get_file_list(folder)
+    formatter = TemplateFormatter(
+        color_map,
+        {
+            "colorScheme": color_scheme,
+            "outputFolder": output_folder,
+            "wallpaper": wallpaper or ""
+        },
+        allowed_actions
+    )
+    written = 0
 
     for file_path in file_list:
-        with open(file_path) as f:
-            template = f.read()
-        formatter = TemplateFormatter(
-            scheme,
-            dark_scheme,
-            light_scheme,
-            {
-                "colorScheme": color_scheme,
-                "outputFolder": output_folder,
-                "wallpaper": wallpaper or ""
-            },
-            allowed_actions
-        )
-        template, _actions = formatter.format(template)
+        template, _actions = formatter.render(template_cache.get(file_path))
         new_path = join(output_folder, os.path.basename(file_path))
-        with open(new_path, 'w') as f:
-            f.write(template)
+        written += write_if_changed(new_path, template)
         if _actions:
             actions[new_path] = _actions
 
-    _schemes = (
-        (scheme, ""),
-        (dark_scheme, "Dark"),
-        (light_scheme, "Light")
-    )
-    for file in ready_templates:
-        _template = ""
-        for _color_name in vars(MaterialDynamicColors).keys():
-            for _scheme, suffix in _schemes:
-                color = get_color(_color_name)
-                color_name = f"{_color_name}{suffix}"
-                if color is None:
-                    continue
-
-                rgba = color.get_hct(_scheme).to_rgba()
-                hex_color = rgb_to_hex(rgba)
-                rgb_color = rgba_to_rgb(rgba)
-                new_line = ready_templates[file].format(
-                    name=color_name,
+    for file, line in ready_templates.items():
+        lines: list[str] = []
+        for color_name, hex_color in color_map.items():
+            rgb_color = rgba_to_rgb(hex_to_rgba(hex_color))
+            lines.append(
+                line.format(name=color_name, hex=hex_color, rgb=rgb_color)
+            )
+            if color_name in additional:
+                lines.append(line.format(
+                    name=additional[color_name],
                     hex=hex_color,
                     rgb=rgb_color
-                )
-                _template += new_line
-                if color_name in additional:
-                    new_line = ready_templates[file].format(
-                        name=additional[color_name],
-                        hex=hex_color,
-                        rgb=rgb_color
-                    )
-                    _template += new_line
-
-            new_path = join(output_folder, os.path.basename(file))
-            with open(new_path, 'w') as f:
-                f.write(_template)
+                ))
+        new_path = join(output_folder, os.path.basename(file))
+        written += write_if_changed(new_path, "".join(lines))
 
+    if __debug__:
+        logger.debug(
+            "Templates rendered, %s of %s files changed",
+            written, len(file_list) + len(ready_templates)
+        )
     return actions
 
 
-def process_image(
-    image_path: str,
-    quality: int = 2,
-    num_colors: int = 128
-) -> int:
-    def get_cache_path(image_path: str) -> str:
-        cache_path = join(CACHE_PATH, "cached_colors")
-        hash_object = hashlib.md5(image_path.encode())
-        cache_filename = hash_object.hexdigest() + '.pkl'
-        os.makedirs(cache_path, exist_ok=True)
-        return join(cache_path, cache_filename)
-
-    def load_from_cache(cache_path: str) -> t.Any:
-        if os.path.exists(cache_path):
-            with open(cache_path, 'rb') as f:
-                return pickle.load(f)
-        return None
+def file_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PaletteCache:
+    # Source colors of wallpapers, keyed by path, size and mtime so
+    # edited files aren't served stale. Renamed or copied files are
+    # found by content hash. Shared by the UI and worker processes.
+    def __init__(self, path: str = PALETTES_DB) -> None:
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+        self._pid = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # Connections can't be shared with forked workers
+        if self._db is None or self._pid != os.getpid():
+            self._db = self._open()
+            self._pid = os.getpid()
+        return self._db
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(PALETTES_SCHEMA)
+        db.commit()
+        # Replaced by this database, it was keyed by path only
+        shutil.rmtree(join(CACHE_PATH, "cached_colors"), ignore_errors=True)
+        return db
+
+    def get(
+        self,
+        image_path: str,
+        options: str,
+        use_hash: bool = True
+    ) -> tuple[int | None, str | None]:
+        # Returns the color and the content hash if it was computed
+        stat = os.stat(image_path)
+        row = self.db.execute(
+            "SELECT size, mtime, color FROM palettes " +
+            "WHERE path = ? AND options = ?",
+            (image_path, options)
+        ).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return int(row[2]), None
+        if not use_hash:
+            return None, None
+
+        content_hash = file_hash(image_path)
+        row = self.db.execute(
+            "SELECT color FROM palettes WHERE hash = ? AND options = ?",
+            (content_hash, options)
+        ).fetchone()
+        if row is not None:
+            self.set(image_path, options, int(row[0]), content_hash)
+            return int(row[0]), content_hash
+        return None, content_hash
+
+    def set(
+        self,
+        image_path: str,
+        options: str,
+        color: int,
+        content_hash: str | None = None
+    ) -> None:
+        stat = os.stat(image_path)
+        try:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO palettes " +
+                    "(path, options, size, mtime, hash, color, used) " +
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        image_path, options, stat.st_size,
+                        stat.st_mtime_ns, content_hash, color, time.time()
+                    )
+                )
+                self.db.execute(
+                    "DELETE FROM palettes WHERE rowid IN (" +
+                    "SELECT rowid FROM palettes ORDER BY used DESC " +
+                    "LIMIT -1 OFFSET ?)",
+                    (MAX_PALETTES,)
+                )
+        except sqlite3.Error as e:
+            logger.error("Couldn't save palette", exc_info=e)
 
-    def save_to_cache(cache_path: str, data: t.Any) -> None:
-        with open(cache_path, 'wb') as f:
-            pickle.dump(data, f)
+    def clear(self) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM palettes")
 
-    cache_path = get_cache_path(image_path)
 
-    cached_result = load_from_cache(cache_path)
-    if cached_result is not None:
-        return int(cached_result)
+palette_cache = PaletteCache()
 
-    image = Image.open(image_path).convert('RGB')
 
-    image_data = np.array(image)
-    pixel_array = image_data[::quality, ::quality].reshape(-1, 3)
+def load_pixels(
+    image_path: str,
+    quality: int,
+    max_side: int = PALETTE_MAX_SIDE
+) -> np.ndarray:
+    with Image.open(image_path) as image:
+        width, height = image.size
+        scale = max(quality, -(-max(width, height) // max_side))
+        size = (max(1, width // scale), max(1, height // scale))
+        # JPEGs are decoded at 1/2-1/8 scale right away, other formats
+        # are shrunk with a box filter before quantizing
+        image.draft("RGB", size)
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            # reduce() can't handle palette, CMYK or 16-bit images
+            image = image.convert("RGB")
+        factor = max(
+            -(-image.width // size[0]), -(-image.height // size[1])
+        )
+        if factor > 1:
+            image = image.reduce(factor)
+        image = image.convert("RGB")
+    return np.asarray(image).reshape(-1, 3)
 
-    result = QuantizeCelebi(pixel_array, num_colors)
 
-    color = int(Score.score(result)[0])
+def process_image(
+    image_path: str,
+    quality: int = 2,
+    num_colors: int = 128
+) -> int:
+    options = f"{quality}:{num_colors}:{PALETTE_MAX_SIDE}"
+    try:
+        color, content_hash = palette_cache.get(image_path, options)
+    except sqlite3.Error as e:
+        logger.error("Couldn't read palette cache", exc_info=e)
+        color, content_hash = None, None
+    if color is not None:
+        return color
 
-    save_to_cache(cache_path, color)
+    result = QuantizeCelebi(load_pixels(image_path, quality), num_colors)
+    color = int(Score.score(result)[0])
 
+    palette_cache.set(image_path, options, color, content_hash)
     return color
 
 
@@ -463,7 +661,8 @@ def generate_colors_sync(
     image_path: str,
     use_color: t.Literal[None] = None,
     is_dark: bool = True,
-    contrast_level: int = 0
+    contrast_level: int = 0,
+    checkpoint: t.Callable[[str], None] | None = None
 ) -> None:
     ...
 
@@ -473,7 +672,8 @@ def generate_colors_sync(
     image_path: t.Literal[None],
     use_color: int,
     is_dark: bool = True,
-    contrast_level: int = 0
+    contrast_level: int = 0,
+    checkpoint: t.Callable[[str], None] | None = None
 ) -> None:
     ...
 
@@ -482,14 +682,24 @@ def generate_colors_sync(
     image_path: str | None = None,
     use_color: int | None = None,
     is_dark: bool = True,
-    contrast_level: int = 0
+    contrast_level: int = 0,
+    checkpoint: t.Callable[[str], None] | None = None
 ) -> None:
+    # checkpoint is called after every stage, it raises JobSuperseded
+    # when a newer job is waiting
+    def stage_done(name: str) -> None:
+        if checkpoint is not None:
+            checkpoint(name)
+
     if use_color is None and image_path is not None:
-        color = process_image(image_path, 4, 1024)
+        color = process_image(
+            image_path, WALLPAPER_QUALITY, WALLPAPER_COLORS
+        )
     elif use_color is not None and image_path is None:
         color = use_color
     else:
         raise TypeError("Either image_path or use_color should be not None.")
+    stage_done("palette")
 
     dark_scheme = SchemeTonalSpot(
         Hct.from_int(color),
@@ -502,13 +712,18 @@ def generate_colors_sync(
         contrast_level
     )
     scheme = dark_scheme if is_dark else light_scheme
-
-    with open(colors_json, 'w') as f:
-        object = ColorsCache(
-            scheme, image_path, use_color, contrast_level, is_dark,
-            dark_scheme, light_scheme
-        )
-        json.dump(colors_dict(object), f, indent=2)
+    # Every color of both schemes, shared by colors.json and templates
+    dark_colors = scheme_colors(dark_scheme)
+    light_colors = scheme_colors(light_scheme)
+    colors = dark_colors if is_dark else light_colors
+    color_map = build_color_map(colors, dark_colors, light_colors)
+    stage_done("schemes")
+
+    object = ColorsCache(
+        dict(colors), image_path, use_color, contrast_level, is_dark,
+        dark_colors, light_colors
+    )
+    write_if_changed(colors_json, json.dumps(colors_dict(object), indent=2))
 
     allowed_actions = ("compile_scss",)
     post = generate_templates(
@@ -519,8 +734,10 @@ def generate_colors_sync(
         light_scheme,
         is_dark,
         image_path,
-        allowed_actions
+        allowed_actions,
+        color_map
     )
+    stage_done("templates")
 
     for file_path, actions in post.items():
         for action in actions:
@@ -537,18 +754,16 @@ def generate_colors_sync(
                     file_name
                 )
                 compile_scss(file_path, output)
+    stage_done("post_actions")
 
 
 def compile_scss(path: str, output: str) -> None:
-    if __debug__:
-        logger.debug("Compiling scss")
-    command = [
-        'sass',
-        path,
-        output
-    ]
-
-    subprocess.Popen(command)
+    # Runs in the theming worker, so waiting for sass is fine and
+    # the output exists before update_gtk() copies it
+    try:
+        compile_cached(path, output)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error("Couldn't compile %s: %s", path, e)
 
 
 def update_gtk(
@@ -581,6 +796,182 @@ def default_on_complete() -> None:
     update_gtk4()
 
 
+class JobSuperseded(Exception):
+    ...
+
+
+# Set in the worker process, generation of the newest submitted job
+_worker_generation: t.Any = None
+
+
+def _init_worker(generation: t.Any) -> None:
+    global _worker_generation
+    _worker_generation = generation
+
+
+class StageTimer:
+    __slots__ = ("generation", "stages", "_last")
+
+    def __init__(self, generation: int) -> None:
+        self.generation = generation
+        self.stages: dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def __call__(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = now - self._last
+        self._last = now
+        if (
+            _worker_generation is not None
+            and _worker_generation.value != self.generation
+        ):
+            raise JobSuperseded(stage)
+
+
+def run_job(
+    generation: int,
+    image_path: str | None,
+    use_color: int | None,
+    is_dark: bool,
+    contrast_level: int
+) -> dict[str, float]:
+    timer = StageTimer(generation)
+    generate_colors_sync(  # type: ignore[call-overload]
+        image_path=image_path,
+        use_color=use_color,
+        is_dark=is_dark,
+        contrast_level=contrast_level,
+        checkpoint=timer
+    )
+    return timer.stages
+
+
+class ThemingJob:
+    __slots__ = (
+        "image_path", "use_color", "is_dark", "contrast_level",
+        "callbacks", "generation", "submitted"
+    )
+
+    def __init__(
+        self,
+        image_path: str | None,
+        use_color: int | None,
+        is_dark: bool,
+        contrast_level: int,
+        on_complete: t.Callable[[], None] | None
+    ) -> None:
+        self.image_path = image_path
+        self.use_color = use_color
+        self.is_dark = is_dark
+        self.contrast_level = contrast_level
+        self.callbacks = [on_complete] if on_complete else []
+        self.generation = 0
+        self.submitted = time.perf_counter()
+
+
+class ThemingWorker:
+    # One long-lived worker process. Only the newest job matters: it
+    # replaces the queued one and the running one stops at its next
+    # stage. Completion is delivered on the main loop.
+    def __init__(self) -> None:
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+        # Shared with every worker, so jobs keep their generation when
+        # a dead worker is replaced
+        self._generation = multiprocessing.Value("q", 0)
+        self._running: ThemingJob | None = None
+        self._pending: ThemingJob | None = None
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=1,
+                initializer=_init_worker,
+                initargs=(self._generation,)
+            )
+        return self._executor
+
+    def submit(self, job: ThemingJob) -> None:
+        with self._generation.get_lock():
+            self._generation.value += 1
+            job.generation = self._generation.value
+        if self._pending is not None:
+            if __debug__:
+                logger.debug("Theming job superseded before it started")
+            job.callbacks[:0] = self._pending.callbacks
+        self._pending = job
+        if self._running is None:
+            self._start_next()
+
+    def _start_next(self) -> None:
+        job = self._pending
+        self._pending = None
+        if job is None:
+            return
+        self._running = job
+        try:
+            future = self._get_executor().submit(
+                run_job, job.generation, job.image_path,
+                job.use_color, job.is_dark, job.contrast_level
+            )
+        except concurrent.futures.process.BrokenProcessPool:
+            # Worker died, e.g. killed by OOM; start a new one
+            self._executor = None
+            future = self._get_executor().submit(
+                run_job, job.generation, job.image_path,
+                job.use_color, job.is_dark, job.contrast_level
+            )
+        future.add_done_callback(
+            lambda future: glib.idle_add(self._finish, job, future)
+        )
+
+    def _finish(
+        self,
+        job: ThemingJob,
+        future: concurrent.futures.Future[dict[str, float]]
+    ) -> bool:
+        self._running = None
+        try:
+            stages = future.result()
+            logger.info(
+                "Colors generated in %.0fms (%s)",
+                (time.perf_counter() - job.submitted) * 1000,
+                ", ".join(
+                    f"{stage}: {elapsed * 1000:.0f}ms"
+                    for stage, elapsed in stages.items()
+                )
+            )
+        except JobSuperseded as e:
+            if __debug__:
+                logger.debug("Theming job superseded after %s", e)
+        except concurrent.futures.process.BrokenProcessPool as e:
+            self._executor = None
+            logger.error("Theming worker died: %s", e, exc_info=e)
+        except Exception as e:
+            logger.error("Couldn't generate colors: %s", e, exc_info=e)
+
+        if self._pending is not None:
+            # Newer result replaces this one anyway
+            self._pending.callbacks[:0] = job.callbacks
+            self._start_next()
+            return False
+
+        default_on_complete()
+        for callback in job.callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error("Error in on_complete: %s", e, exc_info=e)
+        return False
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+worker = ThemingWorker()
+
+
 def generate_colors(
     image_path: str | None = None,
     use_color: int | None = None,
@@ -588,37 +979,9 @@ def generate_colors(
     contrast_level: int = 0,
     on_complete: t.Callable[[], None] | None = None
 ) -> None:
-    def _callback(future: concurrent.futures.Future[None]) -> None:
-        try:
-            future.result()
-        except Exception as e:
-            logger.error("Couldn't generate colors: %s", e, exc_info=e)
-
-        glib.idle_add(default_on_complete)
-        if on_complete:
-            on_complete()
-
-    if task_lock.acquire(blocking=False):
-        try:
-            with concurrent.futures.ProcessPoolExecutor(max_workers=1) as (
-                executor
-            ):
-                future = executor.submit(
-                    functools.partial(
-                        generate_colors_sync,
-                        image_path=image_path,
-                        use_color=use_color,
-                        is_dark=is_dark,
-                        contrast_level=contrast_level
-                    )
-                )
-                future.add_done_callback(_callback)
-        finally:
-            task_lock.release()
-    else:
-        logger.warning(
-            "Another task is already running, skipping the new task."
-        )
+    worker.submit(ThemingJob(
+        image_path, use_color, is_dark, contrast_level, on_complete
+    ))
 
 
 def generate_by_wallpaper(
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+import typing as t
+from collections import deque
+from repository import glib
+
+# Opt-in instrumentation for Signals/Ref, disabled by default.
+# Hot paths only check `active` when it's off.
+
+MAX_TRACE_EVENTS = 100_000
+STALL_INTERVAL_MS = 50
+STALL_THRESHOLD = 0.05
+
+active = False
+
+
+class HandlerStats:
+    __slots__ = ("calls", "total_time", "max_time")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class Profiler:
+    __slots__ = (
+        "notify_counts", "handlers", "queue_depths",
+        "stalls", "trace", "started_at",
+        "_stall_source", "_last_tick", "_lock"
+    )
+
+    def __init__(self) -> None:
+        self.notify_counts: dict[str, int] = {}
+        self.handlers: dict[str, HandlerStats] = {}
+        self.queue_depths: deque[int] = deque(maxlen=1024)
+        self.stalls: deque[float] = deque(maxlen=1024)
+        self.trace: deque[dict[str, t.Any]] = deque(maxlen=MAX_TRACE_EVENTS)
+        self.started_at = 0.0
+        self._stall_source: int | None = None
+        self._last_tick = 0.0
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.notify_counts.clear()
+            self.handlers.clear()
+            self.queue_depths.clear()
+            self.stalls.clear()
+            self.trace.clear()
+            self.started_at = time.perf_counter()
+
+    def start(self) -> None:
+        global active
+        if active:
+            return
+        self.reset()
+        active = True
+        self._last_tick = time.perf_counter()
+        self._stall_source = glib.timeout_add(
+            STALL_INTERVAL_MS, self._on_tick
+        )
+
+    def stop(self) -> None:
+        global active
+        active = False
+        if self._stall_source is not None:
+            glib.source_remove(self._stall_source)
+            self._stall_source = None
+
+    def _on_tick(self) -> bool:
+        now = time.perf_counter()
+        stall = now - self._last_tick - STALL_INTERVAL_MS / 1000
+        self._last_tick = now
+        if stall > STALL_THRESHOLD:
+            self.stalls.append(stall)
+            self._add_trace("main loop stall", "stall", now - stall, stall)
+        return True
+
+    def _add_trace(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        duration: float
+    ) -> None:
+        self.trace.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.started_at) * 1_000_000, 3),
+            "dur": round(duration * 1_000_000, 3),
+            "pid": os.getpid(),
+            "tid": threading.get_ident()
+        })
+
+    def record_notify(self, name: str) -> None:
+        with self._lock:
+            self.notify_counts[name] = self.notify_counts.get(name, 0) + 1
+
+    def record_handler(self, name: str, start: float) -> None:
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            stats = self.handlers.get(name)
+            if stats is None:
+                stats = self.handlers[name] = HandlerStats()
+            stats.calls += 1
+            stats.total_time += elapsed
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+            self._add_trace(name, "handler", start, elapsed)
+
+    def record_queue_depth(self, depth: int) -> None:
+        self.queue_depths.append(depth)
+
+    def report(self, limit: int = 25) -> str:
+        with self._lock:
+            lines: list[str] = []
+            elapsed = time.perf_counter() - self.started_at
+            lines.append(
+                f"Profiling {'on' if active else 'off'}, " +
+                f"{elapsed:.1f}s recorded"
+            )
+
+            lines.append("\nNotifications:")
+            notify_counts = sorted(
+                self.notify_counts.items(),
+                key=lambda item: item[1],
+                reverse=True
+            )
+            for name, count in notify_counts[:limit]:
+                lines.append(f"  {count:>8} {name}")
+
+            lines.append("\nHandlers (total ms, calls, max ms):")
+            handlers = sorted(
+                self.handlers.items(),
+                key=lambda item: item[1].total_time,
+                reverse=True
+            )
+            for name, stats in handlers[:limit]:
+                lines.append(
+                    f"  {stats.total_time * 1000:>10.2f} " +
+                    f"{stats.calls:>8} {stats.max_time * 1000:>8.2f} {name}"
+                )
+
+            depths = list(self.queue_depths)
+            lines.append("\nIdle queue depth:")
+            if depths:
+                lines.append(
+                    f"  drains: {len(depths)}, " +
+                    f"avg: {sum(depths) / len(depths):.1f}, " +
+                    f"max: {max(depths)}"
+                )
+
+            stalls = list(self.stalls)
+            lines.append("\nMain loop stalls:")
+            if stalls:
+                lines.append(
+                    f"  count: {len(stalls)}, " +
+                    f"max: {max(stalls) * 1000:.1f}ms, " +
+                    f"total: {sum(stalls) * 1000:.1f}ms"
+                )
+            return "\n".join(lines)
+
+    def dump_trace(self, path: str) -> str:
+        with self._lock:
+            events = list(self.trace)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events}, f)
+        return path
+
+
+profiler = Profiler()
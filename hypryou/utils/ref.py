@@ -1,11 +1,19 @@
 import asyncio
+import contextlib
 import typing as t
+from enum import Enum
 from collections.abc import MutableSequence, MutableSet
 from utils.logger import logger
-from utils.service import Signals
+from utils.service import Signals, Coalesce
+import weakref
 
 __all__ = [
-    "Ref"
+    "Ref",
+    "RefDiff",
+    "Patch",
+    "PatchOp",
+    "Computed",
+    "computed"
 ]
 
 T = t.TypeVar("T")
@@ -54,15 +62,14 @@ class ReactiveList(MutableSequence[L], t.Generic[L]):
                 value = t.cast(L, value)
             self._check_type(value)
             self._data[index] = value
+            self._ref._mutated(self, changed=(index % len(self._data),))
         else:
             if t.TYPE_CHECKING:
                 value = t.cast(t.Iterable[L], value)
             for v in value:
                 self._check_type(v)
             self._data[index] = value
-
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+            self._ref._mutated(self, reset=True)
 
     def _check_type(self, value: L) -> None:
         if self._ref.types and not isinstance(value, self._ref.types):
@@ -80,34 +87,38 @@ class ReactiveList(MutableSequence[L], t.Generic[L]):
         ...
 
     def __delitem__(self, index: int | slice) -> None:
-        del self._data[index]
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        if isinstance(index, int):
+            del self._data[index]
+            if index < 0:
+                index += len(self._data) + 1
+            self._ref._mutated(self, removed=(index,))
+        else:
+            del self._data[index]
+            self._ref._mutated(self, reset=True)
 
     def clear(self) -> None:
+        removed = range(len(self._data))
         self._data.clear()
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        self._ref._mutated(self, removed=removed)
 
     def pop(self, index: int = -1) -> L:
         value = self._data.pop(index)
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        if index < 0:
+            index += len(self._data) + 1
+        self._ref._mutated(self, removed=(index,))
         return value
 
     def insert(self, i: int, value: L) -> None:
         self._check_type(value)
+        size = len(self._data)
+        i = max(0, size + i) if i < 0 else min(i, size)
         self._data.insert(i, value)
-
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        self._ref._mutated(self, added=(i,))
 
     def append(self, value: L) -> None:
         self._check_type(value)
         self._data.append(value)
-
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        self._ref._mutated(self, added=(len(self._data) - 1,))
 
     def __contains__(self, value: object) -> bool:
         return value in self._data
@@ -144,24 +155,18 @@ class ReactiveSet(MutableSet[L], t.Generic[L]):
         if value not in self._data:
             self._check_type(value)
             self._data.add(value)
-
-            if self._ref.is_ready:
-                self._ref._trigger_watchers()
+            self._ref._mutated(self, added=(value,))
 
     def discard(self, value: L) -> None:
         if value in self._data:
             self._data.discard(value)
-
-            if self._ref.is_ready:
-                self._ref._trigger_watchers()
+            self._ref._mutated(self, removed=(value,))
 
     def remove(self, value: L) -> None:
         if value not in self._data:
             raise KeyError(value)
         self._data.remove(value)
-
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        self._ref._mutated(self, removed=(value,))
 
     def __repr__(self) -> str:
         return repr(self._data)
@@ -178,20 +183,23 @@ class ReactiveDict(dict[K, V], t.Generic[K, V]):
 
     def __setitem__(self, key: K, value: V) -> None:
         wrapped_value = self._ref._wrap_if_mutable(value)
+        exists = key in self
         super().__setitem__(key, wrapped_value)
 
-        if self._ref.is_ready and self._initialized:
-            self._ref._trigger_watchers()
+        if self._initialized:
+            if exists:
+                self._ref._mutated(self, changed=(key,))
+            else:
+                self._ref._mutated(self, added=(key,))
 
     def __delitem__(self, key: K) -> None:
         super().__delitem__(key)
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        self._ref._mutated(self, removed=(key,))
 
     def clear(self) -> None:
+        removed = tuple(self.keys())
         super().clear()
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        self._ref._mutated(self, removed=removed)
 
     @t.overload
     def pop(self, key: K) -> V: ...
@@ -200,32 +208,160 @@ class ReactiveDict(dict[K, V], t.Generic[K, V]):
     def pop(self, key: K, default: T) -> t.Union[V, T]: ...
 
     def pop(self, key: K, default: t.Any = t.NoReturn) -> t.Any:
+        exists = key in self
         if default is t.NoReturn:
             result = super().pop(key)
         else:
             result = super().pop(key, default)
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        self._ref._mutated(self, removed=(key,) if exists else ())
         return result
 
     def popitem(self) -> tuple[K, V]:
         result = super().popitem()
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        self._ref._mutated(self, removed=(result[0],))
         return result
 
     def update(self, *args: t.Any, **kwargs: V) -> None:
-        for k, v in dict(*args, **kwargs).items():
-            self[k] = v
-        if self._ref.is_ready:
-            self._ref._trigger_watchers()
+        with self._ref.batch():
+            for k, v in dict(*args, **kwargs).items():
+                self[k] = v
+
+
+class RefDiff:
+    __slots__ = ("added", "removed", "changed", "reset")
+
+    def __init__(
+        self,
+        added: t.Iterable[t.Any] = (),
+        removed: t.Iterable[t.Any] = (),
+        changed: t.Iterable[t.Any] = (),
+        reset: bool = False
+    ) -> None:
+        # Keys for dict, values for set, indices for list
+        self.added = set(added)
+        self.removed = set(removed)
+        self.changed = set(changed)
+        # Diff can't be described, watchers have to re-read whole value
+        self.reset = reset
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.reset or self.added or self.removed or self.changed
+        )
+
+    def __repr__(self) -> str:
+        if self.reset:
+            return "RefDiff(reset=True)"
+        return (
+            f"RefDiff(added={self.added!r}, " +
+            f"removed={self.removed!r}, changed={self.changed!r})"
+        )
+
+    @classmethod
+    def compute(cls, old: t.Any, new: t.Any) -> "RefDiff":
+        old, new = snapshot(old), snapshot(new)
+        if isinstance(old, dict) and isinstance(new, dict):
+            return cls(
+                added=new.keys() - old.keys(),
+                removed=old.keys() - new.keys(),
+                changed=(
+                    key for key in old.keys() & new.keys()
+                    if old[key] is not new[key] and old[key] != new[key]
+                )
+            )
+        if isinstance(old, set) and isinstance(new, set):
+            return cls(added=new - old, removed=old - new)
+        if isinstance(old, list) and isinstance(new, list):
+            common = min(len(old), len(new))
+            return cls(
+                added=range(common, len(new)),
+                removed=range(common, len(old)),
+                changed=(
+                    i for i in range(common)
+                    if old[i] is not new[i] and old[i] != new[i]
+                )
+            )
+        return cls(reset=old is not new and old != new)
+
+
+class PatchOp(int, Enum):
+    INSERT = 0
+    REMOVE = 1
+    REPLACE = 2
+    # Whole value has to be re-read
+    RESET = 3
+
+
+class Patch:
+    __slots__ = ("op", "key", "value")
+
+    def __init__(
+        self,
+        op: PatchOp,
+        key: t.Any = None,
+        value: t.Any = None
+    ) -> None:
+        # Key for dict, index for list, value for set
+        self.op = op
+        self.key = key
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"Patch({self.op.name}, {self.key!r})"
+
+
+def diff_to_patches(diff: RefDiff, value: t.Any) -> list[Patch]:
+    if diff.reset:
+        return [Patch(PatchOp.RESET)]
+
+    patches: list[Patch] = []
+    if isinstance(value, dict):
+        for key in diff.removed:
+            patches.append(Patch(PatchOp.REMOVE, key))
+        for key in diff.changed:
+            patches.append(Patch(PatchOp.REPLACE, key, value[key]))
+        added: t.Iterable[t.Any] = diff.added
+        if len(diff.added) > 1:
+            # Keep insertion order of the dict
+            added = [key for key in value if key in diff.added]
+        for key in added:
+            patches.append(Patch(PatchOp.INSERT, key, value[key]))
+    elif isinstance(value, ReactiveList):
+        data = value._data
+        for index in diff.changed:
+            patches.append(Patch(PatchOp.REPLACE, index, data[index]))
+        # Applied one by one, so removals go from the end
+        for index in sorted(diff.removed, reverse=True):
+            patches.append(Patch(PatchOp.REMOVE, index))
+        for index in sorted(diff.added):
+            patches.append(Patch(PatchOp.INSERT, index, data[index]))
+    elif isinstance(value, ReactiveSet):
+        for item in diff.removed:
+            patches.append(Patch(PatchOp.REMOVE, item, item))
+        for item in diff.added:
+            patches.append(Patch(PatchOp.INSERT, item, item))
+    else:
+        patches.append(Patch(PatchOp.RESET))
+    return patches
+
+
+def snapshot(value: t.Any) -> t.Any:
+    if isinstance(value, ReactiveList):
+        return list(value._data)
+    if isinstance(value, ReactiveSet):
+        return set(value._data)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
 
 
 class Ref(t.Generic[T]):
     __slots__ = (
         "_signals", "deep", "is_ready",
         "types", "links", "_value",
-        "name", "asyncio_lock"
+        "name", "asyncio_lock",
+        "_batch_depth", "_batch_snapshot", "_batch_dirty",
+        "_dependents"
     )
 
     def __init__(
@@ -237,7 +373,9 @@ class Ref(t.Generic[T]):
         deep: bool = False,
         types: tuple[type, ...] | None = None
     ) -> None:
-        self._signals = Signals({"changed"})
+        self._signals = Signals(
+            {"changed"}, name=f"Ref:{name or hex(id(self))}"
+        )
         self.deep = deep
         self.is_ready = not delayed_init
         self.types = types
@@ -249,6 +387,12 @@ class Ref(t.Generic[T]):
 
         self.name = name or "unknown"
         self.asyncio_lock = asyncio.Lock()
+
+        self._batch_depth = 0
+        self._batch_snapshot: t.Any = None
+        # None - nothing changed, True - changed inside nested values
+        self._batch_dirty: bool | None = None
+        self._dependents: weakref.WeakSet[Computed[t.Any]] | None = None
         if __debug__:
             logger.debug("Ref with name '%s' created", self.name)
 
@@ -302,7 +446,79 @@ class Ref(t.Generic[T]):
         if not exc_type:
             self._trigger_watchers()
 
-    def _trigger_watchers(self, log: bool = True) -> None:
+    @contextlib.contextmanager
+    def batch(self) -> t.Iterator[t.Self]:
+        if self._batch_depth == 0:
+            self._batch_snapshot = snapshot(self._value)
+            self._batch_dirty = None
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                old_value = self._batch_snapshot
+                dirty = self._batch_dirty
+                self._batch_snapshot = None
+                self._batch_dirty = None
+                if dirty is not None:
+                    diff = (
+                        RefDiff(reset=True)
+                        if dirty
+                        else RefDiff.compute(old_value, self._value)
+                    )
+                    if diff:
+                        self._trigger_watchers(diff=diff)
+
+    def _mutated(
+        self,
+        source: t.Any,
+        added: t.Iterable[t.Any] = (),
+        removed: t.Iterable[t.Any] = (),
+        changed: t.Iterable[t.Any] = (),
+        reset: bool = False
+    ) -> None:
+        nested = source is not self._value
+        if self._batch_depth:
+            # Diff is computed from snapshot when batch ends
+            if nested:
+                self._batch_dirty = True
+            elif self._batch_dirty is None:
+                self._batch_dirty = False
+            return
+
+        if not self.is_ready:
+            # Watchers wait for ready(), computed values can't
+            self._invalidate_dependents()
+            return
+
+        diff: RefDiff | None = None
+        if self._wants_diff():
+            if nested or reset:
+                diff = RefDiff(reset=True)
+            else:
+                diff = RefDiff(added, removed, changed)
+        self._trigger_watchers(diff=diff)
+
+    def _wants_diff(self) -> bool:
+        return (
+            self._signals.has_handlers("diff")
+            or self._signals.has_handlers("patch")
+        )
+
+    def _invalidate_dependents(self) -> None:
+        if self._dependents:
+            # Synchronously, so computed refs read right after are fresh
+            for dependent in list(self._dependents):
+                dependent._invalidate()
+
+    def _trigger_watchers(
+        self,
+        log: bool = True,
+        diff: "RefDiff | None" = None
+    ) -> None:
+        self._invalidate_dependents()
+
         if self.asyncio_lock.locked():
             return
 
@@ -313,6 +529,15 @@ class Ref(t.Generic[T]):
             return
 
         self._signals.notify("changed", self.value)
+        if self._wants_diff():
+            diff = diff or RefDiff(reset=True)
+            if self._signals.has_handlers("diff"):
+                self._signals.notify("diff", diff)
+            if self._signals.has_handlers("patch"):
+                # Values are taken now, before next mutations
+                self._signals.notify(
+                    "patch", diff_to_patches(diff, self._value)
+                )
 
         if __debug__ and log:
             logger.debug(
@@ -322,6 +547,8 @@ class Ref(t.Generic[T]):
 
     @property
     def value(self) -> T:
+        if _trackers:
+            _trackers[-1].add(self)
         if not self.is_ready:
             logger.warning(
                 "Trying to get value, ref '%s' is not ready!",
@@ -350,7 +577,15 @@ class Ref(t.Generic[T]):
                 logger.debug("Ref '%s' changed value", self.name)
 
             self._value = new_value
-            self._trigger_watchers(log=False)
+            if self._batch_depth:
+                self._batch_dirty = self._batch_dirty or False
+            elif self._wants_diff():
+                self._trigger_watchers(
+                    log=False,
+                    diff=RefDiff.compute(old_value, new_value)
+                )
+            else:
+                self._trigger_watchers(log=False)
 
     def unpack(self) -> T:
         def _unpack(value: t.Any) -> t.Any:
@@ -416,6 +651,26 @@ class Ref(t.Generic[T]):
             logger.debug("Ref '%s' remove watcher", self.name)
         self._signals.unwatch_fast("changed", handler_id)
 
+    def watch_diff(
+        self,
+        callback: t.Callable[["RefDiff"], None],
+        **kwargs: t.Any
+    ) -> int:
+        return self._signals.watch("diff", callback, **kwargs)
+
+    def unwatch_diff(self, handler_id: int) -> None:
+        self._signals.unwatch_fast("diff", handler_id)
+
+    def watch_patches(
+        self,
+        callback: t.Callable[[list["Patch"]], None],
+        **kwargs: t.Any
+    ) -> int:
+        return self._signals.watch("patch", callback, **kwargs)
+
+    def unwatch_patches(self, handler_id: int) -> None:
+        self._signals.unwatch_fast("patch", handler_id)
+
     def ready(self) -> None:
         self.is_ready = True
 
@@ -429,3 +684,96 @@ class Ref(t.Generic[T]):
 
         handler_id = ref.watch(on_changed)
         return handler_id
+
+
+# Refs read while computing a Computed value
+_trackers: list[set[Ref[t.Any]]] = []
+
+
+class Computed(Ref[T]):
+    __slots__ = (
+        "_getter", "_dirty", "_deps",
+        "_notified", "__weakref__"
+    )
+
+    def __init__(
+        self,
+        getter: t.Callable[[], T],
+        *,
+        name: str | None = None
+    ) -> None:
+        super().__init__(None, name=name)  # type: ignore[arg-type]
+        self._signals = Signals(
+            {"changed"},
+            coalesce={"recompute": Coalesce.FIRST},
+            name=f"Computed:{name or hex(id(self))}"
+        )
+        self._signals.watch("recompute", self._on_recompute)
+        self._getter = getter
+        self._dirty = True
+        self._deps: set[Ref[t.Any]] = set()
+        self._notified: t.Any = None
+
+    def _recompute(self) -> None:
+        deps: set[Ref[t.Any]] = set()
+        _trackers.append(deps)
+        try:
+            new_value = self._getter()
+        finally:
+            _trackers.pop()
+        self._dirty = False
+        self._value = new_value
+
+        for dep in self._deps - deps:
+            if dep._dependents is not None:
+                dep._dependents.discard(self)
+        for dep in deps - self._deps:
+            if dep._dependents is None:
+                dep._dependents = weakref.WeakSet()
+            dep._dependents.add(self)
+        self._deps = deps
+
+    def _invalidate(self) -> None:
+        if self._dirty:
+            return
+        self._dirty = True
+        if self._dependents:
+            for dependent in list(self._dependents):
+                dependent._invalidate()
+        if self._signals.has_handlers("changed"):
+            self._signals.notify("recompute")
+
+    def _on_recompute(self) -> None:
+        new_value = self.value
+        if new_value == self._notified:
+            return
+        self._notified = new_value
+        if "changed" not in self._signals._blocked:
+            self._signals.notify_sync("changed", new_value)
+
+    @property
+    def value(self) -> T:
+        if _trackers:
+            _trackers[-1].add(self)
+        if self._dirty:
+            self._recompute()
+        return self._value
+
+    @value.setter
+    def value(self, _new_value: T) -> None:
+        raise AttributeError(f"Computed ref '{self.name}' is read-only")
+
+    def unpack(self) -> T:
+        return self.value
+
+    def watch(self, callback: t.Callable[[T], None], **kwargs: t.Any) -> int:
+        self._notified = self.value
+        return super().watch(callback, **kwargs)
+
+
+def computed(
+    getter: t.Callable[[], T],
+    *,
+    name: str | None = None
+) -> Computed[T]:
+    return Computed(getter, name=name)
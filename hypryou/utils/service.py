@@ -1,8 +1,11 @@
 import typing as t
 import types
+from enum import Enum
 import weakref
 import threading
+import time
 from utils.logger import logger
+from utils import profiler
 from repository import glib
 
 # I don't wanna use GObject for signals in objects so I decided to do this code
@@ -11,23 +14,146 @@ Callback = t.Callable[..., None]
 Wrapper = t.Callable[..., bool | None]
 
 
+class Coalesce(int, Enum):
+    # Every notification is delivered
+    NONE = 0
+    # Only the first pending notification is delivered
+    FIRST = 1
+    # Pending notification is replaced by the latest one
+    LATEST = 2
+
+
+# Runs before GTK layout/paint (GDK_PRIORITY_REDRAW is HIGH_IDLE + 20),
+# so changes dispatched in one drain land in the same frame
+DISPATCH_PRIORITY = glib.PRIORITY_HIGH_IDLE + 10
+MAX_DRAIN_ROUNDS = 8
+
+type PendingKey = tuple[int, str] | int
+type PendingItem = tuple["Signals", str, tuple[t.Any, ...]]
+
+
+class DispatchQueue:
+    __slots__ = (
+        "_pending", "_counter", "_scheduled", "_lock",
+        "notifications", "delivered", "wakeups"
+    )
+
+    def __init__(self) -> None:
+        self._pending: dict[PendingKey, PendingItem] = {}
+        self._counter = 0
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self.notifications = 0
+        self.delivered = 0
+        self.wakeups = 0
+
+    def push(
+        self,
+        signals: "Signals",
+        signal_name: str,
+        args: tuple[t.Any, ...],
+        mode: Coalesce
+    ) -> None:
+        if profiler.active:
+            profiler.profiler.record_notify(
+                f"{signals.name}::{signal_name}"
+            )
+        with self._lock:
+            self.notifications += 1
+            key: PendingKey
+            if mode is Coalesce.NONE:
+                self._counter += 1
+                key = self._counter
+            else:
+                key = (id(signals), signal_name)
+                if key in self._pending:
+                    if mode is Coalesce.LATEST:
+                        self._pending[key] = (signals, signal_name, args)
+                    return
+            self._pending[key] = (signals, signal_name, args)
+
+            if not self._scheduled:
+                self._scheduled = True
+                glib.idle_add(self._drain, priority=DISPATCH_PRIORITY)
+
+    def _drain(self) -> bool:
+        self.wakeups += 1
+        # Notifications emitted by callbacks are drained in the same
+        # callback, but limited so the main loop isn't starved
+        for _ in range(MAX_DRAIN_ROUNDS):
+            with self._lock:
+                pending = self._pending
+                if not pending:
+                    break
+                self._pending = {}
+
+            if profiler.active:
+                profiler.profiler.record_queue_depth(len(pending))
+            for signals, signal_name, args in pending.values():
+                self.delivered += 1
+                signals.notify_sync(signal_name, *args)
+
+        with self._lock:
+            if self._pending:
+                return True
+            self._scheduled = False
+            return False
+
+
+dispatch_queue = DispatchQueue()
+
+
+class Handler:
+    __slots__ = (
+        "handler_id", "signal_name", "callback",
+        "priority", "active", "label"
+    )
+
+    def __init__(
+        self,
+        handler_id: int,
+        signal_name: str,
+        callback: Wrapper,
+        priority: int,
+        label: str
+    ) -> None:
+        self.handler_id = handler_id
+        self.signal_name = signal_name
+        self.callback = callback
+        self.priority = priority
+        self.active = True
+        # Used by profiler
+        self.label = label
+
+
 class Signals:
     __slots__ = (
-        "_signals", "_handler_signals",
-        "_blocked", "_lock",
-        "_pending_idle", "_idle_signals"
+        "_signals", "_handlers", "_order",
+        "_next_id", "_blocked", "_lock",
+        "_coalesce", "name"
     )
 
     def __init__(
         self,
-        idle_signals: set[str] = set()
+        idle_signals: set[str] = set(),
+        coalesce: dict[str, Coalesce] | None = None,
+        name: str | None = None
     ) -> None:
-        self._signals: dict[str, dict[int, Wrapper]] = {}
-        self._handler_signals: dict[int, str] = {}
+        self.name = name or type(self).__name__
+        # signal -> priority -> handler_id -> handler
+        # ids are monotonic, so each bucket is already sorted by insertion
+        self._signals: dict[str, dict[int, dict[int, Handler]]] = {}
+        self._handlers: dict[int, Handler] = {}
+        # Flattened call order, rebuilt only on watch/unwatch
+        self._order: dict[str, tuple[Handler, ...]] = {}
+        self._next_id = 0
         self._blocked: set[str] = set()
         self._lock = threading.RLock()
-        self._pending_idle: set[str] = set()
-        self._idle_signals = idle_signals
+        self._coalesce = {
+            signal_name: Coalesce.LATEST for signal_name in idle_signals
+        }
+        if coalesce is not None:
+            self._coalesce.update(coalesce)
 
     def watch(
         self,
@@ -38,6 +164,10 @@ class Signals:
         priority: int = 0
     ) -> int:
         with self._lock:
+            label = (
+                f"{self.name}::{signal_name} -> " +
+                getattr(callback, "__qualname__", repr(callback))
+            )
             if isinstance(callback, types.MethodType):
                 ref = weakref.WeakMethod(callback)
 
@@ -59,30 +189,64 @@ class Signals:
 
                 wrapper = one_shot
 
-            callbacks = self._signals.setdefault(signal_name, {})
-            base_id = max(self._handler_signals.keys(), default=0) + 1
-            handler_id = base_id + priority * 0x10000
-            callbacks[handler_id] = wrapper
-            self._handler_signals[handler_id] = signal_name
-            return handler_id
+            self._next_id += 1
+            handler = Handler(
+                self._next_id, signal_name,
+                wrapper, priority, label
+            )
+            buckets = self._signals.setdefault(signal_name, {})
+            buckets.setdefault(priority, {})[handler.handler_id] = handler
+            self._handlers[handler.handler_id] = handler
+
+            order = self._order.get(signal_name)
+            if order is not None:
+                if not order or order[-1].priority <= priority:
+                    self._order[signal_name] = order + (handler,)
+                else:
+                    del self._order[signal_name]
+            return handler.handler_id
+
+    def _remove(self, handler: Handler) -> None:
+        handler.active = False
+        del self._handlers[handler.handler_id]
+        buckets = self._signals[handler.signal_name]
+        bucket = buckets[handler.priority]
+        del bucket[handler.handler_id]
+        if not bucket:
+            del buckets[handler.priority]
+
+        order = self._order.get(handler.signal_name)
+        if order is not None:
+            self._order[handler.signal_name] = tuple(
+                item for item in order if item is not handler
+            )
+
+    def _get_order(self, signal_name: str) -> tuple[Handler, ...]:
+        order = self._order.get(signal_name)
+        if order is None:
+            buckets = self._signals.get(signal_name, {})
+            order = tuple(
+                handler
+                for priority in sorted(buckets)
+                for handler in buckets[priority].values()
+            )
+            self._order[signal_name] = order
+        return order
 
     def unwatch_fast(self, signal_name: str, handler_id: int) -> bool:
         with self._lock:
-            callbacks = self._signals.get(signal_name)
-            if not callbacks or handler_id not in callbacks:
+            handler = self._handlers.get(handler_id)
+            if handler is None or handler.signal_name != signal_name:
                 return False
-            del callbacks[handler_id]
-            del self._handler_signals[handler_id]
+            self._remove(handler)
             return True
 
     def unwatch(self, handler_id: int) -> bool:
         with self._lock:
-            signal_name = self._handler_signals[handler_id]
-            callbacks = self._signals.get(signal_name)
-            if not callbacks or handler_id not in callbacks:
+            handler = self._handlers.get(handler_id)
+            if handler is None:
                 return False
-            del callbacks[handler_id]
-            del self._handler_signals[handler_id]
+            self._remove(handler)
             return True
 
     def notify_sync(self, signal_name: str, *args: t.Any) -> None:
@@ -90,46 +254,39 @@ class Signals:
             if signal_name in self._blocked:
                 return
 
-            signal_callbacks = self._signals.get(signal_name)
-            if signal_callbacks is None:
-                return
-
-            to_remove: list[int] = []
-            for handler_id in sorted(signal_callbacks):
-                cb = self._signals[signal_name][handler_id]
+            profiling = profiler.active
+            for handler in self._get_order(signal_name):
+                if not handler.active:
+                    # Removed by one of previous callbacks
+                    continue
                 try:
-                    result = cb(*args)
-                    if result not in (None, True):
-                        to_remove.append(handler_id)
+                    if profiling:
+                        start = time.perf_counter()
+                        result = handler.callback(*args)
+                        profiler.profiler.record_handler(
+                            handler.label, start
+                        )
+                    else:
+                        result = handler.callback(*args)
+                    if result not in (None, True) and handler.active:
+                        self._remove(handler)
                 except Exception as e:
                     logger.error(
                         "Error while calling callback: %s",
                         e, exc_info=e
                     )
-                    to_remove.append(handler_id)
-
-            for handler_id in to_remove:
-                del signal_callbacks[handler_id]
-                self._handler_signals.pop(handler_id, None)
-
-    def _idle_notify(self, signal_name: str, *args: t.Any) -> bool:
-        if signal_name in self._idle_signals:
-            with self._lock:
-                self._pending_idle.discard(signal_name)
-        self.notify_sync(signal_name, *args)
-        return False
+                    if handler.active:
+                        self._remove(handler)
 
     def notify(
         self,
         signal_name: str,
         *args: t.Any
     ) -> None:
-        if signal_name in self._idle_signals:
-            with self._lock:
-                if signal_name in self._pending_idle:
-                    return
-                self._pending_idle.add(signal_name)
-        glib.idle_add(self._idle_notify, signal_name, *args)
+        dispatch_queue.push(
+            self, signal_name, args,
+            self._coalesce.get(signal_name, Coalesce.NONE)
+        )
 
     def block(self, signal_name: str) -> None:
         with self._lock:
@@ -139,15 +296,24 @@ class Signals:
         with self._lock:
             self._blocked.discard(signal_name)
 
+    def has_handlers(self, signal_name: str) -> bool:
+        return bool(self._signals.get(signal_name))
+
     def handlers(self, signal_name: str) -> list[int]:
         with self._lock:
-            return list(self._signals.get(signal_name, ()))
+            return [
+                handler.handler_id
+                for handler in self._get_order(signal_name)
+            ]
 
     def clear(self, signal_name: str) -> None:
         with self._lock:
-            callbacks = self._signals.pop(signal_name, {})
-            for handler_id in callbacks:
-                self._handler_signals.pop(handler_id, None)
+            buckets = self._signals.pop(signal_name, {})
+            for bucket in buckets.values():
+                for handler in bucket.values():
+                    handler.active = False
+                    self._handlers.pop(handler.handler_id, None)
+            self._order.pop(signal_name, None)
 
 
 class Service:
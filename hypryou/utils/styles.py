@@ -1,28 +1,204 @@
-from repository import gtk, gdk
+from repository import gtk, gdk, glib
+import concurrent.futures
+import contextlib
+import hashlib
+import os
 import subprocess
 from config import (
     styles_output, main_scss,
     scss_variables, HyprlandVars,
     TEMP_PATH, color_templates,
-    Settings
+    APP_CACHE_PATH, Settings
 )
 from src.variables import Globals
 from utils.logger import logger
+from utils.system import write_if_changed
+
+
+CSS_CACHE_PATH = os.path.join(APP_CACHE_PATH, "css")
+MAX_CACHED_CSS = 32
+
+
+def scss_files(folder: str) -> list[str]:
+    try:
+        files = os.listdir(folder)
+    except OSError:
+        return []
+    return sorted(
+        os.path.join(folder, file)
+        for file in files
+        if file.endswith(".scss")
+    )
+
+
+def inputs_hash(
+    source: str,
+    load_paths: tuple[str, ...],
+    extra: str = ""
+) -> str:
+    # Everything sass could @use: the source folder and load paths
+    digest = hashlib.blake2b(extra.encode(), digest_size=16)
+    for folder in (os.path.dirname(source), *load_paths):
+        for path in scss_files(folder):
+            digest.update(path.encode() + b"\0")
+            with open(path, "rb") as f:
+                digest.update(f.read())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def prune_css_cache() -> None:
+    try:
+        entries = [
+            entry for entry in os.scandir(CSS_CACHE_PATH)
+            if entry.name.endswith(".css")
+        ]
+    except OSError:
+        return
+    if len(entries) <= MAX_CACHED_CSS:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:-MAX_CACHED_CSS]:
+        with contextlib.suppress(OSError):
+            os.unlink(entry.path)
+
+
+def compile_cached(
+    source: str,
+    output: str,
+    load_paths: tuple[str, ...] = (),
+    extra: str = ""
+) -> bool:
+    # Returns True if output changed. sass only runs when some input
+    # differs from every cached compilation.
+    os.makedirs(CSS_CACHE_PATH, exist_ok=True)
+    key = inputs_hash(source, load_paths, extra)
+    cached = os.path.join(CSS_CACHE_PATH, f"{key}.css")
+    if os.path.exists(cached):
+        os.utime(cached)
+    else:
+        if __debug__:
+            logger.debug("Compiling %s", source)
+        tmp_path = f"{cached}.{os.getpid()}.tmp"
+        try:
+            subprocess.run(
+                [
+                    "sass", "--no-source-map",
+                    *(f"--load-path={path}" for path in load_paths),
+                    source, tmp_path
+                ],
+                check=True
+            )
+            os.replace(tmp_path, cached)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        prune_css_cache()
+    with open(cached) as f:
+        css = f.read()
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    return write_if_changed(output, css)
+
+
+def scss_variables_content() -> str:
+    variables = {
+        "hyprlandRounding": f"{HyprlandVars.rounding}px",
+        "hyprlandGap": f"{HyprlandVars.gap}px",
+        "layerOpacity": f"{Settings().get("opacity")}"
+    }
+    return "".join(f"${key}: {value};\n" for key, value in variables.items())
+
+
+def generate_scss_variables(content: str | None = None) -> None:
+    write_if_changed(scss_variables, content or scss_variables_content())
+
+
+def compile_scss(variables: str | None = None) -> bool:
+    variables = variables or scss_variables_content()
+    generate_scss_variables(variables)
+    return compile_cached(
+        main_scss, styles_output, (color_templates, TEMP_PATH), variables
+    )
+
+
+def css_digest(path: str) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    except OSError:
+        return None
+
+
+class StyleCompiler:
+    # Compiles main.scss on a worker thread. Requests made while a
+    # compilation runs collapse into one more run with the latest
+    # variables. The provider is reloaded only when the CSS changed.
+    def __init__(self) -> None:
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self._running = False
+        self._pending: str | None = None
+        self._loaded: str | None = None
+
+    def request(self) -> None:
+        # Settings and HyprlandVars are only read on the main thread
+        self._pending = scss_variables_content()
+        if not self._running:
+            self._start()
+
+    def _start(self) -> None:
+        variables, self._pending = self._pending, None
+        if variables is None:
+            return
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="scss"
+            )
+        self._running = True
+        future = self._executor.submit(compile_scss, variables)
+        future.add_done_callback(
+            lambda future: glib.idle_add(self._finish, future)
+        )
+
+    def _finish(self, future: concurrent.futures.Future[bool]) -> bool:
+        self._running = False
+        if self._pending is not None:
+            # Result is already outdated
+            self._start()
+            return False
+        try:
+            future.result()
+        except Exception as e:
+            logger.error("Couldn't compile scss: %s", e, exc_info=e)
+            return False
+        self.load()
+        return False
+
+    def load(self) -> None:
+        digest = css_digest(styles_output)
+        if digest is None or digest == self._loaded:
+            return
+        if __debug__:
+            logger.debug("Reloading css")
+        Globals.css_provider.load_from_path(styles_output)
+        self._loaded = digest
+
+
+compiler = StyleCompiler()
 
 
 def apply_css() -> None:
     if hasattr(Globals, "css_provider"):
         return
-    compile_scss()
+    # Only the very first start has to wait for sass, otherwise the
+    # last output is shown until the new one is ready
+    if not os.path.exists(styles_output):
+        compile_scss()
 
     if __debug__:
         logger.debug("Creating css provider")
     provider = gtk.CssProvider()
 
-    if __debug__:
-        logger.debug("Loading css")
-    provider.load_from_path(styles_output)
-
     gtk.StyleContext.add_provider_for_display(
         gdk.Display.get_default(),
         provider,
@@ -30,44 +206,14 @@ def apply_css() -> None:
     )
 
     Globals.css_provider = provider
+    compiler.load()
+    compiler.request()
 
 
 def reload_css() -> None:
     if not hasattr(Globals, "css_provider"):
         return apply_css()
-
-    compile_scss()
-    if __debug__:
-        logger.debug("Reloading css")
-    Globals.css_provider.load_from_path(styles_output)
-    if __debug__:
-        logger.debug("Reloading css done")
-
-
-def generate_scss_variables() -> None:
-    variables = {
-        "hyprlandRounding": f"{HyprlandVars.rounding}px",
-        "hyprlandGap": f"{HyprlandVars.gap}px",
-        "layerOpacity": f"{Settings().get("opacity")}"
-    }
-    with open(scss_variables, 'w') as f:
-        for key, value in variables.items():
-            f.write(f"${key}: {value};\n")
-
-
-def compile_scss() -> None:
-    if __debug__:
-        logger.debug("Compiling scss")
-    generate_scss_variables()
-    command = [
-        'sass',
-        f'--load-path={color_templates}',
-        f'--load-path={TEMP_PATH}',
-        main_scss,
-        styles_output
-    ]
-
-    subprocess.run(command, check=True)
+    compiler.request()
 
 
 def toggle_css_class(
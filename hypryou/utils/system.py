@@ -1,3 +1,4 @@
+import contextlib
 import os
 
 
@@ -124,3 +125,23 @@ def get_swap_usage() -> tuple[float, float, float]:
     percent = 100.0 * used / total if total > 0 else 0.0
 
     return total / 1024, used / 1024, percent
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    # Readers never see a half written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+    return True
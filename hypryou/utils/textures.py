@@ -0,0 +1,87 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from repository import gdk
+
+# Textures are immutable, so identical images (same tray icon on
+# several monitors, same notification icon) can share one texture
+
+MAX_TEXTURES = 128
+
+
+def texture_size(texture: gdk.Texture) -> int:
+    # Textures are uploaded as 4 bytes per pixel
+    return texture.get_width() * texture.get_height() * 4
+
+
+def content_key(data: bytes | bytearray | memoryview, *extra: object) -> str:
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if extra:
+        return digest + ":" + ":".join(str(value) for value in extra)
+    return digest
+
+
+class TextureCache:
+    __slots__ = (
+        "max_size", "max_bytes", "total_bytes",
+        "hits", "misses", "_textures", "_sizes", "_lock"
+    )
+
+    def __init__(
+        self,
+        max_size: int = MAX_TEXTURES,
+        max_bytes: int | None = None
+    ) -> None:
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._textures: OrderedDict[str, gdk.Texture] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> gdk.Texture | None:
+        with self._lock:
+            texture = self._textures.get(key)
+            if texture is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._textures.move_to_end(key)
+            return texture
+
+    def put(self, key: str, texture: gdk.Texture) -> gdk.Texture:
+        size = texture_size(texture)
+        with self._lock:
+            self.total_bytes += size - self._sizes.get(key, 0)
+            self._textures[key] = texture
+            self._sizes[key] = size
+            self._textures.move_to_end(key)
+            while len(self._textures) > 1 and (
+                len(self._textures) > self.max_size
+                or (
+                    self.max_bytes is not None
+                    and self.total_bytes > self.max_bytes
+                )
+            ):
+                old_key, _ = self._textures.popitem(last=False)
+                self.total_bytes -= self._sizes.pop(old_key)
+        return texture
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            if self._textures.pop(key, None) is not None:
+                self.total_bytes -= self._sizes.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._textures.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._textures)
+
+
+texture_cache = TextureCache()
@@ -0,0 +1,49 @@
+import typing as t
+from array import array
+
+
+class EncodedStrings:
+    count: int
+
+    def __init__(self, strings: t.Iterable[str]) -> None:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+
+def edit_distance(s1: str, s2: str) -> int:
+    ...
+
+
+def compute_score(s1: str, s2: str) -> float:
+    ...
+
+
+def text_match_score(s1: str, s2: str) -> float:
+    ...
+
+
+def score_many(
+    query: str,
+    candidates: EncodedStrings | t.Iterable[str],
+    names: bool = False
+) -> array[float]:
+    ...
+
+
+def token_set_ratio(s1: str, s2: str) -> float:
+    ...
+
+
+def tokenize(s: str) -> frozenset[str]:
+    ...
+
+
+def rank_records(
+    search: str,
+    search_normalized: str,
+    records: list[tuple[t.Any, str, str, frozenset[str], frozenset[str]]],
+    threshold: float
+) -> list[tuple[float, t.Any]]:
+    ...
@@ -0,0 +1,537 @@
+# cython: boundscheck=False, wraparound=False
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+from libc.stdint cimport uint32_t, uint64_t
+from cpython.array cimport array, clone
+
+# Same scores as levenshtein.compute_score and compute_text_match_score,
+# but strings are compared by code point and distances of patterns up to
+# 64 chars are computed with Hyyro's bit-parallel variant of Myers'
+# algorithm, which handles 64 DP cells per machine word.
+
+cdef enum:
+    MAX_PATTERN = 64
+    TABLE_SIZE = 128
+    # Strings this short are encoded on the stack
+    STACK_SIZE = 256
+
+cdef array float_template = array("f")
+
+
+cdef struct Weights:
+    float full
+    float first_char
+    Py_ssize_t min_len_diff
+    float len_diff
+    float prefix
+    float contains
+
+
+# compute_score, for short names and keywords
+cdef Weights NAME_WEIGHTS = Weights(0.85, 0.05, 3, 0.05, 0.02, 0.06)
+# compute_text_match_score, for longer free text
+cdef Weights TEXT_WEIGHTS = Weights(0.5, 0.0, 10, 0.02, 0.01, 0.2)
+
+
+cdef struct PatternMask:
+    uint64_t ascii[TABLE_SIZE]
+    uint32_t keys[TABLE_SIZE]
+    uint64_t values[TABLE_SIZE]
+
+
+cdef void build_mask(
+    PatternMask* mask,
+    const uint32_t* pattern,
+    Py_ssize_t length
+) noexcept nogil:
+    # Bit i of a char's mask is set when pattern[i] is that char,
+    # non-ASCII chars go to a small open addressing table
+    memset(mask, 0, sizeof(PatternMask))
+    cdef Py_ssize_t i, slot
+    cdef uint32_t c
+    for i in range(length):
+        c = pattern[i]
+        if c < TABLE_SIZE:
+            mask.ascii[c] |= (<uint64_t>1) << i
+            continue
+        slot = c & (TABLE_SIZE - 1)
+        while mask.keys[slot] != 0 and mask.keys[slot] != c:
+            slot = (slot + 1) & (TABLE_SIZE - 1)
+        mask.keys[slot] = c
+        mask.values[slot] |= (<uint64_t>1) << i
+
+
+cdef inline uint64_t lookup(
+    const PatternMask* mask,
+    uint32_t c
+) noexcept nogil:
+    if c < TABLE_SIZE:
+        return mask.ascii[c]
+    cdef Py_ssize_t slot = c & (TABLE_SIZE - 1)
+    while mask.keys[slot] != 0:
+        if mask.keys[slot] == c:
+            return mask.values[slot]
+        slot = (slot + 1) & (TABLE_SIZE - 1)
+    return 0
+
+
+cdef Py_ssize_t myers_distance(
+    const PatternMask* mask,
+    Py_ssize_t m,
+    const uint32_t* text,
+    Py_ssize_t n
+) noexcept nogil:
+    if m == 0:
+        return n
+    cdef uint64_t pv = ~(<uint64_t>0)
+    cdef uint64_t mv = 0
+    cdef uint64_t last = (<uint64_t>1) << (m - 1)
+    cdef uint64_t eq, xv, xh, ph, mh
+    cdef Py_ssize_t score = m
+    cdef Py_ssize_t j
+    for j in range(n):
+        eq = lookup(mask, text[j])
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        # Row 0 grows by one per column for global distance
+        ph = (ph << 1) | 1
+        mh = mh << 1
+        pv = mh | ~(xv | ph)
+        mv = ph & xv
+    return score
+
+
+cdef Py_ssize_t dp_distance(
+    const uint32_t* s1,
+    Py_ssize_t len1,
+    const uint32_t* s2,
+    Py_ssize_t len2
+) noexcept nogil:
+    # Fallback when both strings are longer than MAX_PATTERN
+    cdef Py_ssize_t* prev = <Py_ssize_t*>malloc(
+        (len2 + 1) * sizeof(Py_ssize_t)
+    )
+    cdef Py_ssize_t* curr = <Py_ssize_t*>malloc(
+        (len2 + 1) * sizeof(Py_ssize_t)
+    )
+    cdef Py_ssize_t* tmp_ptr
+    cdef Py_ssize_t i, j, tmp
+    if prev == NULL or curr == NULL:
+        free(prev)
+        free(curr)
+        return len1 if len1 > len2 else len2
+
+    for j in range(len2 + 1):
+        prev[j] = j
+    for i in range(1, len1 + 1):
+        curr[0] = i
+        for j in range(1, len2 + 1):
+            tmp = prev[j] + 1
+            if curr[j - 1] + 1 < tmp:
+                tmp = curr[j - 1] + 1
+            if prev[j - 1] + (s1[i - 1] != s2[j - 1]) < tmp:
+                tmp = prev[j - 1] + (s1[i - 1] != s2[j - 1])
+            curr[j] = tmp
+        tmp_ptr = prev
+        prev = curr
+        curr = tmp_ptr
+
+    tmp = prev[len2]
+    free(prev)
+    free(curr)
+    return tmp
+
+
+cdef Py_ssize_t distance(
+    const uint32_t* s1,
+    Py_ssize_t len1,
+    const uint32_t* s2,
+    Py_ssize_t len2,
+    const PatternMask* mask2
+) noexcept nogil:
+    # mask2 is the prebuilt mask of s2 or NULL
+    cdef PatternMask mask
+    if len1 == 0:
+        return len2
+    if len2 == 0:
+        return len1
+    if mask2 != NULL and len2 <= MAX_PATTERN:
+        return myers_distance(mask2, len2, s1, len1)
+    if len2 <= MAX_PATTERN:
+        build_mask(&mask, s2, len2)
+        return myers_distance(&mask, len2, s1, len1)
+    if len1 <= MAX_PATTERN:
+        build_mask(&mask, s1, len1)
+        return myers_distance(&mask, len1, s2, len2)
+    return dp_distance(s1, len1, s2, len2)
+
+
+cdef float partial_ratio(
+    const uint32_t* short_s,
+    Py_ssize_t len_s,
+    const uint32_t* long_s,
+    Py_ssize_t len_l,
+    const PatternMask* short_mask
+) noexcept nogil:
+    # Best match of short_s against every window of long_s of its length,
+    # the pattern mask is built once and reused for all windows
+    cdef PatternMask mask
+    cdef Py_ssize_t i, dist
+    cdef float best = 0.0
+    cdef float score
+    if len_s == 0:
+        return 1.0
+    if len_s <= MAX_PATTERN and short_mask == NULL:
+        build_mask(&mask, short_s, len_s)
+        short_mask = &mask
+    for i in range(len_l - len_s + 1):
+        if len_s <= MAX_PATTERN:
+            dist = myers_distance(short_mask, len_s, long_s + i, len_s)
+        else:
+            dist = dp_distance(short_s, len_s, long_s + i, len_s)
+        score = 1.0 - (<double>dist / len_s)
+        if score > best:
+            best = score
+            if dist == 0:
+                break
+    return best
+
+
+cdef bint contains(
+    const uint32_t* haystack,
+    Py_ssize_t len_h,
+    const uint32_t* needle,
+    Py_ssize_t len_n
+) noexcept nogil:
+    cdef Py_ssize_t i, j
+    for i in range(len_h - len_n + 1):
+        j = 0
+        while j < len_n and haystack[i + j] == needle[j]:
+            j += 1
+        if j == len_n:
+            return True
+    return len_n == 0
+
+
+cdef float match_score(
+    const uint32_t* s1,
+    Py_ssize_t len1,
+    const uint32_t* s2,
+    Py_ssize_t len2,
+    const PatternMask* mask2,
+    const Weights* weights
+) noexcept nogil:
+    cdef Py_ssize_t i
+    cdef Py_ssize_t common_prefix_len = 0
+    cdef Py_ssize_t min_len = len1 if len1 < len2 else len2
+    for i in range(min_len):
+        if s1[i] == s2[i]:
+            common_prefix_len += 1
+        else:
+            break
+    if len1 == len2 and common_prefix_len == len1:
+        return 1.0
+
+    cdef Py_ssize_t dist = distance(s1, len1, s2, len2, mask2)
+    cdef float max_len = len1 if len1 > len2 else len2
+    cdef float full = 1.0 - (dist / max_len)
+
+    cdef float part = 0.0
+    if len1 < len2:
+        part = partial_ratio(s1, len1, s2, len2, NULL)
+    elif len2 < len1:
+        part = partial_ratio(s2, len2, s1, len1, mask2)
+
+    cdef float score = weights.full * full + (1.0 - weights.full) * part
+
+    if len1 and len2 and s1[0] != s2[0]:
+        score -= weights.first_char
+
+    cdef Py_ssize_t len_diff = len1 - len2 if len1 > len2 else len2 - len1
+    if len_diff >= weights.min_len_diff:
+        score -= weights.len_diff * len_diff / max_len
+
+    score += weights.prefix * common_prefix_len
+
+    if contains(s2, len2, s1, len1) or contains(s1, len1, s2, len2):
+        score += weights.contains
+
+    if score > 1.0:
+        score = 1.0
+    elif score < 0.0:
+        score = 0.0
+
+    return score
+
+
+cdef uint32_t* encode(str s, uint32_t* buffer):
+    cdef Py_ssize_t i = 0
+    cdef Py_UCS4 c
+    for c in s:
+        buffer[i] = c
+        i += 1
+    return buffer
+
+
+cdef uint32_t* encode_new(str s) except NULL:
+    cdef uint32_t* buffer = <uint32_t*>malloc(
+        (len(s) + 1) * sizeof(uint32_t)
+    )
+    if buffer == NULL:
+        raise MemoryError()
+    return encode(s, buffer)
+
+
+cdef class EncodedStrings:
+    # Code points of all strings in one buffer, encode candidates once
+    # and pass this to score_many on every query
+    cdef uint32_t* data
+    cdef Py_ssize_t* offsets
+    cdef readonly Py_ssize_t count
+
+    def __cinit__(self, strings: object) -> None:
+        cdef list items = list(strings)
+        cdef Py_ssize_t total = 0
+        cdef Py_ssize_t i
+        cdef str s
+        for s in items:
+            total += len(s)
+        self.count = len(items)
+        self.data = <uint32_t*>malloc((total + 1) * sizeof(uint32_t))
+        self.offsets = <Py_ssize_t*>malloc(
+            (self.count + 1) * sizeof(Py_ssize_t)
+        )
+        if self.data == NULL or self.offsets == NULL:
+            raise MemoryError()
+        self.offsets[0] = 0
+        for i in range(self.count):
+            s = items[i]
+            encode(s, self.data + self.offsets[i])
+            self.offsets[i + 1] = self.offsets[i] + len(s)
+
+    def __dealloc__(self) -> None:
+        free(self.data)
+        free(self.offsets)
+
+    def __len__(self) -> int:
+        return self.count
+
+
+cdef struct Text:
+    uint32_t* data
+    Py_ssize_t length
+    uint32_t stack[STACK_SIZE]
+
+
+cdef int text_init(Text* text, str s) except -1:
+    # Short strings don't need an allocation
+    text.length = len(s)
+    if text.length <= STACK_SIZE:
+        text.data = text.stack
+        encode(s, text.data)
+    else:
+        text.data = encode_new(s)
+    return 0
+
+
+cdef void text_free(Text* text) noexcept:
+    if text.data != text.stack:
+        free(text.data)
+    text.data = NULL
+
+
+cdef float pair_score(str s1, str s2, const Weights* weights) except -1:
+    cdef Text t1, t2
+    text_init(&t1, s1)
+    try:
+        text_init(&t2, s2)
+    except MemoryError:
+        text_free(&t1)
+        raise
+    cdef float result = match_score(
+        t1.data, t1.length, t2.data, t2.length, NULL, weights
+    )
+    text_free(&t1)
+    text_free(&t2)
+    return result
+
+
+cpdef Py_ssize_t edit_distance(str s1, str s2) except -1:
+    cdef Text t1, t2
+    text_init(&t1, s1)
+    try:
+        text_init(&t2, s2)
+    except MemoryError:
+        text_free(&t1)
+        raise
+    cdef Py_ssize_t result = distance(
+        t1.data, t1.length, t2.data, t2.length, NULL
+    )
+    text_free(&t1)
+    text_free(&t2)
+    return result
+
+
+cpdef float compute_score(str s1, str s2) except -1:
+    return pair_score(s1, s2, &NAME_WEIGHTS)
+
+
+cpdef float text_match_score(str s1, str s2) except -1:
+    return pair_score(s1, s2, &TEXT_WEIGHTS)
+
+
+def score_many(
+    str query,
+    object candidates,
+    bint names=False
+) -> array:
+    # text_match_score(candidate, query) for every candidate, or
+    # compute_score with names, scored without the GIL
+    cdef EncodedStrings encoded = (
+        candidates if isinstance(candidates, EncodedStrings)
+        else EncodedStrings(candidates)
+    )
+    cdef array result = clone(float_template, encoded.count, False)
+    cdef float* out = result.data.as_floats
+    cdef const Weights* weights = &NAME_WEIGHTS if names else &TEXT_WEIGHTS
+    cdef Py_ssize_t query_len = len(query)
+    cdef uint32_t* query_data = encode_new(query)
+    cdef PatternMask query_mask
+    cdef const PatternMask* mask = NULL
+    cdef Py_ssize_t i, start
+
+    with nogil:
+        if 0 < query_len <= MAX_PATTERN:
+            build_mask(&query_mask, query_data, query_len)
+            mask = &query_mask
+        for i in range(encoded.count):
+            start = encoded.offsets[i]
+            out[i] = match_score(
+                encoded.data + start,
+                encoded.offsets[i + 1] - start,
+                query_data,
+                query_len,
+                mask,
+                weights
+            )
+
+    free(query_data)
+    return result
+
+
+cdef struct Pattern:
+    Text text
+    PatternMask mask
+    bint has_mask
+
+
+cdef int pattern_init(Pattern* pattern, str s) except -1:
+    text_init(&pattern.text, s)
+    pattern.has_mask = 0 < pattern.text.length <= MAX_PATTERN
+    if pattern.has_mask:
+        build_mask(&pattern.mask, pattern.text.data, pattern.text.length)
+    return 0
+
+
+cdef inline float pattern_score(
+    const Text* text,
+    const Pattern* pattern
+) noexcept nogil:
+    return match_score(
+        text.data, text.length,
+        pattern.text.data, pattern.text.length,
+        &pattern.mask if pattern.has_mask else NULL,
+        &TEXT_WEIGHTS
+    )
+
+
+cdef float tokens_score(object tokens1, object tokens2) except -1:
+    cdef str base = " ".join(sorted(tokens1 & tokens2))
+    cdef str combined1 = (base + " " + " ".join(sorted(tokens1 - tokens2)))
+    cdef str combined2 = (base + " " + " ".join(sorted(tokens2 - tokens1)))
+    combined1 = combined1.strip()
+    combined2 = combined2.strip()
+    return max(
+        pair_score(base, combined1, &NAME_WEIGHTS),
+        pair_score(base, combined2, &NAME_WEIGHTS),
+        pair_score(combined1, combined2, &NAME_WEIGHTS)
+    )
+
+
+cpdef float token_set_ratio(str s1, str s2) except -1:
+    return tokens_score(tokenize(s1), tokenize(s2))
+
+
+cpdef frozenset tokenize(str s):
+    return frozenset(s.lower().split())
+
+
+cdef float score_text(
+    str text,
+    object tokens,
+    const Pattern* query,
+    const Pattern* normalized,
+    object query_tokens
+) except -1:
+    cdef Text encoded
+    cdef float score, other
+    text_init(&encoded, text)
+    score = pattern_score(&encoded, query)
+    if normalized != NULL:
+        other = pattern_score(&encoded, normalized)
+        if other > score:
+            score = other
+    text_free(&encoded)
+    # Scores are capped at 1.0, tokens can't do better
+    if score < 1.0:
+        other = tokens_score(tokens, query_tokens)
+        if other > score:
+            score = other
+    return score
+
+
+cpdef list rank_records(
+    str search,
+    str search_normalized,
+    list records,
+    float threshold
+):
+    # Records are (key, text, normalized, tokens, normalized_tokens)
+    # with tokens from tokenize(), so item text is prepared only once.
+    # Both queries are encoded and get their pattern masks once per call
+    cdef frozenset search_tokens = tokenize(search)
+    cdef Pattern query, query_normalized
+    cdef const Pattern* normalized = NULL
+    cdef list found = []
+    cdef tuple record
+    cdef float score, other
+
+    pattern_init(&query, search)
+    try:
+        if search_normalized and search_normalized != search:
+            pattern_init(&query_normalized, search_normalized)
+            normalized = &query_normalized
+        for record in records:
+            score = score_text(
+                record[1], record[3], &query, normalized, search_tokens
+            )
+            if score < 1.0:
+                other = score_text(
+                    record[2], record[4], &query, normalized, search_tokens
+                )
+                if other > score:
+                    score = other
+            if score >= threshold:
+                found.append((score, record[0]))
+    finally:
+        text_free(&query.text)
+        if normalized != NULL:
+            text_free(&query_normalized.text)
+    found.sort(reverse=True)
+    return found
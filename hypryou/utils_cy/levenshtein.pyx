@@ -1,5 +1,4 @@
 from libc.stdlib cimport malloc, free
-from cpython.unicode cimport PyUnicode_AsUTF8String
 
 cdef inline int min3(int a, int b, int c) nogil:
     return a if a < b and a < c else b if b < c else c
@@ -27,10 +26,18 @@ cpdef int levenshtein_distance(str s1, str s2):
         s1, s2 = s2, s1
         len1, len2 = len2, len1
 
-    cdef bytes b1 = PyUnicode_AsUTF8String(s1)
-    cdef bytes b2 = PyUnicode_AsUTF8String(s2)
-    cdef const char* cs1 = b1
-    cdef const char* cs2 = b2
+    # Compared by code point, UTF-8 bytes don't line up with len()
+    cdef Py_UCS4 *cs1 = <Py_UCS4 *>malloc(len1 * sizeof(Py_UCS4))
+    cdef Py_UCS4 *cs2 = <Py_UCS4 *>malloc(len2 * sizeof(Py_UCS4))
+    cdef Py_UCS4 c
+    i = 0
+    for c in s1:
+        cs1[i] = c
+        i += 1
+    i = 0
+    for c in s2:
+        cs2[i] = c
+        i += 1
 
     cdef int *prev = <int *>malloc((len2 + 1) * sizeof(int))
     cdef int *curr = <int *>malloc((len2 + 1) * sizeof(int))
@@ -60,6 +67,8 @@ cpdef int levenshtein_distance(str s1, str s2):
     tmp = prev[len2]
     free(prev)
     free(curr)
+    free(cs1)
+    free(cs2)
     return tmp
 
 cdef float partial_ratio(str short_s, str long_s):
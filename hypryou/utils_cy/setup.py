@@ -4,7 +4,7 @@ from Cython.Build import cythonize
 setup(
     name="utils_cy",
     ext_modules=cythonize(
-        ["utils_cy/levenshtein.pyx"],
+        ["utils_cy/levenshtein.pyx", "utils_cy/fuzzy.pyx"],
         language_level=3
     )
 )